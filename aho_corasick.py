@@ -0,0 +1,62 @@
+"""
+Aho-Corasick 多模式匹配：一次扫描文本即可找出所有模式串的全部出现位置
+"""
+
+from collections import deque
+
+class Automaton:
+    """
+    由一组模式串构建的匹配自动机
+
+    用法:
+        automaton = Automaton(['如是', '我闻'])
+        for start, pattern_index in automaton.finditer(text):
+            ...
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        # 每个状态的转移表、失配指针、以该状态结尾的模式串下标
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # 按层次（BFS）计算失配指针，并合并失配链上的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_next = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = fail_next if fail_next != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def finditer(self, text):
+        """产出 (起始位置, 模式串下标)，包括相互重叠的匹配"""
+        goto, fail, output = self._goto, self._fail, self._output
+        patterns = self.patterns
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in output[state]:
+                yield pos - len(patterns[index]) + 1, index
@@ -0,0 +1,290 @@
+"""
+讲记、义贯、白话译文之间的经文对齐
+
+三种资料都以粗体 **...** 标出经文，但分卷和分段各不相同。这里：
+1. 从各卷文件中取出经文段落（讲记、白话译文为整行粗体，连续的粗体行合为一段；
+   义贯为 **【...】** 段落，由 extract_chengguan 解析）；
+2. 经文归一化（去标记、标点、空白，繁体折叠为简体）后取3字符片段（shingle），
+   片段哈希建倒排表，只比较共享片段的段落对，避免两两比较；
+3. 共享片段数 / 较短段落的片段数 不低于阈值即视为匹配（兼容分段粗细不同）；
+   卷号相差超过 MAX_VOLUME_GAP 的不算匹配（各语料的卷号是自定义的，与原著卷数不对应；
+   实测可靠的匹配，即不少于8个片段且共享八成以上的，卷号都只差0或1）；
+   每段只与其他每种语料中得分最高的一段相连；同分时（如“汝当先觉，不入轮回”这类
+   反复出现的经文）以得分唯一最高的匹配为锚点插值出预期位置，取位置最近的一段，
+   以免重复经文把整章串在一起；
+   再用并查集合并为经文组，按讲记中的先后顺序编号。
+
+输出对照表：经文编号 -> (语料, 卷号, 文件, 起止行号)
+
+用法:
+    python align_passages.py [输出文件.csv|.json]
+"""
+
+import csv
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+import corpus_index
+import extract_chengguan
+
+# 片段长度（字）
+SHINGLE_SIZE = 3
+
+# 共享片段数 / 较短段落的片段数 达到该比例视为同一经文
+MATCH_THRESHOLD = 0.5
+
+# 出现在过多段落中的片段（如“佛告阿难”）区分度低，不参与比较
+MAX_POSTINGS = 40
+
+# 片段数少于该值的段落太短，不参与对齐
+MIN_SHINGLES = 2
+
+# 卷号相差超过该值的段落不视为同一经文：实测可靠的匹配卷号只差0或1；
+# 短句（如“亦名如来密因，修证了义”）常被远处的长段落包含，仅凭片段无法区分
+MAX_VOLUME_GAP = 1
+
+# 语料顺序，经文编号按第一个语料中的位置排列
+CORPUS_ORDER = ('yuanying', 'chengguan', 'gemini')
+
+ALIGNMENT_FIELDS = ['passage_id', 'corpus', 'volume', 'file', 'line_start', 'line_end', 'text']
+
+BOLD_LINE_RE = re.compile(r'^\s*\*\*(.+?)\*\*\s*$')
+
+# 不打断粗体段落的行：空行、页码注释、分隔线、页脚
+FILLER_LINE_RE = re.compile(r'^\s*(?:<!--.*-->|-{3,}|\*第 \d+ 页\*)?\s*$')
+
+CHINESE_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5,
+                  '六': 6, '七': 7, '八': 8, '九': 9}
+
+def volume_number(volume):
+    """卷号转为整数，如 '二十一' -> 21，'3' -> 3；无法识别时返回 0"""
+    if not volume:
+        return 0
+    if volume.isdigit():
+        return int(volume)
+    total, digit = 0, 0
+    for ch in volume:
+        if ch == '十':
+            total += (digit or 1) * 10
+            digit = 0
+        elif ch in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[ch]
+        else:
+            return 0
+    return total + digit
+
+def bold_passages(path):
+    """
+    取出整行粗体的经文段落；相邻的粗体行之间只有空行或页码标记时合为一段
+
+    产出 (起始行号, 结束行号, 文本)
+    """
+    start = end = None
+    parts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            match = BOLD_LINE_RE.match(line)
+            if match:
+                if start is None:
+                    start = line_no
+                end = line_no
+                parts.append(match.group(1))
+            elif FILLER_LINE_RE.match(line):
+                continue
+            elif start is not None:
+                yield start, end, "".join(parts)
+                start, parts = None, []
+    if start is not None:
+        yield start, end, "".join(parts)
+
+def sutra_passages(path):
+    """义贯的 **【...】** 经文段落，产出 (起始行号, 结束行号, 去掉标记的文本)"""
+    for record in extract_chengguan.iter_records(path, types=(extract_chengguan.SUTRA,)):
+        text = record['text'].replace('**', '').strip().removeprefix('【').removesuffix('】').strip()
+        yield record['line'], record['end_line'], text
+
+PASSAGE_READERS = {
+    'yuanying': bold_passages,
+    'chengguan': sutra_passages,
+    'gemini': bold_passages,
+}
+
+def collect_passages(corpora=CORPUS_ORDER):
+    """
+    读取各语料的经文段落
+
+    返回按 (语料顺序, 卷号, 行号) 排列的列表，
+    每项 {'corpus', 'volume', 'file', 'line_start', 'line_end', 'text'}
+    """
+    passages = []
+    for corpus, volume, path in corpus_index.volume_files(corpora):
+        for line_start, line_end, text in PASSAGE_READERS[corpus](path):
+            passages.append({'corpus': corpus, 'volume': volume, 'file': path.replace('\\', '/'),
+                             'line_start': line_start, 'line_end': line_end, 'text': text})
+    passages.sort(key=lambda p: (CORPUS_ORDER.index(p['corpus']), volume_number(p['volume']),
+                                 p['line_start']))
+    return passages
+
+def shingle_hashes(text, k=SHINGLE_SIZE):
+    """归一化文本的k字片段哈希（去重后的 uint64 数组）"""
+    normalized = re.sub(r'[\W_]+', '', corpus_index.normalize_query(text))
+    codes = np.frombuffer(normalized.encode('utf-32-le'), dtype='<u4').astype(np.uint64)
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    # 多项式哈希，uint64 自然溢出
+    h = np.zeros(len(codes) - k + 1, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for j in range(k):
+            h = h * np.uint64(1000003) + codes[j:len(codes) - k + 1 + j]
+    return np.unique(h)
+
+def candidate_pairs(passages, max_postings=MAX_POSTINGS):
+    """
+    通过片段倒排表找出共享片段的跨语料段落对
+
+    返回 (段落a数组, 段落b数组, 共享片段数数组, 各段落片段数数组)，a < b
+    """
+    hashes = [shingle_hashes(p['text']) for p in passages]
+    counts = np.array([len(h) for h in hashes], dtype=np.int64)
+    corpus_ids = np.array([CORPUS_ORDER.index(p['corpus']) for p in passages], dtype=np.int64)
+
+    owner = np.repeat(np.arange(len(passages)), counts)
+    keys = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    order = np.argsort(keys, kind='stable')
+    keys, owner = keys[order], owner[order]
+
+    # 按片段分组，去掉过于常见的片段
+    group_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    group_sizes = np.diff(np.concatenate((group_starts, [len(keys)])))
+    group_of = np.repeat(np.arange(len(group_starts)), group_sizes)
+    usable = (group_sizes[group_of] > 1) & (group_sizes[group_of] <= max_postings)
+    owner, group_of = owner[usable], group_of[usable]
+    starts = np.searchsorted(group_of, group_of, side='left')
+    sizes = np.searchsorted(group_of, group_of, side='right') - starts
+
+    # 每个元素与同组所有元素配对
+    left = np.repeat(np.arange(len(owner)), sizes)
+    within = np.arange(len(left)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    right = starts[left] + within
+    a, b = owner[left], owner[right]
+    keep = (a < b) & (corpus_ids[a] != corpus_ids[b])
+    pair_keys = a[keep] * len(passages) + b[keep]
+
+    pair_keys, shared = np.unique(pair_keys, return_counts=True)
+    return pair_keys // len(passages), pair_keys % len(passages), shared, counts
+
+def align(passages, threshold=MATCH_THRESHOLD, max_volume_gap=MAX_VOLUME_GAP):
+    """
+    对齐段落，返回各段落的经文编号列表（与 passages 一一对应，如 'P0001'）
+    同一经文组（含无匹配的单独段落）共用一个编号，编号按组内最靠前的段落排序
+    """
+    a, b, shared, counts = candidate_pairs(passages)
+    shorter = np.minimum(counts[a], counts[b])
+    # 卷号无法识别（0）时不限制
+    volumes = np.array([volume_number(p['volume']) for p in passages], dtype=np.int64)
+    near = (np.abs(volumes[a] - volumes[b]) <= max_volume_gap) | (volumes[a] == 0) | (volumes[b] == 0)
+    matched = (shorter >= MIN_SHINGLES) & (shared >= threshold * shorter) & near
+    a, b = a[matched], b[matched]
+    score = shared[matched] / shorter[matched]
+
+    # 段落在本语料中的序号
+    corpus_ids = np.array([CORPUS_ORDER.index(p['corpus']) for p in passages], dtype=np.int64)
+    rank = np.zeros(len(passages))
+    for c in np.unique(corpus_ids):
+        members = np.flatnonzero(corpus_ids == c)
+        rank[members] = np.arange(len(members))
+
+    # 双向的边，按 (起点, 终点语料, 得分从高到低) 排列
+    src = np.concatenate((a, b))
+    dst = np.concatenate((b, a))
+    score = np.concatenate((score, score))
+    order = np.lexsort((-score, corpus_ids[dst], src))
+    src, dst, score = src[order], dst[order], score[order]
+    group_start = np.concatenate(([True], (src[1:] != src[:-1]) |
+                                  (corpus_ids[dst][1:] != corpus_ids[dst][:-1])))
+    group_id = np.cumsum(group_start) - 1
+
+    # 锚点：组内得分唯一最高的边
+    group_first = np.flatnonzero(group_start)
+    second = np.minimum(group_first + 1, len(src) - 1)
+    unique_best = (second == group_first) | (group_id[second] != group_id[group_first]) | \
+                  (score[second] < score[group_first])
+    anchors = group_first[unique_best]
+
+    # 由锚点插值出每条边起点在终点语料中的预期序号，与终点的实际序号之差作为距离
+    distance = np.zeros(len(src))
+    for c_src in np.unique(corpus_ids):
+        for c_dst in np.unique(corpus_ids):
+            edges = np.flatnonzero((corpus_ids[src] == c_src) & (corpus_ids[dst] == c_dst))
+            pair_anchors = anchors[(corpus_ids[src[anchors]] == c_src) & (corpus_ids[dst[anchors]] == c_dst)]
+            if not len(edges) or not len(pair_anchors):
+                continue
+            anchor_order = np.argsort(rank[src[pair_anchors]], kind='stable')
+            expected = np.interp(rank[src[edges]], rank[src[pair_anchors]][anchor_order],
+                                 rank[dst[pair_anchors]][anchor_order])
+            distance[edges] = np.abs(rank[dst[edges]] - expected)
+
+    # 每段在每种其他语料中只保留得分最高、距离最近的一条边
+    order = np.lexsort((distance, -score, group_id))
+    src, dst = src[order], dst[order]
+    first = np.concatenate(([True], group_id[order][1:] != group_id[order][:-1]))
+
+    parent = list(range(len(passages)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(src[first].tolist(), dst[first].tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            # 以较靠前的段落为根，根即组内最靠前的段落
+            parent[max(rx, ry)] = min(rx, ry)
+
+    roots = [find(i) for i in range(len(passages))]
+    ids = {}
+    for root in roots:
+        if root not in ids:
+            ids[root] = f"P{len(ids) + 1:04d}"
+    return [ids[root] for root in roots]
+
+def build_alignment(corpora=CORPUS_ORDER, threshold=MATCH_THRESHOLD):
+    """读取并对齐所有经文段落，返回对照表记录列表（按经文编号、语料顺序排列）"""
+    passages = collect_passages(corpora)
+    passage_ids = align(passages, threshold)
+    rows = [dict(p, passage_id=pid) for p, pid in zip(passages, passage_ids)]
+    rows.sort(key=lambda r: r['passage_id'])
+    return rows
+
+def save_alignment(rows, path):
+    """按扩展名保存为 CSV（可直接用 Excel 打开）或 JSON"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=ALIGNMENT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{k: r[k] for k in ALIGNMENT_FIELDS} for r in rows], f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    output_file = sys.argv[1] if len(sys.argv) > 1 else 'alignment.csv'
+
+    start = time.perf_counter()
+    rows = build_alignment()
+    elapsed = time.perf_counter() - start
+
+    save_alignment(rows, output_file)
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['passage_id'], set()).add(row['corpus'])
+    aligned = {n: sum(1 for corpora in groups.values() if len(corpora) == n) for n in (1, 2, 3)}
+    print(f"经文段落 {len(rows)} 段，经文组 {len(groups)} 个（三种资料对齐 {aligned[3]}，"
+          f"两种 {aligned[2]}，未对齐 {aligned[1]}），用时 {elapsed:.2f}s")
+    print(f"对照表已保存: {output_file}")
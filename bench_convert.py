@@ -0,0 +1,175 @@
+"""
+PDF 转换基准：用 synth_pdf 生成的繁体 PDF 测量 convert_pdf_to_md / convert_pdf_to_html
+
+对每种 版式 × 页数 × 格式 报告：
+    pages_per_second   端到端转换速度（含写出），重复 --repeat 次取最快的一次
+    stages             各阶段累计耗时（秒，阶段见 pdf_profile.STAGES，不含写出）
+    peak_rss_kb        单个进程的峰值常驻内存：转换进程和各工作进程中最大的一个（不是总和）
+    peak_worker_rss_kb 工作进程中最大的峰值常驻内存（RUSAGE_CHILDREN），--workers 1 时为 0
+    peak_traced_kb     tracemalloc 统计的 Python 分配峰值（单独一次运行，不影响计时）；
+                       tracemalloc 只统计本进程，--workers 大于 1 时页面都在工作进程中处理，记为 null
+
+每次测量都在新的子进程中运行，互不影响。结果写入 JSON（含当前 git 提交），
+可用 --compare 与之前的结果对比，找出性能回退。
+
+用法:
+    python bench_convert.py [--pages 20 100] [--layouts vertical horizontal] [--formats md html]
+                            [--workers 1] [--output bench_results.json] [--compare 旧结果.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = 'bench_pdfs'
+CONVERTERS = {'md': 'convert_pdf_to_md', 'html': 'convert_pdf_to_html'}
+
+def bench_pdf(pages, layout, seed=0, bench_dir=BENCH_DIR):
+    """生成（或复用已生成的）基准 PDF，返回路径"""
+    import synth_pdf
+    os.makedirs(bench_dir, exist_ok=True)
+    path = os.path.join(bench_dir, f'{layout}_{pages}p_s{seed}.pdf')
+    if not os.path.exists(path):
+        synth_pdf.generate_pdf(path, pages, layout, seed)
+    return path
+
+def _measure_conversion(pdf_path, fmt, workers, traced):
+    """
+    子进程：完整转换一次，返回耗时和内存峰值
+
+    转换返回时进程池已关闭并回收，RUSAGE_CHILDREN 即为各工作进程中最大的峰值
+    """
+    import pdf_converter
+    convert = getattr(pdf_converter, CONVERTERS[fmt])
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'out.' + fmt)
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert(pdf_path, output, skip_pages=0, workers=workers, profile=False)
+        elapsed = time.perf_counter() - start
+        own_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        result = {'seconds': elapsed, 'output_bytes': os.path.getsize(output),
+                  'peak_rss_kb': max(own_rss, worker_rss), 'peak_worker_rss_kb': worker_rss}
+        if traced:
+            result['peak_traced_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+    return result
+
+def _measure_stages(pdf_path, fmt):
+    """子进程：开启分阶段计时逐页转换（不写出），返回各阶段累计耗时"""
+    import pdf_converter
+    from pdf_profile import STAGES
+
+    stages = dict.fromkeys(STAGES[:-1], 0.0)
+    for *_, timings in pdf_converter.iter_page_range(pdf_path, 0, page_count(pdf_path), fmt, profile=True):
+        if timings:
+            for name, seconds in timings['stages'].items():
+                stages[name] += seconds
+    return {name: round(seconds, 4) for name, seconds in stages.items()}
+
+def page_count(pdf_path):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def in_child(func, *args):
+    """在新的子进程中执行 func(*args)"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(func, *args).result()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(page_counts=(20,), layouts=('vertical', 'horizontal'), formats=('md', 'html'),
+                   workers=1, seed=0, repeat=3):
+    """执行所有组合，计时取 repeat 次中最快的一次，返回结果字典"""
+    results = []
+    for layout in layouts:
+        for pages in page_counts:
+            pdf_path = bench_pdf(pages, layout, seed)
+            for fmt in formats:
+                timings = [in_child(_measure_conversion, pdf_path, fmt, workers, False) for _ in range(repeat)]
+                timing = min(timings, key=lambda t: t['seconds'])
+                timing['peak_rss_kb'] = max(t['peak_rss_kb'] for t in timings)
+                timing['peak_worker_rss_kb'] = max(t['peak_worker_rss_kb'] for t in timings)
+                traced = in_child(_measure_conversion, pdf_path, fmt, workers, True) if workers <= 1 else None
+                stage_runs = [in_child(_measure_stages, pdf_path, fmt) for _ in range(repeat)]
+                stages = min(stage_runs, key=lambda s: sum(s.values()))
+                result = {
+                    'layout': layout, 'pages': pages, 'format': fmt, 'workers': workers,
+                    'seconds': round(timing['seconds'], 4),
+                    'pages_per_second': round(pages / timing['seconds'], 2),
+                    'stages': stages,
+                    'peak_rss_kb': timing['peak_rss_kb'],
+                    'peak_worker_rss_kb': timing['peak_worker_rss_kb'],
+                    'peak_traced_kb': traced['peak_traced_kb'] if traced else None,
+                    'output_bytes': timing['output_bytes'],
+                }
+                results.append(result)
+                traced_mb = f"{traced['peak_traced_kb'] // 1024} MB" if traced else "-"
+                print(f"{layout:10s} {pages:4d}页 {fmt:4s} {result['pages_per_second']:7.2f} 页/秒  "
+                      f"峰值RSS {result['peak_rss_kb'] // 1024} MB（工作进程 {result['peak_worker_rss_kb'] // 1024} MB）  "
+                      f"tracemalloc {traced_mb}  " + " ".join(f"{k} {v:.2f}s" for k, v in stages.items()))
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare_results(old, new):
+    """按 (版式, 页数, 格式, 进程数) 对比两次结果的速度和内存"""
+    def key(r):
+        return (r['layout'], r['pages'], r['format'], r['workers'])
+
+    previous = {key(r): r for r in old['results']}
+    print(f"\n对比 {old.get('commit')} -> {new.get('commit')}:")
+    for r in new['results']:
+        p = previous.get(key(r))
+        if not p:
+            continue
+        speed = r['pages_per_second'] / p['pages_per_second'] - 1
+        memory = r['peak_rss_kb'] / p['peak_rss_kb'] - 1
+        print(f"  {r['layout']:10s} {r['pages']:4d}页 {r['format']:4s} 速度 {speed:+.1%}  峰值RSS {memory:+.1%}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PDF 转换基准')
+    parser.add_argument('--pages', type=int, nargs='+', default=[20])
+    parser.add_argument('--layouts', nargs='+', default=['vertical', 'horizontal'],
+                        choices=['vertical', 'horizontal'])
+    parser.add_argument('--formats', nargs='+', default=['md', 'html'], choices=sorted(CONVERTERS))
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数，取最快的一次')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    args = parser.parse_args()
+
+    summary = run_benchmarks(args.pages, args.layouts, args.formats, args.workers, args.seed, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    print(f"结果已保存: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), summary)
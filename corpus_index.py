@@ -0,0 +1,275 @@
+"""
+讲记、义贯、白话译文的全文短语索引
+
+每卷文件先归一化：去掉 Markdown 标记、HTML 标签、页码标记和所有空白，
+再逐字做繁体→简体折叠（长度不变），这样繁简混排、粗体标记或换行打断的短语也能找到。
+归一化后的文本按卷建立后缀数组，连同每个字在原文件中的字节偏移和行号保存到索引目录，
+查询时对每卷做二分查找。
+
+索引目录结构：
+    manifest.json    版本、各卷文件的大小/修改时间/哈希及对应的数据文件
+    <卷数据>.npz      codes: 归一化文本（码点），sa: 后缀数组，
+                     offsets/widths: 各字在原文件中的字节偏移/字节数，lines: 行号
+
+某卷文件变化后重新 build 只会重建该卷。
+
+NumPy 和 t2s（OpenCC 词典）在用到时才导入：其他脚本只为 CORPUS_FILES、volume_files 等
+导入本模块时不必承担它们的启动开销。
+
+用法:
+    python corpus_index.py build
+    python corpus_index.py query 如是我闻 [yuanying|chengguan|gemini]
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+INDEX_DIR = 'corpus_index'
+INDEX_VERSION = 1
+
+# 语料名 -> 各卷文件的通配符
+CORPUS_FILES = {
+    'yuanying': os.path.join('yuanying_doc', '楞严经讲记_第*卷.md'),
+    'chengguan': os.path.join('chengguan_doc', '楞严经义贯_第*卷.md'),
+    'gemini': os.path.join('gemini_doc', '*_白话译文_*.md'),
+}
+
+VOLUME_NAME_RE = re.compile(r'第(.+?)卷')
+
+# 整段去掉的内容：HTML 注释（页码标记）、页脚、分隔线、HTML 标签、图片引用
+STRIP_RE = re.compile(
+    r'<!--[\s\S]*?-->'
+    r'|(?m:^\*第 \d+ 页\*[ \t]*$)'
+    r'|(?m:^[ \t]*-{3,}[ \t]*$)'
+    r'|<[^>\n]+>'
+    r'|!\[[^\]\n]*\]'
+)
+
+# 逐字去掉的字符：Markdown 标记和空白
+STRIP_CHARS = '*#>|_`~-' + ' \t\n\r\f\v　\xa0'
+
+_ascii_lower = {ord(c): ord(c.lower()) for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'}
+
+def fold(text):
+    """繁体→简体逐字折叠并把ASCII字母转为小写，长度不变"""
+    import t2s
+    return t2s.get_converter().convert_chars(text).translate(_ascii_lower)
+
+def normalize_query(phrase):
+    """查询短语的归一化，与建索引时一致"""
+    phrase = STRIP_RE.sub('', phrase)
+    return fold(''.join(ch for ch in phrase if ch not in STRIP_CHARS))
+
+def normalize_file(path):
+    """
+    归一化一个文件
+
+    返回 (归一化文本, 各字符在原文件中的字节偏移数组, 字节数数组, 所在行号数组)
+    """
+    import numpy as np
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    # 每个字符的 UTF-8 字节数，累加得到字节偏移
+    widths = 1 + (codes >= 0x80) + (codes >= 0x800) + (codes >= 0x10000)
+    offsets = np.concatenate(([0], np.cumsum(widths)[:-1])).astype(np.int64)
+    lines = np.concatenate(([1], 1 + np.cumsum(codes == ord('\n'))[:-1])).astype(np.int32)
+
+    keep = ~np.isin(codes, np.array([ord(c) for c in STRIP_CHARS], dtype='<u4'))
+    for match in STRIP_RE.finditer(text):
+        keep[match.start():match.end()] = False
+
+    normalized = codes[keep].tobytes().decode('utf-32-le')
+    return fold(normalized), offsets[keep], widths[keep].astype(np.uint8), lines[keep]
+
+def suffix_array(codes):
+    """倍增法构造后缀数组（NumPy 向量化，每轮一次 lexsort）"""
+    import numpy as np
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    rank = np.unique(codes, return_inverse=True)[1].astype(np.int64)
+    k = 1
+    while True:
+        second = np.full(n, -1, dtype=np.int64)
+        if k < n:
+            second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        first_sorted, second_sorted = rank[sa], second[sa]
+        changed = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.concatenate(([0], np.cumsum(changed)))
+        if rank[sa[-1]] == n - 1 or k >= n:
+            return sa.astype(np.int32)
+        k *= 2
+
+def volume_files(corpora=None):
+    """[(语料名, 卷号, 文件路径), ...]，按语料、文件名排序"""
+    files = []
+    for corpus, pattern in CORPUS_FILES.items():
+        if corpora and corpus not in corpora:
+            continue
+        for path in sorted(glob.glob(pattern)):
+            match = VOLUME_NAME_RE.search(os.path.basename(path))
+            files.append((corpus, match.group(1) if match else None, path))
+    return files
+
+def file_stamp(path):
+    """文件的 (大小, 修改时间)，用于快速判断是否需要重新计算哈希"""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def load_manifest(index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {'version': INDEX_VERSION, 'volumes': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != INDEX_VERSION:
+        return {'version': INDEX_VERSION, 'volumes': {}}
+    return manifest
+
+def save_manifest(manifest, index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, 'manifest.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def build_index(index_dir=INDEX_DIR, corpora=None):
+    """
+    建立或增量更新索引：只重建内容变化的卷，删除已不存在的卷
+
+    返回 (重建的卷数, 未变化的卷数)
+    """
+    import numpy as np
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = load_manifest(index_dir)
+    volumes = manifest['volumes']
+    rebuilt = unchanged = 0
+    seen = set()
+
+    for corpus, volume, path in volume_files(corpora):
+        key = path.replace(os.sep, '/')
+        seen.add(key)
+        stamp = file_stamp(path)
+        entry = volumes.get(key)
+        data_path = os.path.join(index_dir, entry['data']) if entry else None
+        if entry and data_path and os.path.exists(data_path):
+            if entry['stamp'] == stamp:
+                unchanged += 1
+                continue
+            # 修改时间变了但内容没变（如重新检出），只更新时间戳
+            content_hash = file_hash(path)
+            if entry['sha1'] == content_hash:
+                entry['stamp'] = stamp
+                unchanged += 1
+                continue
+        else:
+            content_hash = file_hash(path)
+
+        start = time.perf_counter()
+        normalized, offsets, widths, lines = normalize_file(path)
+        codes = np.frombuffer(normalized.encode('utf-32-le'), dtype='<u4')
+        sa = suffix_array(codes)
+        data_name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.npz'
+        np.savez(os.path.join(index_dir, data_name), codes=codes, sa=sa, offsets=offsets,
+                 widths=widths, lines=lines)
+        volumes[key] = {'corpus': corpus, 'volume': volume, 'stamp': stamp,
+                        'sha1': content_hash, 'data': data_name, 'length': len(codes)}
+        rebuilt += 1
+        print(f"已索引: {path}（{len(codes)} 字，{time.perf_counter() - start:.2f}s）")
+
+    for key in list(volumes):
+        if key not in seen and (not corpora or volumes[key]['corpus'] in corpora):
+            data_path = os.path.join(index_dir, volumes.pop(key)['data'])
+            if os.path.exists(data_path):
+                os.remove(data_path)
+            print(f"已移除: {key}")
+
+    save_manifest(manifest, index_dir)
+    print(f"索引完成：重建 {rebuilt} 卷，未变化 {unchanged} 卷")
+    return rebuilt, unchanged
+
+class CorpusIndex:
+    """
+    已建立的索引；各卷数据在第一次查询时才读入
+
+    用法:
+        index = CorpusIndex()
+        for hit in index.find('如是我闻'):
+            print(hit['file'], hit['line'], hit['offset'])
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self.manifest = load_manifest(index_dir)
+        self._volumes = {}
+
+    def _load(self, key):
+        if key not in self._volumes:
+            import numpy as np
+            entry = self.manifest['volumes'][key]
+            with np.load(os.path.join(self.index_dir, entry['data'])) as data:
+                self._volumes[key] = (data['codes'].tobytes().decode('utf-32-le'),
+                                      data['sa'], data['offsets'], data['widths'],
+                                      data['lines'])
+        return self._volumes[key]
+
+    def find(self, phrase, corpora=None):
+        """
+        查找短语的所有出现位置
+
+        返回 [{'corpus', 'volume', 'file', 'line', 'offset', 'end'}, ...]，
+        line 为起始行号，offset/end 为原文件中的字节范围；按语料、文件、位置排序
+        """
+        query = normalize_query(phrase)
+        if not query:
+            return []
+        m = len(query)
+        hits = []
+        for key, entry in self.manifest['volumes'].items():
+            if corpora and entry['corpus'] not in corpora:
+                continue
+            text, sa, offsets, widths, lines = self._load(key)
+
+            def prefix(i):
+                return text[i:i + m]
+
+            # 后缀数组有序，各后缀的前 m 个字也有序，二分即可找到所有以 query 开头的后缀
+            lo = bisect_left(sa, query, key=prefix)
+            hi = bisect_right(sa, query, lo=lo, key=prefix)
+            for pos in sorted(sa[lo:hi].tolist()):
+                last = pos + m - 1
+                end = int(offsets[last]) + int(widths[last])
+                hits.append({'corpus': entry['corpus'], 'volume': entry['volume'], 'file': key,
+                             'line': int(lines[pos]), 'offset': int(offsets[pos]), 'end': end})
+        return hits
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'query'):
+        print("用法: python corpus_index.py build | query <短语> [语料名]")
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        build_index(corpora=sys.argv[2:] or None)
+    else:
+        index = CorpusIndex()
+        start = time.perf_counter()
+        hits = index.find(sys.argv[2], sys.argv[3:] or None)
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            print(f"{hit['file']}:{hit['line']}  第{hit['volume']}卷  字节 {hit['offset']}-{hit['end']}")
+        print(f"共 {len(hits)} 处，用时 {elapsed * 1000:.1f} ms")
@@ -0,0 +1,301 @@
+"""
+讲记、义贯、白话译文的二进制语料包：用 mmap 打开，按编号直接读取任一段落，不解析 Markdown
+
+每种语料一个文件 corpus_pack/<语料名>.pack：
+
+    魔数 LYPACK1\\0（8字节） + 头部长度（u32） + 头部 JSON（UTF-8，补齐到8字节）
+    卷表    VOLUME_DTYPE，每卷一条：第一个段落的编号、段落数、该卷文本在正文区中的起点和长度
+    段落表  PARAGRAPH_DTYPE，每段一条：文本在正文区中的起点和长度、起止行号、卷编号、类型
+    正文区  各段落文本（UTF-8）依次排列，段落之间以换行分隔（不计入段落长度），
+            一卷的文本连续存放，整卷可一次取出
+
+头部 JSON 记录各区的位置、段落类型表 KINDS、各卷的文件/卷号/源文件 sha1/大小，以及卷表、段落表、
+正文区的 sha1（checksum）。段落类型在各语料间统一编号：经文、讲义、注释、义贯、诠论、译文。
+
+段落切分与 retrieval 一致：讲记为 经文/讲义，义贯为 经文/注释/义贯/诠论（PDF 逐行文本拼回自然段）；
+白话译文为 经文/译文（每个 Markdown 段落一段，第一段经文之前的卷首标题、大纲不收录）。
+
+build 时源文件的 sha1 都与包中记录的相同则不重建；重建后重新打开并核对 checksum。
+
+用法:
+    python corpus_pack.py build [语料名...] [--force]
+    python corpus_pack.py verify [语料名...]
+    python corpus_pack.py read 语料名 段落编号
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import align_passages
+import corpus_index
+import extract_chengguan
+import retrieval
+
+PACK_DIR = 'corpus_pack'
+PACK_VERSION = 1
+MAGIC = b'LYPACK1\0'
+
+CORPORA = ('yuanying', 'chengguan', 'gemini')
+
+TRANSLATION = '译文'
+KINDS = retrieval.KINDS + (TRANSLATION,)
+
+VOLUME_DTYPE = np.dtype([('first', '<u4'), ('count', '<u4'), ('offset', '<u8'), ('length', '<u8')])
+PARAGRAPH_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('line_start', '<u4'), ('line_end', '<u4'),
+                            ('volume', '<u2'), ('kind', 'u1'), ('reserved', 'u1')])
+
+def gemini_paragraphs(path):
+    """白话译文一卷的段落 [(类型, 起始行号, 结束行号, 文本), ...]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    passages = list(align_passages.bold_passages(path))
+    bounds = [start for start, _, _ in passages] + [len(lines) + 1]
+    paragraphs = []
+    for i, (start, end, text) in enumerate(passages):
+        paragraphs.append((extract_chengguan.SUTRA, start, end, retrieval.clean_line(text)))
+        line_no = end + 1
+        while line_no < bounds[i + 1]:
+            # 空行之间的连续行为一个 Markdown 段落
+            if retrieval.SKIP_LINE_RE.match(lines[line_no - 1]) or not lines[line_no - 1].strip():
+                line_no += 1
+                continue
+            first = line_no
+            while line_no < bounds[i + 1] and lines[line_no - 1].strip():
+                line_no += 1
+            text = "".join(retrieval.clean_line(line) for line in lines[first - 1:line_no - 1])
+            paragraphs.append((TRANSLATION, first, line_no - 1, text))
+    return paragraphs
+
+PARAGRAPH_READERS = dict(retrieval.PARAGRAPH_READERS, gemini=gemini_paragraphs)
+
+def pack_path(corpus, pack_dir=PACK_DIR):
+    return os.path.join(pack_dir, corpus + '.pack')
+
+def source_files(corpus):
+    """语料各卷的 [{'file', 'volume', 'sha1', 'size'}, ...]"""
+    return [{'file': path.replace(os.sep, '/'), 'volume': volume,
+             'sha1': corpus_index.file_hash(path), 'size': os.path.getsize(path)}
+            for _, volume, path in corpus_index.volume_files([corpus])]
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+def align8(n):
+    return (n + 7) // 8 * 8
+
+def write_pack(corpus, path, volumes):
+    """切分各卷段落并写出语料包（先写临时文件再替换），返回头部"""
+    volume_table = np.zeros(len(volumes), dtype=VOLUME_DTYPE)
+    rows = []
+    chunks = []
+    offset = 0
+    for v, entry in enumerate(volumes):
+        volume_table[v]['first'] = len(rows)
+        volume_table[v]['offset'] = offset
+        for kind, line_start, line_end, text in PARAGRAPH_READERS[corpus](entry['file']):
+            if not text:
+                continue
+            data = text.encode('utf-8')
+            rows.append((offset, len(data), line_start, line_end, v, KINDS.index(kind), 0))
+            chunks.append(data + b'\n')
+            offset += len(data) + 1
+        volume_table[v]['count'] = len(rows) - volume_table[v]['first']
+        volume_table[v]['length'] = offset - volume_table[v]['offset']
+    paragraph_table = np.array(rows, dtype=PARAGRAPH_DTYPE)
+    blob = b"".join(chunks)
+
+    sections = {'volumes': volume_table.tobytes(), 'paragraphs': paragraph_table.tobytes(), 'text': blob}
+    header = {'version': PACK_VERSION, 'corpus': corpus, 'kinds': list(KINDS), 'files': volumes,
+              'paragraphs': len(rows), 'sections': {}}
+    # 各区的位置取决于头部长度，头部又包含各区的位置：先按留有余量的长度排一次，
+    # 写入位置后的头部仍放不下时加大预留再排，直到放得下
+    header['sections'] = {name: {'offset': 0, 'length': len(data), 'sha1': sha1(data)}
+                          for name, data in sections.items()}
+    encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    while True:
+        reserve = align8(len(MAGIC) + 4 + len(encoded) + 64)
+        position = reserve
+        for name, data in sections.items():
+            header['sections'][name]['offset'] = position
+            position = align8(position + len(data))
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(MAGIC) + 4 + len(encoded) <= reserve:
+            break
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        for name, data in sections.items():
+            f.write(b'\0' * (header['sections'][name]['offset'] - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+    return header
+
+def build_pack(corpus, pack_dir=PACK_DIR, force=False):
+    """
+    由 Markdown 重建一种语料的包；源文件都没变时跳过（除非 force）
+
+    重建后重新打开并核对各区 checksum。返回是否重建
+    """
+    path = pack_path(corpus, pack_dir)
+    volumes = source_files(corpus)
+    if not force and os.path.exists(path):
+        try:
+            with CorpusPack(path) as pack:
+                if pack.header['version'] == PACK_VERSION and pack.header['files'] == volumes:
+                    print(f"{corpus}: 无变化（{len(pack)} 段）")
+                    return False
+        except ValueError:
+            pass
+
+    start = time.perf_counter()
+    os.makedirs(pack_dir, exist_ok=True)
+    write_pack(corpus, path, volumes)
+    with CorpusPack(path) as pack:
+        bad = pack.verify_checksums()
+        if bad:
+            raise ValueError(f"{path} 写出后校验失败: {'、'.join(bad)}")
+        print(f"{corpus}: {len(volumes)} 卷，{len(pack)} 段，{os.path.getsize(path) // 1024} KB，"
+              f"{time.perf_counter() - start:.2f}s -> {path}")
+    return True
+
+class CorpusPack:
+    """
+    用 mmap 打开的语料包；卷表、段落表是映射在文件上的 NumPy 数组，不读入整个文件
+
+    用法:
+        with CorpusPack('corpus_pack/yuanying.pack') as pack:
+            for i in pack.select(kind='经文', volume='二'):
+                print(pack.text(i))
+            print(pack.paragraph(10))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} 不是语料包")
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} 不是语料包")
+        # 头部或各区损坏时先关闭 mmap 和文件再抛出
+        try:
+            (length,) = struct.unpack_from('<I', self._map, len(MAGIC))
+            start = len(MAGIC) + 4
+            self.header = json.loads(self._map[start:start + length].decode('utf-8'))
+            self.kinds = self.header['kinds']
+            self.files = self.header['files']
+            sections = self.header['sections']
+            self.volumes = np.frombuffer(self._map, dtype=VOLUME_DTYPE, count=len(self.files),
+                                         offset=sections['volumes']['offset'])
+            self.paragraphs = np.frombuffer(self._map, dtype=PARAGRAPH_DTYPE, count=self.header['paragraphs'],
+                                            offset=sections['paragraphs']['offset'])
+            self._text_offset = sections['text']['offset']
+            self._volume_index = {entry['volume']: v for v, entry in enumerate(self.files)}
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # 映射上的数组必须先释放，mmap 才能关闭；调用方仍持有其中的数组时留给垃圾回收
+        self.volumes = self.paragraphs = None
+        if getattr(self, '_map', None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        self._file.close()
+
+    def _bytes(self, offset, length):
+        start = self._text_offset + int(offset)
+        return self._map[start:start + int(length)]
+
+    def text(self, i):
+        """第 i 段的文本"""
+        row = self.paragraphs[i]
+        return self._bytes(row['offset'], row['length']).decode('utf-8')
+
+    def paragraph(self, i):
+        """第 i 段：{'index', 'file', 'volume', 'kind', 'line_start', 'line_end', 'text'}"""
+        row = self.paragraphs[i]
+        entry = self.files[row['volume']]
+        return {'index': i, 'file': entry['file'], 'volume': entry['volume'], 'kind': self.kinds[row['kind']],
+                'line_start': int(row['line_start']), 'line_end': int(row['line_end']), 'text': self.text(i)}
+
+    def volume_text(self, volume):
+        """一卷的全部段落文本（以换行分隔）；volume 为卷号（如 '二'）"""
+        row = self.volumes[self._volume_index[volume]]
+        return self._bytes(row['offset'], row['length']).decode('utf-8')
+
+    def select(self, kind=None, volume=None):
+        """满足条件的段落编号（NumPy 数组）；kind 为段落类型，volume 为卷号"""
+        if volume is not None:
+            row = self.volumes[self._volume_index[volume]]
+            first, stop = int(row['first']), int(row['first'] + row['count'])
+        else:
+            first, stop = 0, len(self.paragraphs)
+        indices = np.arange(first, stop)
+        if kind is not None:
+            indices = indices[self.paragraphs['kind'][first:stop] == self.kinds.index(kind)]
+        return indices
+
+    def verify_checksums(self):
+        """核对各区的 sha1，返回不一致的区名"""
+        return [name for name, section in self.header['sections'].items()
+                if sha1(self._map[section['offset']:section['offset'] + section['length']]) != section['sha1']]
+
+    def stale_files(self):
+        """内容与打包时不同（或已不存在）的源文件"""
+        stale = []
+        for entry in self.files:
+            if not os.path.exists(entry['file']) or corpus_index.file_hash(entry['file']) != entry['sha1']:
+                stale.append(entry['file'])
+        return stale
+
+def open_pack(corpus, pack_dir=PACK_DIR):
+    return CorpusPack(pack_path(corpus, pack_dir))
+
+def verify(corpora=CORPORA, pack_dir=PACK_DIR):
+    """核对各语料包的 checksum 和源文件，打印结果；全部一致时返回 True"""
+    ok = True
+    for corpus in corpora:
+        path = pack_path(corpus, pack_dir)
+        if not os.path.exists(path):
+            print(f"{corpus}: 没有语料包，请先执行 build")
+            ok = False
+            continue
+        with CorpusPack(path) as pack:
+            bad = pack.verify_checksums()
+            stale = pack.stale_files()
+            if bad:
+                print(f"{corpus}: 校验失败: {'、'.join(bad)}")
+            if stale:
+                print(f"{corpus}: 源文件已改变，需要重建: {'、'.join(stale)}")
+            if not bad and not stale:
+                print(f"{corpus}: 一致（{len(pack.files)} 卷，{len(pack)} 段）")
+            ok = ok and not bad and not stale
+    return ok
+
+if __name__ == '__main__':
+    import lengyan
+    lengyan.main(['pack'] + sys.argv[1:])
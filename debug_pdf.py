@@ -1,5 +1,23 @@
 import pdfplumber
 import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pdf_layout
+
+# 字号直方图的分辨率：0.1pt 一档
+SIZE_BIN = 0.1
+
+# 建议字号范围时在峰值两侧各留的误差
+BAND_MARGIN = 0.5
+
+# 经文字号至少占全部字符的比例，过少的大字号视为标题、页眉等
+SUTRA_MIN_SHARE = 0.02
+
+# _profile_pages 返回的坐标数组的列
+COORD_KEYS = ('x0', 'x1', 'top', 'bottom', 'size')
 
 def debug_pdf(input_path, page_num=1):
     """调试：查看PDF页面的字符坐标分布"""
@@ -36,6 +54,195 @@ def debug_pdf(input_path, page_num=1):
         print(f"\n不同的Y坐标数量（行数）: {len(unique_y)}")
         print(f"前10个Y坐标: {unique_y[:10]}")
 
+def sample_pages(total_pages, sample_size=None, seed=0):
+    """
+    从全书中抽取页码（从0开始，升序）
+    sample_size 为 None 或不小于总页数时返回全部页码；抽样使用固定种子，结果可复现
+    """
+    if not sample_size or sample_size >= total_pages:
+        return list(range(total_pages))
+    rng = np.random.default_rng(seed)
+    return sorted(rng.choice(total_pages, size=sample_size, replace=False).tolist())
+
+def _profile_pages(input_path, pages):
+    """
+    进程池工作函数：统计若干页的字号、字体，并取出各页字符的坐标
+
+    返回 {'sizes': (字号档位数组, 字符数数组), 'fonts': (字体名数组, 字符数数组),
+          'pages': [(页码, 坐标数组 N×5：x0, x1, top, bottom, size), ...]}
+    布局要在确定字号范围、过滤字符后才能判断（见 page_layouts），这里只保留坐标
+    """
+    size_bins = []
+    fontnames = []
+    coords = []
+    with pdfplumber.open(input_path) as pdf:
+        for i in pages:
+            page = pdf.pages[i]
+            try:
+                chars = page.chars
+                arrays = pdf_layout.char_arrays(chars)
+                coords.append((i, np.column_stack([arrays[key] for key in COORD_KEYS])))
+                size_bins.append(np.rint(arrays['size'] / SIZE_BIN).astype(np.int64))
+                fontnames.extend(c.get('fontname', '') for c in chars)
+            finally:
+                page.close()
+
+    size_bins = np.concatenate(size_bins) if size_bins else np.zeros(0, dtype=np.int64)
+    return {
+        'sizes': np.unique(size_bins, return_counts=True),
+        'fonts': np.unique(np.array(fontnames, dtype=str), return_counts=True),
+        'pages': coords,
+    }
+
+def page_layouts(pages, size_bands):
+    """
+    按 size_bands 过滤各页字符后判断布局，与转换器（pdf_layout.page_layout）的判断相同
+
+    返回 [(页码, 布局, 过滤后字符数, 是否混排), ...]；页面没有字符时布局为 'empty'，
+    没有字号范围内的字符时为 'unmatched'
+    """
+    layouts = []
+    for i, page_coords in pages:
+        if not len(page_coords):
+            layouts.append((i, 'empty', 0, False))
+            continue
+        size = page_coords[:, COORD_KEYS.index('size')]
+        keep = np.zeros(len(size), dtype=bool)
+        for low, high in size_bands:
+            keep |= (size >= low) & (size <= high)
+        if not keep.any():
+            layouts.append((i, 'unmatched', 0, False))
+            continue
+        arrays = {key: page_coords[keep, k] for k, key in enumerate(COORD_KEYS)}
+        layout, minority, _, _ = pdf_layout.page_layout(arrays)
+        layouts.append((i, layout, int(keep.sum()), minority is not None))
+    return layouts
+
+def suggest_size_bands(sizes, counts, margin=BAND_MARGIN, min_share=SUTRA_MIN_SHARE):
+    """
+    根据字号直方图建议讲义与经文的字号范围
+
+    字符数最多的字号视为讲义（正文）；比讲义范围更大、且字符数占比不低于 min_share 的字号中，
+    字符数最多的视为经文。找不到经文字号时经文范围为 None
+
+    返回 ((讲义下限, 讲义上限), (经文下限, 经文上限) 或 None)
+    """
+    if not len(sizes):
+        return None, None
+
+    def band(size):
+        return (round(size - margin, 1), round(size + margin, 1))
+
+    body = float(sizes[np.argmax(counts)])
+    body_band = band(body)
+
+    candidates = (sizes > body_band[1]) & (counts >= counts.sum() * min_share)
+    if not candidates.any():
+        return body_band, None
+    sutra = float(sizes[candidates][np.argmax(counts[candidates])])
+    return body_band, band(sutra)
+
+def profile_pdf(input_path, sample_size=200, workers=1, seed=0):
+    """
+    全书字号/字体/布局统计：并行抽样若干页，汇总字号直方图、字体直方图和各页布局，
+    并据此建议讲义与经文的字号范围
+
+    参数:
+        sample_size: 抽样页数，None 表示统计全部页面
+        workers: 并行处理的进程数，默认1（串行）
+        seed: 抽样的随机种子
+
+    返回统计结果字典，可直接交给 save_calibration 保存为校准文件
+    """
+    with pdfplumber.open(input_path) as pdf:
+        total_pages = len(pdf.pages)
+    pages = sample_pages(total_pages, sample_size, seed)
+
+    # 每个任务处理一段连续的抽样页，每个进程约分到4个任务
+    chunk_size = max(1, -(-len(pages) // (max(workers, 1) * 4)))
+    chunks = [pages[k:k + chunk_size] for k in range(0, len(pages), chunk_size)]
+    if workers <= 1:
+        results = [_profile_pages(input_path, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_profile_pages, [input_path] * len(chunks), chunks))
+
+    # 合并各任务的直方图
+    size_bins = np.concatenate([r['sizes'][0] for r in results] or [np.zeros(0, dtype=np.int64)])
+    size_counts = np.concatenate([r['sizes'][1] for r in results] or [np.zeros(0, dtype=np.int64)])
+    bins, inverse = np.unique(size_bins, return_inverse=True)
+    bin_counts = np.bincount(inverse, weights=size_counts, minlength=len(bins)).astype(np.int64)
+    sizes = np.round(bins * SIZE_BIN, 1)
+
+    names = np.concatenate([r['fonts'][0] for r in results] or [np.zeros(0, dtype=str)])
+    name_counts = np.concatenate([r['fonts'][1] for r in results] or [np.zeros(0, dtype=np.int64)])
+    fonts, inverse = np.unique(names, return_inverse=True)
+    font_counts = np.bincount(inverse, weights=name_counts, minlength=len(fonts)).astype(np.int64)
+
+    body_band, sutra_band = suggest_size_bands(sizes, bin_counts)
+
+    # 与转换器一样先按字号范围（建议值，缺失时用默认值）过滤，再判断各页布局
+    from pdf_converter import SIZE_BANDS
+    size_bands = (body_band or SIZE_BANDS[0], sutra_band or SIZE_BANDS[1])
+    layouts = page_layouts([page for r in results for page in r['pages']], size_bands)
+    layout_names = np.array([layout for _, layout, _, _ in layouts], dtype=str)
+    layout_kinds, layout_counts = np.unique(layout_names, return_counts=True)
+
+    return {
+        'source': os.path.basename(input_path),
+        'total_pages': total_pages,
+        'sampled_pages': len(pages),
+        'size_histogram': [[float(s), int(n)] for s, n in zip(sizes.tolist(), bin_counts.tolist())],
+        'font_histogram': sorted(([str(f), int(n)] for f, n in zip(fonts.tolist(), font_counts.tolist())),
+                                 key=lambda item: -item[1]),
+        'layout_histogram': {str(k): int(n) for k, n in zip(layout_kinds.tolist(), layout_counts.tolist())},
+        'mixed_pages': sum(mixed for _, _, _, mixed in layouts),
+        'page_layouts': [[i, layout, n, mixed] for i, layout, n, mixed in layouts],
+        'body_band': body_band,
+        'sutra_band': sutra_band,
+    }
+
+def print_profile(profile, top=10):
+    """打印统计结果摘要"""
+    print(f"共 {profile['total_pages']} 页，抽样 {profile['sampled_pages']} 页")
+    total = sum(n for _, n in profile['size_histogram']) or 1
+
+    print(f"\n字号分布（前{top}）:")
+    for size, n in sorted(profile['size_histogram'], key=lambda item: -item[1])[:top]:
+        print(f"  {size:>6.1f}pt  {n:>8} 字  {n / total:6.1%}")
+
+    print(f"\n字体分布（前{top}）:")
+    for fontname, n in profile['font_histogram'][:top]:
+        print(f"  {fontname[:40]:<40} {n:>8} 字")
+
+    print("\n布局分布（按字号范围过滤后）:")
+    for layout, n in profile['layout_histogram'].items():
+        print(f"  {layout:<12} {n} 页")
+    if profile['mixed_pages']:
+        print(f"  其中横竖混排 {profile['mixed_pages']} 页")
+
+    print(f"\n建议讲义字号范围: {profile['body_band']}")
+    if profile['sutra_band']:
+        print(f"建议经文字号范围: {profile['sutra_band']}")
+    else:
+        print("未找到经文字号，校准文件中将沿用默认经文范围")
+
+def save_calibration(profile, path):
+    """
+    保存校准文件（JSON），size_bands 为 [讲义范围, 经文范围]，
+    可直接作为 pdf_converter 中转换函数的 calibration 参数
+    """
+    from pdf_converter import SIZE_BANDS
+
+    body_band = profile['body_band'] or SIZE_BANDS[0]
+    sutra_band = profile['sutra_band'] or SIZE_BANDS[1]
+    calibration = dict(profile, size_bands=[list(body_band), list(sutra_band)])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, ensure_ascii=False, indent=2)
+    print(f"校准文件已保存: {path}")
+
 if __name__ == "__main__":
-    src = r"D:\EBook\fo\楞严经OCR\大佛顶首楞严经讲义[圆瑛法师].pdf"
-    debug_pdf(src, page_num=3)  # 查看第3页
+    # 参数见 python lengyan.py debug --help
+    import sys
+    from lengyan import main
+    main(['debug'] + sys.argv[1:])
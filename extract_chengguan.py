@@ -1,30 +1,51 @@
-import re
+"""
+解析成观法师《楞严经义贯》的 Markdown，按类型产出经文、注释、义贯、诠论
+
+逐行读取一遍文件，用状态机识别：
+    经文：**【...】** 包围的段落（可能跨多行，中间被拆成多段粗体）
+    注释/义贯/诠论：**【注释】** 等标题行之后、下一个标题或经文之前的内容
+每条记录为 {'type', 'volume', 'line', 'end_line', 'offset', 'text'}，
+line/end_line 为起止行号，offset 为记录起点在文件中的字节偏移。
+sutra_text.md 只是这些记录的一种输出：所有经文折叠为一行后以空行分隔。
+"""
+
 import os
+import re
+import sys
+import time
 
-# 输入文件
-input_file = "成观法师大佛顶首楞严经义贯1769356465.md"
-# 输出目录
-output_dir = "chengguan_doc"
+from split_lengyan import VOLUME_PATTERN
 
-# 创建输出目录
-os.makedirs(output_dir, exist_ok=True)
+# 记录类型
+SUTRA = '经文'
+SECTION_TYPES = ('注释', '义贯', '诠论')
 
-# 读取文件内容
-with open(input_file, "r", encoding="utf-8") as f:
-    content = f.read()
+# 经文起点：**【 之后不是 注释/义贯/诠论；终点为其后第一个 】**
+PASSAGE_START = '**【'
+PASSAGE_END = '】**'
 
-# 正则表达式：匹配 **【...】** 格式，排除"注释"、"义贯"、"诠论"
-pattern = r'\*\*【(?!注释|义贯|诠论)[\s\S]+?】\*\*'
+# 注释/义贯/诠论 的标题行
+SECTION_HEADING_RE = re.compile(r'^\s*\*\*【(注释|义贯|诠论)】\*\*\s*$')
+SECTION_HEADINGS = {PASSAGE_START + kind + PASSAGE_END for kind in SECTION_TYPES}
 
-# 查找所有匹配
-matches = re.findall(pattern, content)
+VOLUME_RE = re.compile(VOLUME_PATTERN)
 
-# 提取并清理内容
-extracted_texts = []
-excluded_heading_line = re.compile(r"(?m)^\s*\*\*【(?:注释|义贯|诠论)】\*\*\s*$")
-for match in matches:
+# 逐行解析用：标记的 UTF-8 编码；经文起点之后不是 注释/义贯/诠论
+PASSAGE_START_BYTES = PASSAGE_START.encode('utf-8')
+PASSAGE_END_BYTES = PASSAGE_END.encode('utf-8')
+PASSAGE_START_BYTES_RE = re.compile(re.escape(PASSAGE_START_BYTES) + b'(?!' +
+                                    b'|'.join(kind.encode('utf-8') for kind in SECTION_TYPES) + b')')
+
+# 段落之间的多个空行（含只有空白的行）；已是单个空行且下一行顶格的不必替换
+BLANK_LINES_RE = re.compile(r"\n(?!\n\S)\s*\n(?:\s*\n)*")
+
+def clean_passage(text):
+    """
+    将经文段落折叠为一行：去掉被带入的 注释/义贯/诠论 标题行，合并跨行断开的粗体标记
+    旧的正则清理，只供 extract_sutra_regex 做基准对比；解析时用 fold_passage
+    """
     # 清掉可能被跨行匹配带进来的 **【注释】** / **【义贯】** / **【诠论】** 行
-    cleaned = excluded_heading_line.sub("", match)
+    cleaned = re.sub(r"(?m)^\s*\*\*【(?:注释|义贯|诠论)】\*\*\s*$", "", text)
 
     # 合并跨行断开的粗体标记：如 **...**\n\n**...**（可能带缩进/多空行）
     cleaned = re.sub(r'\*\*\s*\n+\s*\*\*', '', cleaned)
@@ -32,19 +53,222 @@ for match in matches:
     # 将 **【...】** 块内容折叠为一行：去掉换行及其两侧空白
     cleaned = re.sub(r'\s*\n+\s*', '', cleaned)
 
-    # 规整空行（理论上块内已无换行；保留以防其他情况）
-    cleaned = re.sub(r"\n{3,}", "\n\n", cleaned).strip()
-    if cleaned:
-        extracted_texts.append(cleaned)
+    return cleaned.strip()
+
+def fold_passage(text):
+    """
+    与 clean_passage 结果相同，但不用正则：经文的各行去掉两侧空白、去掉空行后拼接，
+    上一行以 ** 结尾、下一行以 ** 开头时去掉这两处粗体标记；结束经文的 注释/义贯/诠论 标题行不计入
+    """
+    if '\n' not in text:
+        return text.strip()
+    lines = text.split('\n')
+    # 经文不会以标题开头，标题行只可能是结束经文的最后一行
+    if lines[-1].strip() in SECTION_HEADINGS:
+        lines.pop()
+    joined = '\n'.join(filter(None, [line.strip() for line in lines]))
+    return joined.replace('**\n**', '').replace('\n', '').strip()
+
+def clean_section(text):
+    """注释/义贯/诠论 的内容：保留段落，多个空行合并为一个"""
+    return BLANK_LINES_RE.sub("\n\n", text.strip())
+
+def iter_records(input_file, types=None):
+    """
+    逐行解析文件，按出现顺序产出记录 {'type', 'volume', 'line', 'end_line', 'offset', 'text'}
+
+    type 为 '经文'、'注释'、'义贯' 或 '诠论'；volume 为卷号（如 '一'），第一卷之前为 None；
+    line/end_line 为起止行号（从1开始）。经文的 text 已折叠为一行，其余保留段落。
+    types 为要产出的类型（默认全部）；其余类型的内容不解码、不清理，只计行号
+
+    文件按二进制逐行读取，内存只占当前一条记录。不含 **【、也不以 # 开头的行（绝大多数）
+    不解码，只按原始字节归入当前记录；记录结束时整段解码一次
+    """
+    volume = None
+    passage = None   # 正在读取的经文
+    section = None   # 正在读取的 注释/义贯/诠论
+    collect = None   # 当前段落要保留时为其 parts.append，否则为 None（不保留其内容）
+    offset = 0
+    line_no = 0
+
+    def new_record(kind, line_no, record_offset):
+        parts = [] if types is None or kind in types else None
+        return {'type': kind, 'volume': volume, 'line': line_no, 'offset': record_offset, 'parts': parts}
+
+    def finish(record, clean, end_line):
+        parts = record.pop('parts')
+        if parts is None:
+            return None
+        record['end_line'] = max(end_line, record['line'])
+        record['text'] = clean(b"".join(parts).decode('utf-8'))
+        return record
+
+    def add(record, data):
+        if record['parts'] is not None:
+            record['parts'].append(data)
+
+    def collector(record):
+        return None if record['parts'] is None else record['parts'].append
+
+    with open(input_file, 'rb') as f:
+        for line_no, raw in enumerate(f, 1):
+            line_offset = offset
+            offset += len(raw)
+
+            if passage is None:
+                # 卷标题、Markdown 标题和 注释/义贯/诠论 标题行结束当前段落
+                if raw.startswith(b'#'):
+                    if section is not None:
+                        record = finish(section, clean_section, line_no - 1)
+                        if record:
+                            yield record
+                        section = collect = None
+                    volume_match = VOLUME_RE.match(raw.decode('utf-8'))
+                    if volume_match:
+                        volume = volume_match.group(1)
+                    continue
+                if PASSAGE_START_BYTES not in raw:
+                    if collect is not None:
+                        collect(raw)
+                    continue
+                heading = SECTION_HEADING_RE.match(raw.decode('utf-8'))
+                if heading:
+                    if section is not None:
+                        record = finish(section, clean_section, line_no - 1)
+                        if record:
+                            yield record
+                    section = new_record(heading.group(1), line_no, line_offset)
+                    collect = collector(section)
+                    continue
+            elif PASSAGE_END_BYTES not in raw:
+                add(passage, raw)
+                continue
+
+            # 行内有经文起点或终点：在原始字节上逐个处理，字节位置即偏移
+            pos = 0
+            end_from = 0
+            while True:
+                if passage is None:
+                    match = PASSAGE_START_BYTES_RE.search(raw, pos)
+                    if not match:
+                        break
+                    start = match.start()
+                    # 经文之前的内容属于当前段落，经文开始即结束当前段落
+                    if section is not None:
+                        add(section, raw[pos:start])
+                        record = finish(section, clean_section, line_no if start else line_no - 1)
+                        if record:
+                            yield record
+                        section = collect = None
+                    passage = new_record(SUTRA, line_no, line_offset + start)
+                    pos = start
+                    # 【 与 】 之间至少有一个字符（UTF-8 中不会在字符中间找到 】）
+                    end_from = start + len(PASSAGE_START_BYTES) + 1
+
+                end = raw.find(PASSAGE_END_BYTES, max(pos, end_from))
+                if end < 0:
+                    add(passage, raw[pos:])
+                    pos = len(raw)
+                    break
+
+                end += len(PASSAGE_END_BYTES)
+                add(passage, raw[pos:end])
+                record = finish(passage, fold_passage, line_no)
+                if record:
+                    yield record
+                passage = None
+                pos = end
+                end_from = 0
+
+                # 没有结尾 】 的经文会延续到下一个标题行为止，该标题同时开始新的段落
+                heading = SECTION_HEADING_RE.match(raw.decode('utf-8'))
+                if heading:
+                    section = new_record(heading.group(1), line_no, line_offset)
+                    collect = collector(section)
+                    pos = len(raw)
+                    break
+
+            if passage is None and section is not None:
+                add(section, raw[pos:])
+
+    # 文件结束时未闭合的经文不输出（没有结尾的 】** 不构成经文）
+    if section is not None:
+        record = finish(section, clean_section, line_no)
+        if record:
+            yield record
+
+def write_sutra_text(records, output_file):
+    """将经文记录写为 sutra_text.md：每段经文一行，段落之间空一行；返回写出的段数"""
+    extracted_texts = [r['text'] for r in records if r['type'] == SUTRA and r['text']]
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(extracted_texts))
+    return len(extracted_texts)
+
+def extract_sutra_regex(content):
+    """
+    旧的提取方式：对全文做正则匹配，再逐段清理；只用于基准对比
+    返回经文段落列表
+    """
+    # 正则表达式：匹配 **【...】** 格式，排除"注释"、"义贯"、"诠论"
+    pattern = r'\*\*【(?!注释|义贯|诠论)[\s\S]+?】\*\*'
+    extracted_texts = []
+    for match in re.findall(pattern, content):
+        cleaned = clean_passage(match)
+        # 规整空行（理论上块内已无换行；保留以防其他情况）
+        cleaned = re.sub(r"\n{3,}", "\n\n", cleaned).strip()
+        if cleaned:
+            extracted_texts.append(cleaned)
+    return extracted_texts
+
+def benchmark(input_file, repeat=5):
+    """
+    对比旧的整文件正则提取与状态机解析：耗时（取最快一次）及经文是否一致
+    'stream' 与正则做同样的事（只取经文），'records' 为解析全部类型
+    """
+    def best(run):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    def regex():
+        with open(input_file, "r", encoding="utf-8") as f:
+            return extract_sutra_regex(f.read())
+
+    timings = {}
+    timings['regex'], expected = best(regex)
+    timings['stream'], passages = best(lambda: list(iter_records(input_file, types=(SUTRA,))))
+    timings['records'], records = best(lambda: list(iter_records(input_file)))
+
+    actual = [r['text'] for r in passages if r['text']]
+    counts = {kind: sum(1 for r in records if r['type'] == kind) for kind in (SUTRA,) + SECTION_TYPES}
+
+    print(f"整文件正则: {timings['regex'] * 1000:.1f} ms，{len(expected)} 段经文")
+    print(f"状态机解析: {timings['stream'] * 1000:.1f} ms，{len(actual)} 段经文")
+    print(f"全部类型:   {timings['records'] * 1000:.1f} ms，" +
+          "，".join(f"{kind} {n} 条" for kind, n in counts.items()))
+    print(f"经文一致: {actual == expected and [r['text'] for r in records if r['type'] == SUTRA and r['text']] == expected}")
+    return timings
+
+if __name__ == "__main__":
+    # 输入文件
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    input_file = args[0] if args else "chengguan_all.md"
+    # 输出目录
+    output_dir = "chengguan_doc"
+
+    # 创建输出目录
+    os.makedirs(output_dir, exist_ok=True)
 
-# 合并所有提取的文本
-output_text = "\n\n".join(extracted_texts)
+    # 输出文件
+    output_file = os.path.join(output_dir, "sutra_text.md")
+    count = write_sutra_text(iter_records(input_file, types=(SUTRA,)), output_file)
 
-# 输出文件
-output_file = os.path.join(output_dir, "sutra_text.md")
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(output_text)
+    print(f"Extraction complete!")
+    print(f"Total extracted: {count} blocks")
+    print(f"Output file: {output_file}")
 
-print(f"Extraction complete!")
-print(f"Total extracted: {len(extracted_texts)} blocks")
-print(f"Output file: {output_file}")
+    if '--benchmark' in sys.argv:
+        benchmark(input_file)
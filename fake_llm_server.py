@@ -0,0 +1,96 @@
+"""
+本地假模型服务，接口与 OpenAI chat/completions 相同，用于在不花钱的情况下试跑 translate_runner
+
+收到提示词后取出【主文本】中的粗体经文，每段经文后接一行占位译文返回；
+可设置响应延迟和失败率（随机返回 429/500），用来检验并发、限速和重试。
+
+用法:
+    python fake_llm_server.py [端口]
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOLD_LINE_RE = re.compile(r'^\s*(\*\*.+?\*\*)\s*$', re.M)
+
+def fake_translation(prompt):
+    """主文本中的每段粗体经文配一段占位译文"""
+    # 模板正文里也提到【主文本】，取文末独占一行的节标题
+    start = prompt.rfind('\n【主文本】\n')
+    end = prompt.rfind('\n【参考文本】\n')
+    main_text = prompt[start:end] if 0 <= start < end else prompt
+    passages = BOLD_LINE_RE.findall(main_text)
+    return "\n\n".join(f"{passage}\n\n（译文）{passage.strip('*')[:20]}……" for passage in passages)
+
+def make_handler(latency=(0.0, 0.0), failure_rate=0.0, seed=None):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, payload, headers=()):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            with lock:
+                delay = rng.uniform(*latency)
+                failure = rng.random() < failure_rate
+                status = rng.choice((429, 500))
+            time.sleep(delay)
+
+            if not self.path.endswith('/chat/completions'):
+                self.reply(404, {'error': {'message': f'未知路径 {self.path}'}})
+                return
+            if failure:
+                self.reply(status, {'error': {'message': '模拟失败'}},
+                           [('Retry-After', '0.1')] if status == 429 else [])
+                return
+
+            prompt = request['messages'][-1]['content']
+            text = fake_translation(prompt)
+            self.reply(200, {
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(text),
+                          'total_tokens': len(prompt) + len(text)},
+            })
+
+    return Handler
+
+def start_fake_server(port=0, latency=(0.0, 0.0), failure_rate=0.0, seed=None):
+    """
+    在后台线程启动假服务
+
+    返回 (server, base_url)，用完调用 server.shutdown()
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(latency, failure_rate, seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server, base_url = start_fake_server(port, latency=(0.2, 1.0), failure_rate=0.05)
+    print(f"假模型服务: {base_url}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
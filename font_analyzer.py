@@ -2,7 +2,12 @@ import pdfplumber
 from opencc import OpenCC
 import os
 import sys
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
 from pdf_converter import clean_fontname, get_font_style, detect_layout
+from aho_corasick import Automaton
+import t2s
 
 # 设置UTF-8编码输出
 if sys.platform == 'win32':
@@ -87,9 +92,137 @@ def analyze_text_fonts(input_path, target_text, max_pages=None):
         import traceback
         traceback.print_exc()
 
-if __name__ == "__main__":
-    src = r"d:\EBook\fo\楞严经OCR\大佛顶首楞严经讲义[圆瑛法师].pdf"
+# 字体记录的字段（CSV 列顺序）
+FONT_RECORD_FIELDS = [
+    'match', 'target', 'page', 'offset', 'layout', 'char',
+    'fontname', 'clean_fontname', 'size', 'font_family', 'font_weight', 'x0', 'top',
+]
+
+def _page_text(chars):
+    """
+    拼接页面文本，并记录每个文本位置对应的字符下标
+    （个别字符的 text 可能不止一个字）
+    """
+    texts = [c['text'] for c in chars]
+    owners = []
+    for idx, text in enumerate(texts):
+        owners.extend([idx] * len(text))
+    return "".join(texts), owners
+
+def _search_page_range(input_path, start, end, targets):
+    """
+    进程池工作函数：在 [start, end) 页中查找所有目标文本
+    页面文本与目标文本都逐字转为简体后再匹配，因此繁体、简体写法都能命中
+
+    返回命中列表，每项为 {'target', 'page', 'offset', 'layout', 'chars'}
+    """
+    fold = t2s.get_converter().convert_chars
+    automaton = Automaton([fold(target) for target in targets])
+
+    matches = []
+    with pdfplumber.open(input_path) as pdf:
+        for i in range(start, end):
+            page = pdf.pages[i]
+            try:
+                chars = page.chars
+                if not chars:
+                    continue
+
+                page_text, owners = _page_text(chars)
+                layout = None
+                for offset, target_index in automaton.finditer(fold(page_text)):
+                    if layout is None:
+                        layout = detect_layout(chars)
+                    target = targets[target_index]
+                    char_indices = sorted(set(owners[offset:offset + len(target)]))
+                    matches.append({
+                        'target': target,
+                        'page': i + 1,
+                        'offset': offset,
+                        'layout': layout,
+                        'chars': [_font_record(chars[idx]) for idx in char_indices],
+                    })
+            finally:
+                page.close()
+    return matches
+
+def _font_record(char):
+    """单个字符的字体信息"""
+    fontname = char.get('fontname', 'Unknown')
+    style = get_font_style(char)
+    return {
+        'char': char['text'],
+        'fontname': fontname,
+        'clean_fontname': clean_fontname(fontname),
+        'size': round(char.get('size', 0), 2),
+        'font_family': style['font-family'],
+        'font_weight': style['font-weight'],
+        'x0': round(char['x0'], 2),
+        'top': round(char['top'], 2),
+    }
+
+def find_text_fonts(input_path, targets, max_pages=None, workers=1, chunk_size=50):
+    """
+    在整个PDF中一次性查找多个目标文本的全部出现位置，返回命中字符的字体记录
+
+    用 Aho-Corasick 自动机同时匹配所有目标，每页只扫描一遍；
+    目标文本可以是繁体或简体。跨页断开的文本不会被匹配。
 
-    # 分析指定文本的字体
-    target_text = "如是乃指法之辭，我聞明授受之本"
-    analyze_text_fonts(src, target_text, max_pages=60)
+    参数:
+        targets: 目标文本列表
+        max_pages: 只查找前N页，默认全部
+        workers: 并行处理的进程数，默认1（串行）
+        chunk_size: 每个任务分配的连续页数
+
+    返回字体记录列表（字段见 FONT_RECORD_FIELDS），每个命中字符一条，
+    同一次命中的字符 match 编号相同
+    """
+    with pdfplumber.open(input_path) as pdf:
+        total_pages = len(pdf.pages)
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+
+    targets = [target for target in dict.fromkeys(targets) if target]
+    ranges = [(start, min(start + chunk_size, total_pages))
+              for start in range(0, total_pages, chunk_size)]
+
+    if workers <= 1:
+        results = [_search_page_range(input_path, start, end, targets) for start, end in ranges]
+    else:
+        starts, ends = zip(*ranges) if ranges else ((), ())
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map 按提交顺序返回结果，记录保持页码顺序
+            results = list(executor.map(_search_page_range, [input_path] * len(ranges),
+                                        starts, ends, [targets] * len(ranges)))
+
+    records = []
+    match_id = 0
+    for matches in results:
+        for match in matches:
+            for char_record in match['chars']:
+                records.append({
+                    'match': match_id,
+                    'target': match['target'],
+                    'page': match['page'],
+                    'offset': match['offset'],
+                    'layout': match['layout'],
+                    **char_record,
+                })
+            match_id += 1
+    return records
+
+def save_font_records(records, output_path):
+    """按扩展名把字体记录保存为 JSON 或 CSV 文件"""
+    if output_path.lower().endswith('.csv'):
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FONT_RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    # 参数见 python lengyan.py analyze-font --help
+    from lengyan import main
+    main(['analyze-font'] + sys.argv[1:])
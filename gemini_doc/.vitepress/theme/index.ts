@@ -0,0 +1,14 @@
+import { h } from 'vue'
+import DefaultTheme from 'vitepress/theme'
+import SiteSearch from './SiteSearch.vue'
+import './custom.css'
+
+// 默认主题 + 导航栏中的全文检索（索引由 python site_search.py 预先生成）
+export default {
+  extends: DefaultTheme,
+  Layout() {
+    return h(DefaultTheme.Layout, null, {
+      'nav-bar-content-before': () => h(SiteSearch)
+    })
+  }
+}
@@ -0,0 +1,157 @@
+// 预建检索索引（site_search.py 生成于 public/search）的客户端查询
+// 归一化、取词、分片规则必须与 site_search.py 一致
+
+export interface Volume {
+  number: number
+  name: string
+  title: string
+  link: string
+  first: number
+  count: number
+}
+
+export interface Meta {
+  shards: number
+  documents: number
+  terms: number
+  volumes: Volume[]
+}
+
+// [锚点, 经文, 译文]
+export type Doc = [string, string, string]
+
+export interface Hit {
+  volume: Volume
+  anchor: string
+  field: 'sutra' | 'translation'
+  before: string
+  match: string
+  after: string
+}
+
+const LETTER_OR_NUMBER = /[\p{L}\p{N}]/u
+
+// 只保留字母和数字并转为小写
+export function normalize(text: string): string {
+  return Array.from(text.toLowerCase()).filter(ch => LETTER_OR_NUMBER.test(ch)).join('')
+}
+
+// 查询用的词：单字查询用单字本身，否则用全部相邻两字
+export function queryTerms(query: string): string[] {
+  const chars = Array.from(query)
+  if (chars.length === 1) return chars
+  const terms = new Set<string>()
+  for (let i = 0; i + 1 < chars.length; i++) terms.add(chars[i] + chars[i + 1])
+  return Array.from(terms)
+}
+
+export function shardOf(term: string, shards: number): number {
+  return term.codePointAt(0)! % shards
+}
+
+// 两个递增数组的交集
+function intersect(a: number[], b: number[]): number[] {
+  const result: number[] = []
+  let i = 0
+  let j = 0
+  while (i < a.length && j < b.length) {
+    if (a[i] < b[j]) i++
+    else if (a[i] > b[j]) j++
+    else {
+      result.push(a[i])
+      i++
+      j++
+    }
+  }
+  return result
+}
+
+function decode(deltas: number[]): number[] {
+  let id = 0
+  return deltas.map(delta => (id += delta))
+}
+
+// 在原文中定位归一化后的短语，返回命中前后的摘要；原文不含该短语时返回 null
+export function snippet(text: string, query: string, context = 30) {
+  const chars = Array.from(text)
+  const positions: number[] = []
+  let normalized = ''
+  chars.forEach((ch, i) => {
+    for (const c of Array.from(normalize(ch))) {
+      normalized += c
+      positions.push(i)
+    }
+  })
+  // normalized 按 UTF-16 计位置，换算为码点序号
+  const at = normalized.indexOf(query)
+  if (at < 0) return null
+  const start = Array.from(normalized.slice(0, at)).length
+  const length = Array.from(query).length
+  const first = positions[start]
+  const last = positions[start + length - 1] + 1
+  return {
+    before: (first > context ? '…' : '') + chars.slice(Math.max(0, first - context), first).join(''),
+    match: chars.slice(first, last).join(''),
+    after: chars.slice(last, last + context).join('') + (last + context < chars.length ? '…' : '')
+  }
+}
+
+export class SearchIndex {
+  private meta: Promise<Meta>
+  private shards = new Map<number, Promise<Record<string, number[]>>>()
+  private docs = new Map<number, Promise<Doc[]>>()
+
+  constructor(private base: string) {
+    this.meta = this.fetchJson('meta.json')
+  }
+
+  private fetchJson(path: string) {
+    return fetch(this.base + path).then(response => {
+      if (!response.ok) throw new Error(`${response.status} ${path}`)
+      return response.json()
+    })
+  }
+
+  private shard(n: number) {
+    if (!this.shards.has(n)) this.shards.set(n, this.fetchJson(`shards/${n}.json`))
+    return this.shards.get(n)!
+  }
+
+  private volumeDocs(volume: Volume) {
+    if (!this.docs.has(volume.number)) this.docs.set(volume.number, this.fetchJson(`docs/${volume.number}.json`))
+    return this.docs.get(volume.number)!
+  }
+
+  // 返回 [命中, 命中总数, 总数是否精确]；命中按卷、卷内顺序排列，最多 limit 条
+  // 核对到 limit 条即停止，不再拉取其余各卷的 docs；此时总数按已核对候选中的命中比例估计
+  async search(text: string, limit = 50): Promise<[Hit[], number, boolean]> {
+    const query = normalize(text)
+    if (!query) return [[], 0, true]
+    const meta = await this.meta
+    const terms = queryTerms(query)
+    const postings = await Promise.all(terms.map(async term => {
+      const shard = await this.shard(shardOf(term, meta.shards))
+      return decode(shard[term] || [])
+    }))
+    postings.sort((a, b) => a.length - b.length)
+    const candidates = postings.reduce(intersect)
+
+    // 各词都出现的文档不一定含整个短语，逐个核对
+    const hits: Hit[] = []
+    let checked = 0
+    let v = 0
+    for (const id of candidates) {
+      if (hits.length >= limit) break
+      while (id >= meta.volumes[v].first + meta.volumes[v].count) v++
+      const volume = meta.volumes[v]
+      const [anchor, sutra, translation] = (await this.volumeDocs(volume))[id - volume.first]
+      checked++
+      const inSutra = snippet(sutra, query)
+      const found = inSutra || snippet(translation, query)
+      if (found) hits.push({volume, anchor, field: inSutra ? 'sutra' : 'translation', ...found})
+    }
+    if (checked === candidates.length) return [hits, hits.length, true]
+    const estimate = checked ? Math.round(candidates.length * hits.length / checked) : candidates.length
+    return [hits, Math.max(estimate, hits.length), false]
+  }
+}
@@ -0,0 +1,232 @@
+"""
+分块的 HTML 输出：每 N 页写一个 HTML 片段，由轻量的目录页按需加载
+
+输出目录结构：
+    index.html          页码导航和各分块的占位元素；分块在滚动到附近时（IntersectionObserver）
+                        或跳转到其中的页码时才用 fetch 加载
+    style.css           基础样式 + 全书用到的字体样式类（全部页面渲染完才能确定）
+    chunks/0001.html    第1个分块：连续 N 页的 <div class="page"> 片段
+    *.gz / *.br         以上文件的预压缩副本，静态服务器可直接按 Accept-Encoding 返回；
+                        .br 需要 brotli 模块（见 requirements.txt），未安装时提示并只写 .gz
+
+分块加载失败（如服务器返回 404/500）时显示提示，点击该分块或再次跳转即重新加载。
+
+可以直接用 python -m http.server 等静态服务器浏览（fetch 不能在 file:// 下使用）。
+"""
+
+import gzip
+import html
+import os
+import textwrap
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_DIR = 'chunks'
+
+# 未加载的分块按每页该高度占位，滚动条长度与加载后大致相当
+PLACEHOLDER_PAGE_HEIGHT = 1100
+
+# 分块模式下覆盖单文件的样式：页面不再固定最小高度，屏幕外的页面跳过排版
+SPLIT_CSS = """
+.page {
+    min-height: 0;
+    content-visibility: auto;
+    contain-intrinsic-size: auto 1000px;
+}
+.chunk {
+    overflow-anchor: auto;
+}
+.chunk[data-state="loading"]::before {
+    content: "加载中……";
+    color: #aaa;
+}
+.chunk[data-state="error"]::before {
+    content: "加载失败，点击重试";
+    color: #c00;
+    cursor: pointer;
+}
+.book-nav {
+    position: sticky;
+    top: 0;
+    z-index: 1;
+    background-color: #f0f2f5;
+    padding: 8px 0;
+    margin-bottom: 20px;
+    font-size: 14px;
+}
+.book-nav input {
+    width: 6em;
+}
+"""
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+<form class="book-nav" id="book-nav">
+    跳转到第 <input type="number" id="page-input" min="{first}" max="{last}" value="{first}"> 页
+    <button type="submit">跳转</button>
+    <span>（第 {first}–{last} 页，共 {count} 个分块）</span>
+</form>
+{sections}
+<script>
+(function () {{
+    const chunks = Array.from(document.querySelectorAll('.chunk'));
+    const observer = new IntersectionObserver(entries => {{
+        for (const entry of entries) {{
+            if (entry.isIntersecting) load(entry.target).catch(() => {{}});
+        }}
+    }}, {{rootMargin: '1500px 0px'}});
+
+    function load(chunk) {{
+        if (!chunk.loading) {{
+            chunk.dataset.state = 'loading';
+            chunk.loading = fetch(chunk.dataset.src)
+                .then(response => {{
+                    if (!response.ok) throw new Error(`${{chunk.dataset.src}}: HTTP ${{response.status}}`);
+                    return response.text();
+                }})
+                .then(text => {{
+                    chunk.innerHTML = text;
+                    chunk.style.minHeight = '';
+                    chunk.dataset.state = 'done';
+                    observer.unobserve(chunk);
+                }})
+                .catch(error => {{
+                    // 失败的请求不缓存，下次 load 重新请求
+                    chunk.loading = null;
+                    chunk.dataset.state = 'error';
+                    console.error(error);
+                    throw error;
+                }});
+        }}
+        return chunk.loading;
+    }}
+
+    function goto(page) {{
+        const chunk = chunks.find(c => +c.dataset.first <= page && page <= +c.dataset.last);
+        if (!chunk) return;
+        load(chunk).then(() => {{
+            const target = chunk.children[page - chunk.dataset.first];
+            (target || chunk).scrollIntoView();
+        }}).catch(() => {{}});
+    }}
+
+    chunks.forEach(chunk => {{
+        observer.observe(chunk);
+        chunk.addEventListener('click', () => {{
+            if (chunk.dataset.state === 'error') load(chunk).catch(() => {{}});
+        }});
+    }});
+    document.getElementById('book-nav').addEventListener('submit', event => {{
+        event.preventDefault();
+        const page = +document.getElementById('page-input').value;
+        history.replaceState(null, '', '#p' + page);
+        goto(page);
+    }});
+    const match = location.hash.match(/^#p(\\d+)$/);
+    if (match) goto(+match[1]);
+}})();
+</script>
+</body>
+</html>
+"""
+
+def compress_file(path):
+    """写出 path 的 .gz（及 .br）副本；gzip 不写入时间戳，相同内容得到相同的文件"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+class ChunkWriter:
+    """
+    代替单文件的正文写出目标：每次 write 写入一页的片段，每 pages_per_chunk 页换一个分块文件，
+    分块写完即压缩
+
+    chunks: [{'file': 相对输出目录的路径, 'first': 首页页码, 'last': 末页页码}]，页码从1开始
+    """
+
+    def __init__(self, output_dir, pages_per_chunk, first_page=0):
+        self.output_dir = output_dir
+        self.pages_per_chunk = pages_per_chunk
+        self.next_page = first_page + 1
+        self.chunks = []
+        self.file = None
+        chunk_dir = os.path.join(output_dir, CHUNK_DIR)
+        os.makedirs(chunk_dir, exist_ok=True)
+        if brotli is None:
+            print("警告：未安装 brotli 模块（pip install -r requirements.txt），只写 .gz 压缩副本，不写 .br")
+        # 清除上次转换留下的分块，页数变少时不会残留多余的文件
+        for name in os.listdir(chunk_dir):
+            os.remove(os.path.join(chunk_dir, name))
+
+    def write(self, fragment):
+        if self.file is None:
+            name = f"{CHUNK_DIR}/{len(self.chunks) + 1:04d}.html"
+            self.chunks.append({'file': name, 'first': self.next_page, 'last': self.next_page})
+            self.file = open(os.path.join(self.output_dir, name), 'w', encoding='utf-8')
+        self.file.write(fragment)
+        self.chunks[-1]['last'] = self.next_page
+        self.next_page += 1
+        if self.chunks[-1]['last'] - self.chunks[-1]['first'] + 1 >= self.pages_per_chunk:
+            self._finish_chunk()
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def _finish_chunk(self):
+        self.file.close()
+        self.file = None
+        compress_file(os.path.join(self.output_dir, self.chunks[-1]['file']))
+
+    def close(self):
+        if self.file:
+            self._finish_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_book(output_dir, chunks, base_css, styles, title):
+    """
+    写出 style.css 和 index.html 并压缩
+
+    参数:
+        chunks: ChunkWriter.chunks
+        base_css: 单文件 HTML 的基础样式（分块模式的覆盖样式追加在其后）
+        styles: 全书用到的字体样式 {类名: CSS声明}
+    """
+    rules = "".join(f".{name} {{ {declarations}; }}\n" for name, declarations in sorted(styles.items()))
+    css_path = os.path.join(output_dir, 'style.css')
+    with open(css_path, 'w', encoding='utf-8') as f:
+        f.write(textwrap.dedent(base_css) + SPLIT_CSS + "/* 页面字体样式 */\n" + rules)
+
+    sections = "\n".join(
+        f'<section class="chunk" data-src="{chunk["file"]}" data-first="{chunk["first"]}" '
+        f'data-last="{chunk["last"]}" '
+        f'style="min-height: {(chunk["last"] - chunk["first"] + 1) * PLACEHOLDER_PAGE_HEIGHT}px"></section>'
+        for chunk in chunks)
+    index_path = os.path.join(output_dir, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write(INDEX_TEMPLATE.format(
+            title=html.escape(title), sections=sections, count=len(chunks),
+            first=chunks[0]['first'] if chunks else 1, last=chunks[-1]['last'] if chunks else 1))
+
+    for path in (css_path, index_path):
+        compress_file(path)
+    return index_path
@@ -0,0 +1,279 @@
+"""
+楞严经资料处理的统一命令行入口
+
+各子命令只在执行时才导入对应的模块，pdfplumber、numpy、OpenCC 等依赖不会拖慢
+split、extract 这类纯文本命令的启动，可以在脚本里反复调用。
+
+用法:
+    python lengyan.py convert 输入.pdf [输出.md|输出.html] [--format md|html] [--skip-pages 2]
+                              [--max-pages N] [--workers N] [--checkpoint] [--calibration 校准.json]
+                              [--region x0 top x1 bottom] [--profile [trace]] [--split-pages N]
+    python lengyan.py analyze-font 输入.pdf 文本 [文本...] [--max-pages N] [--workers N]
+                                   [--output 字体记录.json|.csv] [--detail]
+    python lengyan.py debug 输入.pdf [--page 3] [--stats] [--sample 200] [--workers N]
+                            [--calibration calibration.json]
+    python lengyan.py split [chengguan] [yuanying] [--force]
+    python lengyan.py extract [chengguan_all.md] [--output-dir chengguan_doc] [--benchmark]
+    python lengyan.py index build [语料名...]
+    python lengyan.py index query 短语 [语料名...]
+    python lengyan.py retrieve build [--force]
+    python lengyan.py retrieve query 问题 [-k 10] [--corpus yuanying chengguan] [--type 经文 讲义 注释 义贯 诠论]
+    python lengyan.py pipeline status | run [步骤名...] [--jobs N] [--force] | record [步骤名...]
+    python lengyan.py pack build [语料名...] [--force] | verify [语料名...] | read 语料名 段落编号
+    python lengyan.py site [--site gemini_doc] [--shards 256]
+"""
+
+import argparse
+import os
+import sys
+
+def cmd_convert(args):
+    from pdf_converter import convert_pdf_to_html, convert_pdf_to_md
+
+    name = os.path.splitext(os.path.basename(args.input))[0]
+    options = dict(max_pages=args.max_pages, skip_pages=args.skip_pages, workers=args.workers,
+                   checkpoint=args.checkpoint, calibration=args.calibration,
+                   region=tuple(args.region) if args.region else None, profile=args.profile)
+    if args.split_pages:
+        # 分块输出只有 HTML，输出为目录
+        ok = convert_pdf_to_html(args.input, args.output or name, split_pages=args.split_pages, **options)
+    else:
+        fmt = args.format
+        if not fmt:
+            fmt = 'html' if args.output and args.output.lower().endswith('.html') else 'md'
+        output = args.output or name + '.' + fmt
+        convert = convert_pdf_to_html if fmt == 'html' else convert_pdf_to_md
+        ok = convert(args.input, output, **options)
+    # 转换失败时以非零状态退出，pipeline 等调用方据此判断
+    if not ok:
+        sys.exit(1)
+
+def cmd_analyze_font(args):
+    from font_analyzer import analyze_text_fonts, find_text_fonts, save_font_records
+
+    if args.detail:
+        for text in args.texts:
+            analyze_text_fonts(args.input, text, args.max_pages)
+
+    records = find_text_fonts(args.input, args.texts, args.max_pages, args.workers)
+    matches = {}
+    for record in records:
+        matches.setdefault(record['match'], record)
+    print(f"共 {len(matches)} 处命中，{len(records)} 个字符")
+    for record in matches.values():
+        print(f"  第 {record['page']} 页  {record['target']}  {record['layout']}  "
+              f"{record['clean_fontname']} {record['size']}pt")
+    if args.output:
+        save_font_records(records, args.output)
+        print(f"字体记录已保存: {args.output}")
+
+def cmd_debug(args):
+    from debug_pdf import debug_pdf, print_profile, profile_pdf, save_calibration
+
+    debug_pdf(args.input, page_num=args.page)
+    if args.stats or args.calibration:
+        profile = profile_pdf(args.input, sample_size=args.sample or None, workers=args.workers)
+        print_profile(profile)
+        if args.calibration:
+            save_calibration(profile, args.calibration)
+
+def cmd_split(args):
+    from split_lengyan import CORPORA, split_corpus
+
+    names = args.corpora or ['chengguan']
+    unknown = [name for name in names if name not in CORPORA]
+    if unknown:
+        sys.exit(f"未知语料: {'、'.join(unknown)}（可选 {'、'.join(CORPORA)}）")
+    kept = []
+    for name in names:
+        kept += split_corpus(name, force=args.force)[1]
+    if kept:
+        sys.exit(1)
+
+def cmd_extract(args):
+    from extract_chengguan import SUTRA, benchmark, iter_records, write_sutra_text
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_file = os.path.join(args.output_dir, "sutra_text.md")
+    count = write_sutra_text(iter_records(args.input, types=(SUTRA,)), output_file)
+    print(f"共提取 {count} 段经文: {output_file}")
+    if args.benchmark:
+        benchmark(args.input)
+
+def cmd_index(args):
+    import time
+    from corpus_index import CorpusIndex, build_index
+
+    if args.action == 'build':
+        rebuilt, unchanged = build_index(corpora=args.corpora or None)
+        print(f"重建 {rebuilt} 卷，未变化 {unchanged} 卷")
+        return
+
+    index = CorpusIndex()
+    start = time.perf_counter()
+    hits = index.find(args.phrase, args.corpora or None)
+    elapsed = time.perf_counter() - start
+    for hit in hits:
+        print(f"{hit['file']}:{hit['line']}  第{hit['volume']}卷  字节 {hit['offset']}-{hit['end']}")
+    print(f"共 {len(hits)} 处，用时 {elapsed * 1000:.1f} ms")
+
+def cmd_retrieve(args):
+    import time
+    from retrieval import ParagraphIndex, build_index, print_hits
+
+    if args.action == 'build':
+        build_index(force=args.force)
+        return
+
+    start = time.perf_counter()
+    index = ParagraphIndex()
+    loaded = time.perf_counter()
+    try:
+        hits = index.search(args.query, args.k, args.corpus, args.type)
+    except ValueError as e:
+        sys.exit(str(e))
+    print_hits(hits, time.perf_counter() - loaded)
+    print(f"载入索引 {(loaded - start) * 1000:.1f} ms")
+
+def cmd_pipeline(args):
+    from pipeline import record, run
+
+    if args.action == 'record':
+        record(args.steps)
+    else:
+        run(args.steps, jobs=args.jobs, force=args.force, dry_run=args.action == 'status')
+
+def cmd_pack(args):
+    from corpus_pack import CORPORA, build_pack, open_pack, verify
+
+    if args.action == 'read':
+        with open_pack(args.corpus) as pack:
+            if not 0 <= args.index < len(pack):
+                sys.exit(f"段落编号超出范围（{args.corpus} 共 {len(pack)} 段）")
+            p = pack.paragraph(args.index)
+        print(f"{p['file']}:{p['line_start']}-{p['line_end']}  第{p['volume']}卷 {p['kind']}\n{p['text']}")
+        return
+    corpora = args.corpora or CORPORA
+    unknown = [name for name in corpora if name not in CORPORA]
+    if unknown:
+        sys.exit(f"未知语料: {'、'.join(unknown)}（可选 {'、'.join(CORPORA)}）")
+    if args.action == 'build':
+        for corpus in corpora:
+            build_pack(corpus, force=args.force)
+    elif not verify(corpora):
+        sys.exit(1)
+
+def cmd_site(args):
+    from site_search import SEARCH_DIR, build_search, update_index_page
+
+    meta = build_search(args.site, args.shards)
+    print(f"{len(meta['volumes'])} 卷，{meta['documents']} 对经文/译文，{meta['terms']} 个词，"
+          f"{meta['shards']} 个分片: {os.path.join(args.site, SEARCH_DIR)}")
+    print("卷目表已更新" if update_index_page(args.site) else "卷目表无变化")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='lengyan', description='楞严经资料处理工具')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='命令')
+
+    p = commands.add_parser('convert', help='PDF 转为简体 Markdown/HTML')
+    p.add_argument('input', help='PDF 文件')
+    p.add_argument('output', nargs='?', help='输出文件，默认为当前目录下与 PDF 同名的 .md/.html')
+    p.add_argument('--format', choices=['md', 'html'], help='默认按输出文件扩展名，否则为 md')
+    p.add_argument('--max-pages', type=int, help='只转换前N页')
+    p.add_argument('--skip-pages', type=int, default=2, help='跳过前N页（默认2）')
+    p.add_argument('--workers', type=int, default=1, help='并行进程数')
+    p.add_argument('--checkpoint', action='store_true', help='断点续转与页面缓存')
+    p.add_argument('--calibration', help='debug --calibration 生成的校准文件')
+    p.add_argument('--region', type=float, nargs=4, metavar=('X0', 'TOP', 'X1', 'BOTTOM'),
+                   help='只转换该区域内的文字')
+    p.add_argument('--profile', nargs='?', const='summary', choices=['summary', 'trace'],
+                   help='分阶段计时；trace 另写逐页记录（默认由环境变量 PDF_PROFILE 决定）')
+    p.add_argument('--split-pages', type=int, metavar='N',
+                   help='HTML 每N页一个分块，输出为目录（index.html 按需加载分块）')
+    p.set_defaults(func=cmd_convert)
+
+    p = commands.add_parser('analyze-font', help='查找文本并输出其字体、字号')
+    p.add_argument('input', help='PDF 文件')
+    p.add_argument('texts', nargs='+', help='目标文本（繁简均可）')
+    p.add_argument('--max-pages', type=int, help='只查找前N页')
+    p.add_argument('--workers', type=int, default=1, help='并行进程数')
+    p.add_argument('--output', help='字体记录保存为 JSON 或 CSV（按扩展名）')
+    p.add_argument('--detail', action='store_true', help='逐字打印每处命中的字体信息')
+    p.set_defaults(func=cmd_analyze_font)
+
+    p = commands.add_parser('debug', help='查看页面字符坐标，统计全书字号并生成校准文件')
+    p.add_argument('input', help='PDF 文件')
+    p.add_argument('--page', type=int, default=1, help='查看第N页的字符坐标（默认1）')
+    p.add_argument('--stats', action='store_true', help='统计全书字号/字体/布局')
+    p.add_argument('--sample', type=int, default=200, help='统计时抽样的页数，0 表示全部')
+    p.add_argument('--workers', type=int, default=1, help='并行进程数')
+    p.add_argument('--calibration', help='统计并保存校准文件到该路径')
+    p.set_defaults(func=cmd_debug)
+
+    p = commands.add_parser('split', help='讲记/义贯按卷分割')
+    p.add_argument('corpora', nargs='*', metavar='语料名', help='chengguan（义贯，默认）或 yuanying（讲记）')
+    p.add_argument('--force', action='store_true', help='覆盖与上次分割结果不同（手动修改过）的文件')
+    p.set_defaults(func=cmd_split)
+
+    p = commands.add_parser('extract', help='提取义贯中的经文为 sutra_text.md')
+    p.add_argument('input', nargs='?', default='chengguan_all.md',
+                   help='义贯 Markdown 全文')
+    p.add_argument('--output-dir', default='chengguan_doc')
+    p.add_argument('--benchmark', action='store_true', help='对比整文件正则与逐行解析的耗时')
+    p.set_defaults(func=cmd_extract)
+
+    p = commands.add_parser('index', help='全文短语索引')
+    actions = p.add_subparsers(dest='action', required=True, metavar='操作')
+    q = actions.add_parser('build', help='建立或增量更新索引')
+    q.add_argument('corpora', nargs='*', metavar='语料名', help='yuanying、chengguan、gemini，默认全部')
+    q = actions.add_parser('query', help='查找短语')
+    q.add_argument('phrase', help='短语（繁简均可）')
+    q.add_argument('corpora', nargs='*', metavar='语料名')
+    p.set_defaults(func=cmd_index)
+
+    p = commands.add_parser('retrieve', help='讲记、义贯的段落检索（BM25）')
+    actions = p.add_subparsers(dest='action', required=True, metavar='操作')
+    q = actions.add_parser('build', help='切分段落并建立索引（文件未变时跳过）')
+    q.add_argument('--force', action='store_true', help='文件未变也重建')
+    q = actions.add_parser('query', help='按问题或关键词取出最相关的段落')
+    q.add_argument('query', help='问题或关键词（繁简均可）')
+    q.add_argument('-k', type=int, default=10, help='返回的段落数（默认10）')
+    q.add_argument('--corpus', nargs='+', choices=['yuanying', 'chengguan'], help='只检索这些语料')
+    q.add_argument('--type', nargs='+', choices=['经文', '讲义', '注释', '义贯', '诠论'], help='只检索这些类型的段落')
+    p.set_defaults(func=cmd_retrieve)
+
+    p = commands.add_parser('pipeline', help='从 PDF 到网站的增量构建（按内容哈希跳过未变化的步骤）')
+    p.add_argument('action', choices=['status', 'run', 'record'],
+                   help='status 列出需要执行的步骤；run 执行；record 把现有文件记为各步骤的结果')
+    p.add_argument('steps', nargs='*', metavar='步骤名', help='只处理这些步骤，默认全部')
+    p.add_argument('--jobs', type=int, help='并行执行的步骤数（默认 CPU 数）')
+    p.add_argument('--force', action='store_true', help='覆盖被手动修改过的输出')
+    p.set_defaults(func=cmd_pipeline)
+
+    p = commands.add_parser('pack', help='二进制语料包（mmap 按编号读取段落）')
+    actions = p.add_subparsers(dest='action', required=True, metavar='操作')
+    q = actions.add_parser('build', help='由 Markdown 重建语料包（源文件未变时跳过）')
+    q.add_argument('corpora', nargs='*', metavar='语料名', help='yuanying、chengguan、gemini，默认全部')
+    q.add_argument('--force', action='store_true', help='源文件未变也重建')
+    q = actions.add_parser('verify', help='核对 checksum 和源文件是否改变')
+    q.add_argument('corpora', nargs='*', metavar='语料名')
+    q = actions.add_parser('read', help='读取一个段落')
+    q.add_argument('corpus', choices=['yuanying', 'chengguan', 'gemini'])
+    q.add_argument('index', type=int, help='段落编号（从0开始）')
+    p.set_defaults(func=cmd_pack)
+
+    p = commands.add_parser('site', help='生成白话译文网站的检索索引和首页卷目表（vitepress build 之前执行）')
+    p.add_argument('--site', default='gemini_doc')
+    p.add_argument('--shards', type=int, default=256, help='索引分片数')
+    p.set_defaults(func=cmd_site)
+
+    return parser
+
+def main(argv=None):
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+按 token 预算把讲记切成若干次模型请求，生成可直接发送的提示词
+
+prompt.txt 的做法是把整卷讲记和整卷义贯作为附件交给模型，一卷两三千行，
+请求慢、费用高，长卷还可能超出上下文。这里：
+1. 讲记按经文切段：每段从一处粗体经文开始，到下一处经文之前为止，卷首内容并入第一段；
+2. 每段只附上与其经文对齐的义贯（义贯经文及其后的注释/义贯/诠论，对齐见 align_passages）；
+3. 依次把段装入请求，再加一段就超出 token 预算时开始新的请求；
+4. 以 prompt.txt 为模板生成提示词，附件引用换成请求内的【主文本】【参考文本】。
+
+token 数按字符估算；每个自然段的估算结果按内容哈希缓存在 token_cache.json，
+全部各卷重新打包时几乎只有读文件的开销。
+
+输出（每卷一个目录）:
+    prompt_bundles/第N卷/01.txt ...     各次请求的完整提示词
+    prompt_bundles/第N卷/bundles.json   模板哈希；各次请求的主文本行号、自然段哈希、参考段落、
+                                        主文本+参考文本的哈希（chunk_hash）和 token 数
+
+用法:
+    python pack_prompts.py [卷号 ...] [--budget 16000]
+"""
+
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import align_passages
+import corpus_index
+import extract_chengguan
+
+TEMPLATE_FILE = 'prompt.txt'
+OUTPUT_DIR = 'prompt_bundles'
+TOKEN_CACHE_FILE = 'token_cache.json'
+
+# 每次请求（提示词 + 主文本 + 参考文本）的 token 上限
+TOKEN_BUDGET = 16000
+
+# prompt.txt 以第二十四卷为例写成，生成时替换为实际卷号
+TEMPLATE_VOLUME = '二十四'
+
+# 模板中的附件行和输出位置行
+ATTACHMENT_RE = re.compile(r'^(主文本|参考文本)：@\S*$', re.M)
+OUTPUT_LINE_RE = re.compile(r'^将最终 Markdown 文件输出到：.*(?:\n@\S+)?$', re.M)
+
+# 汉字、全角标点按每字一个 token 估算，其余字符按每4个一个 token
+WIDE_CHAR_RE = re.compile(r'[⺀-鿿豈-﫿︰-﹏＀-￯]')
+
+def estimate_tokens(text):
+    """粗略估算文本的 token 数"""
+    wide = len(WIDE_CHAR_RE.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+def load_token_cache(path=TOKEN_CACHE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_token_cache(cache, path=TOKEN_CACHE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+def paragraph_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def split_paragraphs(lines, start, end, cache):
+    """
+    将第 start~end 行按空行切分为自然段，空行并入前一段，各段拼接即为原文
+
+    返回 [{'line_start', 'line_end', 'hash', 'tokens'}, ...]
+    """
+    ranges = []
+    para_start, has_text = start, False
+    for line_no in range(start, end + 1):
+        if lines[line_no - 1].strip():
+            if has_text and not lines[line_no - 2].strip():
+                ranges.append((para_start, line_no - 1))
+                para_start = line_no
+            has_text = True
+    if start <= end:
+        ranges.append((para_start, end))
+
+    paragraphs = []
+    for para_start, para_end in ranges:
+        text = "".join(lines[para_start - 1:para_end])
+        key = paragraph_hash(text)
+        if key not in cache:
+            cache[key] = estimate_tokens(text)
+        paragraphs.append({'line_start': para_start, 'line_end': para_end,
+                           'hash': key, 'tokens': cache[key]})
+    return paragraphs
+
+def read_lines(path):
+    """按行读取，保留原有换行符"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.readlines()
+
+def main_segments(path, lines):
+    """
+    讲记按经文切段，返回 [(起始行号, 结束行号, 经文起始行号), ...]
+
+    每段从一处粗体经文开始，卷首（卷标题等）并入第一段；没有经文的卷整卷为一段
+    """
+    starts = [start for start, _, _ in align_passages.bold_passages(path)]
+    if not starts:
+        return [(1, len(lines), None)]
+    bounds = [1] + starts[1:] + [len(lines) + 1]
+    return [(bounds[i], bounds[i + 1] - 1, starts[i]) for i in range(len(starts))]
+
+def reference_units(path, lines):
+    """
+    义贯按经文切段：每段为一段经文及其后的注释/义贯/诠论，到下一段经文之前为止
+
+    返回 {经文起始行号: 结束行号}
+    """
+    starts = sorted({record['line'] for record in
+                     extract_chengguan.iter_records(path, types=(extract_chengguan.SUTRA,))})
+    bounds = starts + [len(lines) + 1]
+    return {starts[i]: bounds[i + 1] - 1 for i in range(len(starts))}
+
+def load_references(rows):
+    """
+    由对照表得到 讲记经文 -> 义贯段落 的对应
+
+    返回 ({(讲记文件, 经文起始行号): [(义贯文件, 起始行号), ...]}, {义贯文件: 卷号})
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['passage_id'], []).append(row)
+
+    references = {}
+    volumes = {}
+    for members in groups.values():
+        targets = [(r['file'], r['line_start']) for r in members if r['corpus'] == 'chengguan']
+        if not targets:
+            continue
+        for r in members:
+            if r['corpus'] == 'yuanying':
+                references[(r['file'], r['line_start'])] = targets
+            elif r['corpus'] == 'chengguan':
+                volumes[r['file']] = r['volume']
+    return references, volumes
+
+def pack_volume(path, references, reference_volumes, cache, budget=TOKEN_BUDGET, overhead=0):
+    """
+    把一卷讲记打包为若干次请求
+
+    overhead 为提示词模板本身的 token 数。返回请求列表，每项
+    {'part', 'line_start', 'line_end', 'paragraphs', 'references', 'tokens'}，
+    references 为 [{'file', 'volume', 'line_start', 'line_end', 'tokens'}, ...]
+    """
+    lines = read_lines(path)
+    file_key = path.replace(os.sep, '/')
+    reference_files = {}
+    reference_cache = {}
+
+    def reference(ref_file, ref_start):
+        if (ref_file, ref_start) not in reference_cache:
+            if ref_file not in reference_files:
+                ref_lines = read_lines(ref_file)
+                reference_files[ref_file] = (ref_lines, reference_units(ref_file, ref_lines))
+            ref_lines, units = reference_files[ref_file]
+            ref_end = units.get(ref_start, ref_start)
+            tokens = sum(p['tokens'] for p in split_paragraphs(ref_lines, ref_start, ref_end, cache))
+            reference_cache[(ref_file, ref_start)] = {
+                'file': ref_file, 'volume': reference_volumes.get(ref_file),
+                'line_start': ref_start, 'line_end': ref_end, 'tokens': tokens}
+        return dict(reference_cache[(ref_file, ref_start)])
+
+    # 装箱单位：(自然段列表, 参考段落列表)；单独一段超出预算时按自然段再切开，
+    # 参考段落随经文所在的一块
+    units = []
+    for seg_start, seg_end, passage_start in main_segments(path, lines):
+        paragraphs = split_paragraphs(lines, seg_start, seg_end, cache)
+        refs = list({(ref_file, ref_start): reference(ref_file, ref_start)
+                     for ref_file, ref_start in references.get((file_key, passage_start), [])}.values())
+        limit = max(budget - overhead - sum(r['tokens'] for r in refs), budget // 4)
+        first_unit = len(units)
+        piece, tokens = [], 0
+        for paragraph in paragraphs:
+            if piece and tokens + paragraph['tokens'] > limit:
+                units.append((piece, []))
+                piece, tokens = [], 0
+            piece.append(paragraph)
+            tokens += paragraph['tokens']
+        if piece:
+            units.append((piece, []))
+        segment_units = units[first_unit:]
+        if not segment_units:
+            continue
+        # 经文行不在任何一块内时，参考段落随本段第一块
+        for piece, piece_refs in segment_units:
+            if passage_start is None or piece[0]['line_start'] <= passage_start <= piece[-1]['line_end']:
+                piece_refs.extend(refs)
+                break
+        else:
+            segment_units[0][1].extend(refs)
+
+    bundles = []
+    current = None
+    for paragraphs, refs in units:
+        if current is not None:
+            seen = {(r['file'], r['line_start']) for r in current['references']}
+            refs = [r for r in refs if (r['file'], r['line_start']) not in seen]
+        tokens = sum(p['tokens'] for p in paragraphs) + sum(r['tokens'] for r in refs)
+        if current is not None and current['tokens'] + tokens > budget:
+            bundles.append(current)
+            current = None
+        if current is None:
+            current = {'part': len(bundles) + 1, 'line_start': paragraphs[0]['line_start'],
+                       'paragraphs': [], 'references': [], 'tokens': overhead}
+        current['line_end'] = paragraphs[-1]['line_end']
+        current['paragraphs'] += paragraphs
+        current['references'] += refs
+        current['tokens'] += tokens
+    if current is not None:
+        bundles.append(current)
+
+    for bundle in bundles:
+        bundle['references'].sort(key=lambda r: (align_passages.volume_number(r['volume']),
+                                                 r['file'], r['line_start']))
+        if bundle['tokens'] > budget:
+            print(f"警告: {path} 第 {bundle['line_start']}-{bundle['line_end']} 行超出预算"
+                  f"（{bundle['tokens']} > {budget} tokens）")
+    return bundles
+
+def render_prompt(template, volume, bundle, main_text, reference_text, parts, instruction=None):
+    """
+    以 prompt.txt 为模板生成一次请求的提示词
+
+    模板中的输出位置行换成 instruction，默认为按段翻译的说明
+    """
+    if instruction is None:
+        instruction = (f"直接输出 Markdown 译文，不要写入文件。这是第{volume}卷 {parts} 段中的第 {bundle['part']} 段"
+                       f"（主文本第 {bundle['line_start']}-{bundle['line_end']} 行），"
+                       "各段译文按顺序拼接为全卷，只翻译本段主文本中的经文，不要补写本段之外的内容。")
+    prompt = template.replace(f'第{TEMPLATE_VOLUME}卷', f'第{volume}卷')
+    prompt = ATTACHMENT_RE.sub(lambda m: f"{m.group(1)}：见文末【{m.group(1)}】", prompt)
+    prompt = OUTPUT_LINE_RE.sub(lambda m: instruction, prompt)
+    return (f"{prompt.rstrip()}\n\n【主文本】\n\n{main_text.rstrip()}\n\n"
+            f"【参考文本】\n\n{reference_text.rstrip() or '（无）'}\n")
+
+def write_bundles(path, volume, bundles, template, output_dir=OUTPUT_DIR):
+    """写出一卷的各次请求提示词和 bundles.json，返回输出目录"""
+    volume_dir = os.path.join(output_dir, f'第{volume}卷')
+    os.makedirs(volume_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(volume_dir, '*.txt')):
+        os.remove(old)
+
+    lines = read_lines(path)
+    ref_lines = {}
+    for bundle in bundles:
+        main_text = "".join(lines[bundle['line_start'] - 1:bundle['line_end']])
+        reference_parts = []
+        for ref in bundle['references']:
+            if ref['file'] not in ref_lines:
+                ref_lines[ref['file']] = read_lines(ref['file'])
+            reference_parts.append("".join(ref_lines[ref['file']][ref['line_start'] - 1:ref['line_end']]))
+        reference_text = "\n".join(reference_parts)
+        prompt = render_prompt(template, volume, bundle, main_text, reference_text, len(bundles))
+        bundle['chunk_hash'] = hashlib.sha1(f"{main_text}\0{reference_text}".encode('utf-8')).hexdigest()
+        bundle['prompt_file'] = f"{bundle['part']:02d}.txt"
+        bundle['tokens'] = estimate_tokens(prompt)
+        with open(os.path.join(volume_dir, bundle['prompt_file']), 'w', encoding='utf-8') as f:
+            f.write(prompt)
+
+    manifest = {'source': path.replace(os.sep, '/'), 'volume': volume,
+                'template_hash': hashlib.sha1(template.encode('utf-8')).hexdigest(), 'bundles': bundles}
+    with open(os.path.join(volume_dir, 'bundles.json'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False))
+    return volume_dir
+
+def pack_all(volumes=None, budget=TOKEN_BUDGET, template_file=TEMPLATE_FILE, output_dir=OUTPUT_DIR):
+    """打包指定各卷（默认全部），返回 {卷号: 请求列表}"""
+    with open(template_file, 'r', encoding='utf-8') as f:
+        template = f.read()
+
+    cache = load_token_cache()
+    cache_size = len(cache)
+    overhead = estimate_tokens(template)
+    references, reference_volumes = load_references(
+        align_passages.build_alignment(corpora=('yuanying', 'chengguan')))
+
+    packed = {}
+    files = sorted(corpus_index.volume_files(['yuanying']),
+                   key=lambda f: align_passages.volume_number(f[1]))
+    for _, volume, path in files:
+        if volumes and volume not in volumes:
+            continue
+        bundles = pack_volume(path, references, reference_volumes, cache, budget, overhead)
+        volume_dir = write_bundles(path, volume, bundles, template, output_dir)
+        packed[volume] = bundles
+        print(f"第{volume}卷: {len(bundles)} 次请求，最大 {max(b['tokens'] for b in bundles)} tokens -> {volume_dir}")
+
+    if len(cache) != cache_size:
+        save_token_cache(cache)
+    return packed
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    budget = TOKEN_BUDGET
+    if '--budget' in args:
+        i = args.index('--budget')
+        budget = int(args[i + 1])
+        del args[i:i + 2]
+
+    start = time.perf_counter()
+    packed = pack_all(args or None, budget)
+    elapsed = time.perf_counter() - start
+    total = sum(len(bundles) for bundles in packed.values())
+    print(f"共 {len(packed)} 卷，{total} 次请求，预算 {budget} tokens，用时 {elapsed:.2f}s")
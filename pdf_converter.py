@@ -1,26 +1,46 @@
 import pdfplumber
-from opencc import OpenCC
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
 import os
+import functools
+import hashlib
+import inspect
+import json
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import html_split
+import pdf_extract
+import pdf_layout
+import t2s
+from pdf_layout import LAYOUT_TOLERANCE
+from pdf_profile import ConversionProfile, ProgressReporter, lap, profile_mode
+
+# 保留的字号范围：讲义(13pt)与经文(16pt)，允许±0.5pt的误差
+# 顺序固定为 (讲义, 经文)，Markdown 中字号不小于经文下限的文字加粗
+SIZE_BANDS = ((12.5, 13.5), (15.5, 16.5))
+
+def load_calibration(path):
+    """
+    读取 debug_pdf.save_calibration 生成的校准文件，返回字号范围 ((讲义), (经文))
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        calibration = json.load(f)
+    body_band, sutra_band = calibration['size_bands']
+    return tuple(body_band), tuple(sutra_band)
 
 def detect_layout(chars):
     """
     检测PDF是横排还是竖排
     返回 'horizontal' 或 'vertical'
     """
-    if len(chars) < 10:
-        return 'horizontal'
-
-    # 统计不同的x坐标和y坐标数量
-    unique_x = len(set([round(c['x0'], 1) for c in chars]))
-    unique_y = len(set([round(c['top'], 1) for c in chars]))
-
-    # 如果X坐标数量远小于Y坐标数量，说明是竖排（列少，每列字符多）
-    # 如果Y坐标数量远小于X坐标数量，说明是横排（行少，每行字符多）
-    if unique_x < unique_y * 0.5:
-        return 'vertical'
-    else:
-        return 'horizontal'
+    arrays = pdf_layout.char_arrays(chars)
+    layout, _, _ = pdf_layout.detect_layout(arrays['x0'], arrays['top'])
+    return layout
 
+@functools.lru_cache(maxsize=None)
 def clean_fontname(fontname):
     """
     清理PDF字体名称，移除随机前缀
@@ -39,14 +59,27 @@ def clean_fontname(fontname):
 
     return fontname
 
-def get_font_style(char):
-    """
-    从字符提取字体样式信息
-    返回包含 font-family, font-size, font-weight 的字典
-    """
-    fontname = char.get('fontname', '')
-    size = char.get('size', 12)
-
+# 字体映射（PDF字体名 -> Web安全字体）
+FONT_MAP = {
+    'SimSun': '"SimSun", "宋体", serif',
+    'SimHei': '"SimHei", "黑体", sans-serif',
+    'KaiTi': '"KaiTi", "楷体", serif',
+    'FangSong': '"FangSong", "仿宋", serif',
+    'FZShuSong': '"FZShuSong", "方正书宋", serif',
+    'FZKai': '"FZKai", "方正楷体", serif',
+    'FZSong': '"FZSong", "方正宋体", serif',
+    'STSong': '"STSong", "华文宋体", serif',
+    'STKaiti': '"STKaiti", "华文楷体", serif',
+    'STHeiti': '"STHeiti", "华文黑体", sans-serif',
+    'STFangsong': '"STFangsong", "华文仿宋", serif',
+    'Arial': 'Arial, sans-serif',
+    'Times': '"Times New Roman", Times, serif',
+    'Courier': '"Courier New", Courier, monospace',
+}
+
+@functools.lru_cache(maxsize=None)
+def _font_style_items(fontname, size):
+    """按原始字体名和字号计算样式，结果按 (字体名, 字号) 缓存"""
     # 清理字体名称
     clean_name = clean_fontname(fontname)
 
@@ -57,66 +90,34 @@ def get_font_style(char):
         if any(x in fontname_lower for x in ['bold', 'heavy', 'black', 'bd']):
             font_weight = 'bold'
 
-    # 字体映射（PDF字体名 -> Web安全字体）
-    font_map = {
-        'SimSun': '"SimSun", "宋体", serif',
-        'SimHei': '"SimHei", "黑体", sans-serif',
-        'KaiTi': '"KaiTi", "楷体", serif',
-        'FangSong': '"FangSong", "仿宋", serif',
-        'FZShuSong': '"FZShuSong", "方正书宋", serif',
-        'FZKai': '"FZKai", "方正楷体", serif',
-        'FZSong': '"FZSong", "方正宋体", serif',
-        'STSong': '"STSong", "华文宋体", serif',
-        'STKaiti': '"STKaiti", "华文楷体", serif',
-        'STHeiti': '"STHeiti", "华文黑体", sans-serif',
-        'STFangsong': '"STFangsong", "华文仿宋", serif',
-        'Arial': 'Arial, sans-serif',
-        'Times': '"Times New Roman", Times, serif',
-        'Courier': '"Courier New", Courier, monospace',
-    }
-
-    font_family = font_map.get(clean_name, f'"{clean_name}", "SimSun", serif')
+    font_family = FONT_MAP.get(clean_name, f'"{clean_name}", "SimSun", serif')
 
-    return {
-        'font-family': font_family,
-        'font-size': f'{size:.1f}pt',
-        'font-weight': font_weight
-    }
+    return (
+        ('font-family', font_family),
+        ('font-size', f'{size:.1f}pt'),
+        ('font-weight', font_weight),
+    )
 
-def convert_pdf_to_html(input_path, output_path, max_pages=None, skip_pages=2):
+def get_font_style(char):
     """
-    解析PDF，将繁体转换为简体，输出为HTML格式，保留文字格式。
-    支持横排和竖排布局。
-
-    参数:
-        skip_pages: 跳过前N页，默认跳过前2页
+    从字符提取字体样式信息
+    返回包含 font-family, font-size, font-weight 的字典
     """
-    cc = OpenCC('t2s')
-
-    if not os.path.exists(input_path):
-        print(f"错误：找不到文件 {input_path}")
-        return
+    return dict(_font_style_items(char.get('fontname', ''), char.get('size', 12)))
 
-    print(f"开始处理: {input_path}")
-    print(f"跳过前 {skip_pages} 页")
-
-    try:
-        with pdfplumber.open(input_path) as pdf:
-            total_pages = len(pdf.pages)
-            if max_pages:
-                total_pages = min(total_pages, max_pages)
+@functools.lru_cache(maxsize=None)
+def font_style_class(fontname, size):
+    """
+    样式驻留：同一 (字体族, 字号, 字重) 对应同一个CSS类
+    返回 (类名, CSS声明)；类名由CSS声明的哈希生成，各进程、各次运行之间保持一致
+    """
+    declarations = '; '.join([f'{k}: {v}' for k, v in _font_style_items(fontname, size)])
+    return 's-' + hashlib.sha1(declarations.encode('utf-8')).hexdigest()[:8], declarations
 
-            html_content = []
+HTML_TITLE = "楞严经讲义 - 简体版"
 
-            # HTML 头部
-            html_content.append("""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>楞严经讲义 - 简体版</title>
-    <style>
-        body {
+# 基础样式：单文件时内嵌在 <style> 中，分块输出时写入 style.css
+HTML_BASE_CSS = """        body {
             font-family: "Microsoft YaHei", "SimSun", serif;
             max-width: 900px;
             margin: 0 auto;
@@ -157,223 +158,652 @@ def convert_pdf_to_html(input_path, output_path, max_pages=None, skip_pages=2):
         .font-bold {
             font-weight: bold;
         }
-    </style>
+"""
+
+HTML_HEAD = f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{HTML_TITLE}</title>
+    <style>
+""" + HTML_BASE_CSS
+
+HTML_HEAD_END = """    </style>
 </head>
 <body>
-""")
+"""
 
-            for i in range(skip_pages, total_pages):
-                page = pdf.pages[i]
-                print(f"处理进度: {i+1}/{total_pages} 页")
+MD_HEADER = "# 楞严经讲义 - 简体版\n\n"
 
-                chars = page.chars
-                if not chars:
-                    html_content.append(f'<div class="page"><p class="page-number">第 {i+1} 页（无文字内容）</p></div>\n')
-                    continue
+HTML_FOOTER = """
+</body>
+</html>
+"""
+
+def html_header(styles):
+    """
+    HTML 头部，包含本文档用到的字体样式类
+
+    参数:
+        styles: {类名: CSS声明}
+    """
+    rules = "".join(f"        .{name} {{ {declarations}; }}\n"
+                    for name, declarations in sorted(styles.items()))
+    return HTML_HEAD + "        /* 页面字体样式 */\n" + rules + HTML_HEAD_END
+
+def md_header(styles):
+    """Markdown 头部（Markdown 不使用样式表）"""
+    return MD_HEADER
+
+def extract_page(page, i, size_bands=SIZE_BANDS, region=None, timings=None):
+    """
+    提取阶段：由 pdf_extract 在排版页面时按字号（及区域）过滤字符，
+    不生成 page.chars 的字符字典，随后释放页面的解析缓存
+
+    参数:
+        region: (x0, top, x1, bottom)，只保留该区域内的字符，为 None 时不按区域过滤
+        timings: 分阶段计时 {阶段: 秒}，为 None 时不计时（见 pdf_profile）
+
+    返回页面记录字典：
+        index: 页码（从0开始）
+        char_count: 页面原始字符数
+        glyphs: 过滤后的字符表（见 pdf_layout.layout_glyphs）
+    """
+    try:
+        glyphs, char_count = pdf_extract.extract_glyphs(page, size_bands, region, timings)
+        return {'index': i, 'char_count': char_count, 'glyphs': glyphs}
+    finally:
+        # 释放 pdfplumber 缓存的 chars/layout，避免内存随页数增长
+        page.close()
+
+def group_page(record, tolerance=LAYOUT_TOLERANCE, timings=None):
+    """
+    分组阶段：由 pdf_layout 检测布局，将字符聚合为按阅读顺序排列的块（列/行）和文本段
+
+    在记录中补充 pdf_layout.layout_glyphs 返回的 layout、mixed、unique_x、unique_y、blocks，
+    并释放字符表
+    """
+    record.update(pdf_layout.layout_glyphs(record.pop('glyphs'), tolerance, timings))
+    return record
+
+def span_html(class_name, text):
+    """输出一个引用字体样式类的span"""
+    return f'<span class="{class_name}">{text}</span>'
+
+def render_page_html(record, cc, size_bands=SIZE_BANDS, timings=None):
+    """
+    渲染阶段：将分组后的页面记录渲染为HTML片段（<div class="page">...</div>）
+
+    参数:
+        record: 经过 group_page 处理的页面记录
+        cc: t2s.T2SConverter 转换器
+        size_bands: 字号范围（HTML 按实际字号输出样式，不使用该参数）
+        timings: 分阶段计时，繁简转换的耗时记入 convert
+
+    返回 (HTML片段, 本页用到的样式 {类名: CSS声明})
+    """
+    i = record['index']
+    if not record['char_count']:
+        return f'<div class="page"><p class="page-number">第 {i+1} 页（无文字内容）</p></div>\n', {}
+
+    if not record['layout']:
+        return f'<div class="page"><p class="page-number">第 {i+1} 页（无匹配字号内容）</p></div>\n', {}
+
+    # 先把每行切分为span，整页文本一次性转换为简体
+    lines = []
+    texts = []
+    styles = {}
+    for block in record['blocks']:
+        items = []
+        current_class = None
+        span_text = ""
+
+        for run in block['runs']:
+            # 字符间距较大处补空格（记为 None），字体样式改变处开始新的span
+            run_class, declarations = font_style_class(run['fontname'], run['size'])
+            if run['gap_before'] or current_class != run_class:
+                if span_text:
+                    items.append((current_class, len(texts)))
+                    texts.append(span_text)
+                    span_text = ""
+                if run['gap_before']:
+                    items.append(None)
+                current_class = run_class
+                styles[run_class] = declarations
+
+            span_text += run['text']
+
+        # 最后一段文本
+        if span_text:
+            items.append((current_class, len(texts)))
+            texts.append(span_text)
+        lines.append(items)
+
+    if timings is not None:
+        start = time.perf_counter()
+    simplified = cc.convert_many(texts)
+    if timings is not None:
+        lap(timings, 'convert', start)
+
+    parts = ['<div class="page">\n']
+    for items in lines:
+        line_html = '<div class="text-line">'
+        for item in items:
+            if item is None:
+                line_html += " "
+            else:
+                class_name, k = item
+                line_html += span_html(class_name, simplified[k])
+        line_html += '</div>\n'
+        parts.append(line_html)
+
+    parts.append(f'<p class="page-number">第 {i+1} 页</p>\n')
+    parts.append('</div>\n')
+
+    return "".join(parts), styles
+
+def render_page_md(record, cc, size_bands=SIZE_BANDS, timings=None):
+    """
+    渲染阶段：将分组后的页面记录渲染为Markdown片段
+
+    参数:
+        record: 经过 group_page 处理的页面记录
+        cc: t2s.T2SConverter 转换器
+        size_bands: 字号范围 (讲义, 经文)，字号不小于经文下限的文字加粗
+        timings: 分阶段计时，繁简转换的耗时记入 convert
+
+    返回 (Markdown片段, {})，与 HTML 渲染的返回形式一致
+    """
+    if not record['layout']:
+        return "", {}
+
+    i = record['index']
+    sutra_min = size_bands[1][0]
+
+    # 先按字号把列/行切分为若干组，整页文本一次性转换为简体
+    block_groups = []
+    texts = []
+    for block in record['blocks']:
+        groups = []
+        current_size = round(block['runs'][0]['size'], 1)
+        current_text = ""
+
+        for run in block['runs']:
+            size = round(run['size'], 1)
+            if size != current_size:
+                groups.append((current_size, len(texts)))
+                texts.append(current_text)
+                current_size = size
+                current_text = run['text']
+            else:
+                current_text += run['text']
+
+        groups.append((current_size, len(texts)))
+        texts.append(current_text)
+        block_groups.append(groups)
+
+    if timings is not None:
+        start = time.perf_counter()
+    simplified = cc.convert_many(texts)
+    if timings is not None:
+        lap(timings, 'convert', start)
+
+    parts = [f"<!-- 第 {i+1} 页 -->\n\n"]
+    for groups in block_groups:
+        for n, (size, k) in enumerate(groups):
+            text = simplified[k].strip()
+            if not text:
+                continue
+            # 每列/行的最后一组后空一行
+            end = "\n\n" if n == len(groups) - 1 else ""
+            if size >= sutra_min: # 经文 (16pt)
+                parts.append(f"**{text}**{end}")
+            else: # 讲义 (13pt)
+                parts.append(f"{text}{end}")
+
+    parts.append(f"\n---\n*第 {i+2} 页*\n\n")
+
+    return "".join(parts), {}
+
+PAGE_RENDERERS = {
+    'html': render_page_html,
+    'md': render_page_md,
+}
+
+PAGE_HEADERS = {
+    'html': html_header,
+    'md': md_header,
+}
+
+PAGE_FOOTERS = {
+    'html': HTML_FOOTER,
+    'md': "",
+}
+
+def failed_page_fragment(fmt, i):
+    """转换失败页面的占位片段"""
+    if fmt == 'html':
+        return f'<div class="page"><p class="page-number">第 {i+1} 页（转换失败）</p></div>\n'
+    return f"<!-- 第 {i+1} 页转换失败 -->\n\n"
+
+def conversion_params(fmt, skip_pages, size_bands=SIZE_BANDS, tolerance=LAYOUT_TOLERANCE, region=None):
+    """
+    汇总影响单页渲染结果的参数，用于断点缓存的失效判断
+    渲染相关函数及 pdf_layout 模块的源码也计入其中，修改渲染规则或版面参数后旧缓存自动失效；
+    繁简转换的词典和实现（t2s.fingerprint）同样计入；
+    HTML 头部的 CSS 只在写出时拼接，修改它不会导致页面重新渲染
+    """
+    render_funcs = [pdf_extract, pdf_layout, extract_page, group_page, clean_fontname,
+                    _font_style_items, font_style_class, span_html, PAGE_RENDERERS[fmt]]
+    renderer_source = "".join(inspect.getsource(func) for func in render_funcs)
+    return {
+        'format': fmt,
+        'skip_pages': skip_pages,
+        'size_bands': [list(band) for band in size_bands],
+        'layout_tolerance': tolerance,
+        'region': list(region) if region else None,
+        'renderer': hashlib.sha1(renderer_source.encode('utf-8')).hexdigest(),
+        't2s': t2s.fingerprint(),
+    }
+
+def params_digest(params):
+    """参数字典的哈希值"""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+def pdf_object_hash(obj, memo):
+    """
+    PDF 对象的哈希值：字典、数组逐项计入，间接引用展开为被引用的对象，流计入属性和原始数据
+
+    memo 为 {对象编号: 哈希值}，同一文档内共享，字体等被多页引用的对象只计算一次；
+    循环引用处以对象编号代替
+    """
+    if isinstance(obj, PDFObjRef):
+        if obj.objid not in memo:
+            memo[obj.objid] = f"ref {obj.objid}"
+            memo[obj.objid] = pdf_object_hash(obj.resolve(), memo)
+        return memo[obj.objid]
+
+    h = hashlib.sha1()
+    if isinstance(obj, PDFStream):
+        h.update(b'stream' + pdf_object_hash(obj.attrs, memo).encode('ascii'))
+        data = obj.get_rawdata()
+        h.update(data if data is not None else obj.get_data())
+    elif isinstance(obj, dict):
+        h.update(b'dict')
+        for key in sorted(obj, key=str):
+            h.update(f"{key}\0{pdf_object_hash(obj[key], memo)}\0".encode('utf-8'))
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'list')
+        for item in obj:
+            h.update(f"{pdf_object_hash(item, memo)}\0".encode('utf-8'))
+    else:
+        h.update(repr(obj).encode('utf-8'))
+    return h.hexdigest()
+
+def page_content_hash(page, memo=None):
+    """
+    页面内容流、页面尺寸及资源（字体及其 ToUnicode 映射、XObject 等）的哈希值，
+    无需解析字符即可判断页面是否变化；memo 见 pdf_object_hash
+    """
+    memo = {} if memo is None else memo
+    h = hashlib.sha1(repr(page.page_obj.mediabox).encode('utf-8'))
+    for stream in page.page_obj.contents:
+        h.update(resolve1(stream).get_data())
+    h.update(pdf_object_hash(page.page_obj.resources, memo).encode('ascii'))
+    return h.hexdigest()
+
+def checkpoint_path(output_path):
+    """断点文件路径：与输出文件同目录的 .checkpoint.jsonl 文件"""
+    return output_path + '.checkpoint.jsonl'
+
+def load_checkpoint(path):
+    """
+    读取断点文件，返回 {页码: (内容哈希, 参数哈希, 行偏移)}
+    片段内容不读入内存，需要时按偏移读取；中断时写了一半的末行会被忽略
+    """
+    index = {}
+    if not os.path.exists(path):
+        return index
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                entry = json.loads(line)
+                index[entry['page']] = (entry['content'], entry['params'], offset)
+            except (ValueError, KeyError):
+                pass
+            offset += len(line)
+    return index
+
+def read_checkpoint_fragment(f, offset):
+    """从断点文件的指定偏移读取页面片段，返回 (片段, 样式)"""
+    f.seek(offset)
+    entry = json.loads(f.readline())
+    return entry['fragment'], entry.get('styles', {})
+
+def append_checkpoint(f, i, content_hash, digest, fragment, styles):
+    """追加一页的断点记录并立即刷新"""
+    entry = {'page': i, 'content': content_hash, 'params': digest,
+             'fragment': fragment, 'styles': styles}
+    f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+    f.flush()
+
+def compact_checkpoint(path, pages):
+    """
+    压缩断点文件：只保留本次转换中各页的最新记录
 
-                # 过滤：只保留16pt和13pt的字符（允许±0.5pt的误差）
-                filtered_chars = [c for c in chars if 12.5 <= c['size'] <= 13.5 or 15.5 <= c['size'] <= 16.5]
+    参数:
+        pages: {页码: 内容哈希}，本次转换成功的页面
+    """
+    index = load_checkpoint(path)
+    tmp_path = path + '.tmp'
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        for i in sorted(pages):
+            if i in index and index[i][0] == pages[i]:
+                src.seek(index[i][2])
+                dst.write(src.readline())
+    os.replace(tmp_path, path)
+
+def page_profile(record, timings):
+    """每页的计时记录：各阶段耗时及布局信息（写入逐页记录）"""
+    return {'layout': record.get('layout'), 'mixed': record.get('mixed'), 'unique_x': record.get('unique_x'),
+            'unique_y': record.get('unique_y'), 'char_count': record.get('char_count'),
+            'stages': timings}
+
+def iter_page_range(input_path, start, end, fmt, params=None, cached=None, profile=False):
+    """
+    逐页执行 提取 → 分组 → 渲染，产出 (页码, 内容哈希, 片段, 样式, 错误信息, 计时)
+    单页失败只记录错误，不影响其他页
 
-                if not filtered_chars:
-                    html_content.append(f'<div class="page"><p class="page-number">第 {i+1} 页（无匹配字号内容）</p></div>\n')
+    参数:
+        params: conversion_params 返回的渲染参数，默认使用模块常量
+        cached: {页码: 内容哈希}，断点中参数一致的页面；内容哈希相同时跳过渲染，
+                产出的片段和样式为 None，由调用方从断点文件中读取
+        profile: 为 True 时分阶段计时，产出 page_profile 记录；否则计时为 None
+    """
+    if params is None:
+        params = conversion_params(fmt, 0)
+    cached = cached or {}
+    render = PAGE_RENDERERS[fmt]
+    cc = t2s.get_converter()
+    # 字体等资源在各页间共享，哈希按对象编号缓存
+    resource_hashes = {}
+    with pdfplumber.open(input_path) as pdf:
+        for i in range(start, end):
+            timings = {} if profile else None
+            try:
+                if profile:
+                    tick = time.perf_counter()
+                page = pdf.pages[i]
+                content_hash = page_content_hash(page, resource_hashes)
+                if cached.get(i) == content_hash:
+                    yield i, content_hash, None, None, None, None
                     continue
+                if profile:
+                    lap(timings, 'open', tick)
+                record = extract_page(page, i, params['size_bands'], params['region'], timings)
+                record = group_page(record, params['layout_tolerance'], timings)
+                if profile:
+                    tick = time.perf_counter()
+                fragment, styles = render(record, cc, params['size_bands'], timings)
+                if profile:
+                    # 渲染函数内的繁简转换已单独记入 convert
+                    lap(timings, 'render', tick)
+                    timings['render'] -= timings.get('convert', 0.0)
+                yield i, content_hash, fragment, styles, None, \
+                    page_profile(record, timings) if profile else None
+            except Exception as e:
+                yield i, None, None, None, f"{type(e).__name__}: {e}", None
+
+def _render_page_range(input_path, start, end, fmt, params, cached, profile=False):
+    """进程池工作函数：独立打开PDF，渲染 [start, end) 范围内的页面"""
+    return list(iter_page_range(input_path, start, end, fmt, params, cached, profile))
+
+def iter_rendered_pages(input_path, fmt, skip_pages, total_pages, workers=1, chunk_size=None,
+                        params=None, cached=None, profile=False):
+    """
+    按页码顺序逐页产出 (页码, 内容哈希, 片段, 样式, 错误信息, 计时)
 
-                # 检测布局
-                layout = detect_layout(filtered_chars)
-                unique_x = len(set([round(c['x0'], 1) for c in filtered_chars]))
-                unique_y = len(set([round(c['top'], 1) for c in filtered_chars]))
-                print(f"  X坐标数:{unique_x}, Y坐标数:{unique_y}, 布局:{layout}")
-
-                html_content.append(f'<div class="page">\n')
-
-                if layout == 'vertical':
-                    # 竖排布局：按列组织
-                    # 先按x坐标排序
-                    sorted_chars = sorted(filtered_chars, key=lambda c: c['x0'])
-
-                    columns = []
-                    if sorted_chars:
-                        current_column = [sorted_chars[0]]
-                        for j in range(1, len(sorted_chars)):
-                            char = sorted_chars[j]
-                            prev_char = sorted_chars[j-1]
-
-                            # 如果x坐标差异小于字号的一半，视为同一列
-                            tolerance = prev_char['size'] * 0.5
-                            if char['x0'] - prev_char['x0'] < tolerance:
-                                current_column.append(char)
-                            else:
-                                columns.append(current_column)
-                                current_column = [char]
-                        columns.append(current_column)
-
-                    # 台湾竖排文本：从右向左排列
-                    for column in reversed(columns):
-                        # 列内按y坐标排序（从上到下）
-                        column_chars = sorted(column, key=lambda c: c['top'])
-
-                        column_text = "".join([c['text'] for c in column_chars]).strip()
-                        if not column_text:
-                            continue
-
-                        line_html = '<div class="text-line">'
-                        last_y = -1
-                        current_style = None
-                        span_text = ""
-
-                        for idx, char in enumerate(column_chars):
-                            text = char['text']
-
-                            # 如果y坐标间距较大，补空格
-                            if last_y != -1 and (char['top'] - last_y) > char['size'] * 1.5:
-                                if span_text:
-                                    # 先输出当前span
-                                    simplified = cc.convert(span_text)
-                                    if current_style:
-                                        style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                        line_html += f'<span style="{style_str}">{simplified}</span>'
-                                    else:
-                                        line_html += simplified
-                                    span_text = ""
-                                line_html += " "
-
-                            # 获取当前字符的字体样式
-                            char_style = get_font_style(char)
-
-                            # 如果字体样式改变，输出之前的文本并开始新的span
-                            if current_style != char_style:
-                                if span_text:
-                                    simplified = cc.convert(span_text)
-                                    if current_style:
-                                        style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                        line_html += f'<span style="{style_str}">{simplified}</span>'
-                                    else:
-                                        line_html += simplified
-                                    span_text = ""
-                                current_style = char_style
-
-                            span_text += text
-                            last_y = char['bottom']
-
-                        # 输出最后一段文本
-                        if span_text:
-                            simplified = cc.convert(span_text)
-                            if current_style:
-                                style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                line_html += f'<span style="{style_str}">{simplified}</span>'
-                            else:
-                                line_html += simplified
-
-                        line_html += '</div>\n'
-                        html_content.append(line_html)
-
-                else:
-                    # 横排布局：按行组织
-                    sorted_chars = sorted(filtered_chars, key=lambda c: c['top'])
-
-                    lines = []
-                    if sorted_chars:
-                        current_line = [sorted_chars[0]]
-                        for j in range(1, len(sorted_chars)):
-                            char = sorted_chars[j]
-                            prev_char = sorted_chars[j-1]
-
-                            tolerance = prev_char['size'] * 0.5
-                            if char['top'] - prev_char['top'] < tolerance:
-                                current_line.append(char)
-                            else:
-                                lines.append(current_line)
-                                current_line = [char]
-                        lines.append(current_line)
-
-                    for line in lines:
-                        line_chars = sorted(line, key=lambda c: c['x0'])
-                        line_text = "".join([c['text'] for c in line_chars]).strip()
-                        if not line_text:
-                            continue
-
-                        line_html = '<div class="text-line">'
-                        last_x = -1
-                        current_style = None
-                        span_text = ""
-
-                        for idx, char in enumerate(line_chars):
-                            text = char['text']
-
-                            if last_x != -1 and (char['x0'] - last_x) > char['size'] * 1.5:
-                                if span_text:
-                                    # 先输出当前span
-                                    simplified = cc.convert(span_text)
-                                    if current_style:
-                                        style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                        line_html += f'<span style="{style_str}">{simplified}</span>'
-                                    else:
-                                        line_html += simplified
-                                    span_text = ""
-                                line_html += " "
-
-                            # 获取当前字符的字体样式
-                            char_style = get_font_style(char)
-
-                            # 如果字体样式改变，输出之前的文本并开始新的span
-                            if current_style != char_style:
-                                if span_text:
-                                    simplified = cc.convert(span_text)
-                                    if current_style:
-                                        style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                        line_html += f'<span style="{style_str}">{simplified}</span>'
-                                    else:
-                                        line_html += simplified
-                                    span_text = ""
-                                current_style = char_style
-
-                            span_text += text
-                            last_x = char['x1']
-
-                        # 输出最后一段文本
-                        if span_text:
-                            simplified = cc.convert(span_text)
-                            if current_style:
-                                style_str = '; '.join([f'{k}: {v}' for k, v in current_style.items()])
-                                line_html += f'<span style="{style_str}">{simplified}</span>'
-                            else:
-                                line_html += simplified
-
-                        line_html += '</div>\n'
-                        html_content.append(line_html)
-
-                html_content.append(f'<p class="page-number">第 {i+1} 页</p>\n')
-                html_content.append('</div>\n')
-
-            # HTML 尾部
-            html_content.append("""
-</body>
-</html>
-""")
+    参数:
+        fmt: 'html' 或 'md'
+        workers: 进程数，1 表示在当前进程中串行处理
+        chunk_size: 每个任务分配的连续页数，默认按进程数自动计算
+        params, cached, profile: 见 iter_page_range
+    """
+    if params is None:
+        params = conversion_params(fmt, skip_pages)
+    cached = cached or {}
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.writelines(html_content)
+    if workers <= 1:
+        yield from iter_page_range(input_path, skip_pages, total_pages, fmt, params, cached, profile)
+        return
 
-            print(f"\n转换成功！\n输出文件：{output_path}")
+    page_count = max(total_pages - skip_pages, 0)
+    if not chunk_size:
+        # 每个进程约分到4个任务，兼顾负载均衡与进程间通信开销
+        chunk_size = max(1, -(-page_count // (workers * 4)))
+
+    starts = iter(range(skip_pages, total_pages, chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(start):
+            end = min(start + chunk_size, total_pages)
+            range_cached = {i: cached[i] for i in range(start, end) if i in cached}
+            return executor.submit(_render_page_range, input_path, start, end, fmt,
+                                   params, range_cached, profile)
+
+        # 只保留有限个未完成任务，已完成的结果尽快写出，内存占用不随页数增长
+        pending = deque(submit(start) for start in islice(starts, workers * 2))
+        while pending:
+            results = pending.popleft().result()
+            for start in islice(starts, 1):
+                pending.append(submit(start))
+            # 任务按页码顺序提交，依次取结果即可保证输出顺序
+            yield from results
+
+def write_pages(f, fmt, pages, total_pages, styles, checkpoint=None, checkpoint_digest=None,
+                progress=None, profiler=None):
+    """
+    写出阶段：每页渲染完成后立即写入并刷新到磁盘
+
+    参数:
+        styles: 文档样式表 {类名: CSS声明}，各页用到的样式合并到其中
+        checkpoint: (读句柄, 追加句柄, 断点索引)，为 None 时不使用断点
+        checkpoint_digest: 本次转换的参数哈希
+        progress: pdf_profile.ProgressReporter，为 None 时不输出进度
+        profiler: pdf_profile.ConversionProfile，为 None 时不计时
+
+    返回 (转换失败的 [(页码, 错误信息)], 成功页面的 {页码: 内容哈希}, 复用缓存的页数)
+    """
+    failed_pages = []
+    done_pages = {}
+    reused = 0
+    for i, content_hash, fragment, page_styles, error, timings in pages:
+        if timings is not None:
+            tick = time.perf_counter()
+        if error:
+            failed_pages.append((i, error))
+            fragment, page_styles = failed_page_fragment(fmt, i), {}
+        elif checkpoint:
+            reader, writer, index = checkpoint
+            if fragment is None:
+                fragment, page_styles = read_checkpoint_fragment(reader, index[i][2])
+                reused += 1
+            else:
+                append_checkpoint(writer, i, content_hash, checkpoint_digest, fragment, page_styles)
+            done_pages[i] = content_hash
+        styles.update(page_styles)
+        f.write(fragment)
+        f.flush()
+        if timings is not None:
+            lap(timings['stages'], 'write', tick)
+        if profiler and not error:
+            profiler.add_page(i, timings)
+        if progress:
+            progress.update(i + 1)
+    return failed_pages, done_pages, reused
+
+def report_failed_pages(failed_pages):
+    """打印转换失败的页面"""
+    if not failed_pages:
+        return
+    print(f"\n有 {len(failed_pages)} 页转换失败：")
+    for i, error in failed_pages:
+        print(f"  第 {i+1} 页: {error}")
+
+def assemble_output(output_path, body_path, fmt, styles):
+    """拼接 头部（含样式表）+ 正文 + 尾部，写出最终文件并删除正文临时文件"""
+    with open(output_path, 'w', encoding='utf-8') as out, \
+         open(body_path, 'r', encoding='utf-8') as body:
+        out.write(PAGE_HEADERS[fmt](styles))
+        shutil.copyfileobj(body, out)
+        out.write(PAGE_FOOTERS[fmt])
+    os.remove(body_path)
+
+def open_body(output_path, skip_pages, split_pages=None):
+    """正文的写出目标：单文件时为 output_path + '.part'，分块时为 html_split.ChunkWriter"""
+    if split_pages:
+        return html_split.ChunkWriter(output_path, split_pages, skip_pages)
+    return open(output_path + '.part', 'w', encoding='utf-8')
+
+def finish_output(output_path, fmt, body, styles, split_pages=None):
+    """单文件时拼接头部、正文和尾部；分块时写出目录页和样式表"""
+    if split_pages:
+        html_split.write_book(output_path, body.chunks, HTML_BASE_CSS, styles, HTML_TITLE)
+    else:
+        assemble_output(output_path, output_path + '.part', fmt, styles)
+
+def convert_pages(input_path, output_path, fmt, total_pages, skip_pages, workers=1, checkpoint=False,
+                  size_bands=SIZE_BANDS, region=None, profile=None, split_pages=None):
+    """
+    渲染 [skip_pages, total_pages) 范围内的页面并流式写出到 output_path
+
+    各页正文先逐页写入 output_path + '.part'，全部完成后再与头部（HTML 的样式表
+    要等所有页面渲染完才能确定）拼接为最终文件
+
+    参数:
+        checkpoint: 为 True 时在输出文件旁维护断点文件，记录每页的内容哈希、
+                    参数哈希和渲染结果；重新运行时只渲染内容或参数变化的页面，
+                    其余页面直接复用，中断后也可从已完成的页面继续
+        size_bands: 保留的字号范围 (讲义, 经文)
+        region: 只保留该区域 (x0, top, x1, bottom) 内的字符，用于去除页眉页脚
+        profile: 分阶段计时，True/'summary' 写出汇总，'trace' 另写逐页记录；
+                 为 None 时由环境变量 PDF_PROFILE 决定（见 pdf_profile）
+        split_pages: 仅 HTML，每个分块的页数；设置后 output_path 为输出目录，
+                     写出按需加载分块的 index.html（见 html_split）
+    """
+    params = conversion_params(fmt, skip_pages, size_bands, region=region)
+    digest = params_digest(params)
+    split_pages = split_pages if fmt == 'html' else None
+    # 分块输出时 output_path 是目录，去掉末尾的分隔符，断点等文件写在目录旁
+    output_path = os.path.normpath(output_path)
+    styles = {}
+    mode = profile_mode(profile)
+    profiler = ConversionProfile(mode, output_path, fmt) if mode else None
+    progress = ProgressReporter(total_pages, skip_pages)
+
+    if not checkpoint:
+        with open_body(output_path, skip_pages, split_pages) as f:
+            pages = iter_rendered_pages(input_path, fmt, skip_pages, total_pages, workers, params=params,
+                                        profile=bool(mode))
+            failed_pages, _, _ = write_pages(f, fmt, pages, total_pages, styles,
+                                             progress=progress, profiler=profiler)
+        finish_output(output_path, fmt, f, styles, split_pages)
+        if profiler:
+            profiler.save()
+        return failed_pages
+
+    ckpt_path = checkpoint_path(output_path)
+    index = load_checkpoint(ckpt_path)
+    cached = {i: content for i, (content, page_digest, _) in index.items() if page_digest == digest}
+    if cached:
+        print(f"断点文件中有 {len(cached)} 页可复用: {ckpt_path}")
+
+    with open_body(output_path, skip_pages, split_pages) as f, \
+         open(ckpt_path, 'ab') as writer, \
+         open(ckpt_path, 'rb') as reader:
+        pages = iter_rendered_pages(input_path, fmt, skip_pages, total_pages, workers,
+                                    params=params, cached=cached, profile=bool(mode))
+        failed_pages, done_pages, reused = write_pages(
+            f, fmt, pages, total_pages, styles, (reader, writer, index), digest, progress, profiler)
+    finish_output(output_path, fmt, f, styles, split_pages)
+
+    compact_checkpoint(ckpt_path, done_pages)
+    print(f"复用缓存 {reused} 页，重新渲染 {len(done_pages) - reused} 页")
+    if profiler:
+        profiler.save()
+    return failed_pages
+
+def convert_pdf_to_html(input_path, output_path, max_pages=None, skip_pages=2, workers=1,
+                        checkpoint=False, calibration=None, region=None, profile=None, split_pages=None):
+    """
+    解析PDF，将繁体转换为简体，输出为HTML格式，保留文字格式。
+    支持横排和竖排布局。
+
+    参数:
+        skip_pages: 跳过前N页，默认跳过前2页
+        workers: 并行处理的进程数，默认1（串行）
+        checkpoint: 是否启用断点续转与页面缓存，见 convert_pages
+        calibration: debug_pdf 生成的校准文件路径，使用其中的字号范围代替默认的13pt/16pt
+        region: (x0, top, x1, bottom)，只转换该区域内的文字，默认整页
+        profile: 分阶段计时，见 convert_pages；默认由环境变量 PDF_PROFILE 决定
+        split_pages: 每N页写一个分块，output_path 作为输出目录，见 convert_pages
+
+    返回是否全部页面都转换成功（找不到文件、出错或有页面失败时为 False）
+    """
+    if not os.path.exists(input_path):
+        print(f"错误：找不到文件 {input_path}")
+        return False
+
+    print(f"开始处理: {input_path}")
+    print(f"跳过前 {skip_pages} 页")
+
+    try:
+        with pdfplumber.open(input_path) as pdf:
+            total_pages = len(pdf.pages)
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+
+        size_bands = load_calibration(calibration) if calibration else SIZE_BANDS
+        if calibration:
+            print(f"使用校准字号范围: 讲义 {size_bands[0]}, 经文 {size_bands[1]}")
+
+        failed_pages = convert_pages(input_path, output_path, 'html', total_pages, skip_pages,
+                                     workers, checkpoint, size_bands, region, profile, split_pages)
+
+        report_failed_pages(failed_pages)
+        if failed_pages:
+            print(f"\n转换未完成：失败的页面在输出中留有占位\n输出文件：{output_path}")
+            return False
+        print(f"\n转换成功！\n输出文件：{output_path}")
+        return True
 
     except Exception as e:
         print(f"发生错误: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
-def convert_pdf_to_md(input_path, output_path, max_pages=None, skip_pages=2):
+def convert_pdf_to_md(input_path, output_path, max_pages=None, skip_pages=2, workers=1,
+                      checkpoint=False, calibration=None, region=None, profile=None):
     """
     解析PDF，将繁体转换为简体，输出为Markdown格式。
     根据字号区分经文(16pt)和讲义(13pt)。
 
     参数:
         skip_pages: 跳过前N页，默认跳过前2页
-    """
-    cc = OpenCC('t2s')
+        workers: 并行处理的进程数，默认1（串行）
+        checkpoint: 是否启用断点续转与页面缓存，见 convert_pages
+        calibration: debug_pdf 生成的校准文件路径，使用其中的字号范围代替默认的13pt/16pt
+        region: (x0, top, x1, bottom)，只转换该区域内的文字，默认整页
+        profile: 分阶段计时，见 convert_pages；默认由环境变量 PDF_PROFILE 决定
 
+    返回是否全部页面都转换成功（找不到文件、出错或有页面失败时为 False）
+    """
     if not os.path.exists(input_path):
         print(f"错误：找不到文件 {input_path}")
-        return
+        return False
 
     print(f"开始转换 Markdown: {input_path}")
     print(f"跳过前 {skip_pages} 页")
@@ -381,148 +811,31 @@ def convert_pdf_to_md(input_path, output_path, max_pages=None, skip_pages=2):
     try:
         with pdfplumber.open(input_path) as pdf:
             total_pages = len(pdf.pages)
-            if max_pages:
-                total_pages = min(total_pages, max_pages)
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
 
-            md_content = []
-            md_content.append("# 楞严经讲义 - 简体版\n\n")
+        size_bands = load_calibration(calibration) if calibration else SIZE_BANDS
+        if calibration:
+            print(f"使用校准字号范围: 讲义 {size_bands[0]}, 经文 {size_bands[1]}")
 
-            for i in range(skip_pages, total_pages):
-                page = pdf.pages[i]
-                print(f"处理进度: {i+1}/{total_pages} 页")
-
-                chars = page.chars
-                if not chars:
-                    continue
+        failed_pages = convert_pages(input_path, output_path, 'md', total_pages, skip_pages,
+                                     workers, checkpoint, size_bands, region, profile)
 
-                # 过滤：只保留16pt和13pt的字符（允许±0.5pt的误差）
-                filtered_chars = [c for c in chars if 12.5 <= c['size'] <= 13.5 or 15.5 <= c['size'] <= 16.5]
-
-                if not filtered_chars:
-                    continue
-
-                # 检测布局
-                layout = detect_layout(filtered_chars)
-
-                md_content.append(f"<!-- 第 {i+1} 页 -->\n\n")
-
-                if layout == 'vertical':
-                    # 竖排布局：按列组织
-                    sorted_chars = sorted(filtered_chars, key=lambda c: c['x0'])
-                    columns = []
-                    if sorted_chars:
-                        current_column = [sorted_chars[0]]
-                        for j in range(1, len(sorted_chars)):
-                            char = sorted_chars[j]
-                            prev_char = sorted_chars[j-1]
-                            tolerance = prev_char['size'] * 0.5
-                            if char['x0'] - prev_char['x0'] < tolerance:
-                                current_column.append(char)
-                            else:
-                                columns.append(current_column)
-                                current_column = [char]
-                        columns.append(current_column)
-
-                    for column in reversed(columns):
-                        column_chars = sorted(column, key=lambda c: c['top'])
-
-                        # 按字号分组处理列内文本
-                        if not column_chars:
-                            continue
-
-                        current_size = round(column_chars[0]['size'], 1)
-                        current_text = ""
-
-                        for char in column_chars:
-                            size = round(char['size'], 1)
-                            text = char['text']
-
-                            if size != current_size:
-                                # 输出当前组
-                                simplified = cc.convert(current_text).strip()
-                                if simplified:
-                                    if current_size >= 15.5: # 经文 (16pt)
-                                        md_content.append(f"**{simplified}**")
-                                    elif current_size >= 12.5: # 讲义 (13pt)
-                                        md_content.append(simplified)
-                                    else:
-                                        md_content.append(simplified)
-
-                                current_size = size
-                                current_text = text
-                            else:
-                                current_text += text
-
-                        # 输出最后一组
-                        simplified = cc.convert(current_text).strip()
-                        if simplified:
-                            if current_size >= 15.5:
-                                md_content.append(f"**{simplified}**\n\n")
-                            else:
-                                md_content.append(f"{simplified}\n\n")
-                else:
-                    # 横排布局
-                    sorted_chars = sorted(filtered_chars, key=lambda c: c['top'])
-                    lines = []
-                    if sorted_chars:
-                        current_line = [sorted_chars[0]]
-                        for j in range(1, len(sorted_chars)):
-                            char = sorted_chars[j]
-                            prev_char = sorted_chars[j-1]
-                            tolerance = prev_char['size'] * 0.5
-                            if char['top'] - prev_char['top'] < tolerance:
-                                current_line.append(char)
-                            else:
-                                lines.append(current_line)
-                                current_line = [char]
-                        lines.append(current_line)
-
-                    for line in lines:
-                        line_chars = sorted(line, key=lambda c: c['x0'])
-                        if not line_chars:
-                            continue
-
-                        current_size = round(line_chars[0]['size'], 1)
-                        current_text = ""
-
-                        for char in line_chars:
-                            size = round(char['size'], 1)
-                            text = char['text']
-
-                            if size != current_size:
-                                simplified = cc.convert(current_text).strip()
-                                if simplified:
-                                    if current_size >= 15.5:
-                                        md_content.append(f"**{simplified}**")
-                                    else:
-                                        md_content.append(simplified)
-                                current_size = size
-                                current_text = text
-                            else:
-                                current_text += text
-
-                        simplified = cc.convert(current_text).strip()
-                        if simplified:
-                            if current_size >= 15.5:
-                                md_content.append(f"**{simplified}**\n\n")
-                            else:
-                                md_content.append(f"{simplified}\n\n")
-
-                md_content.append(f"\n---\n*第 {i+2} 页*\n\n")
-
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.writelines(md_content)
-
-            print(f"\nMarkdown 转换成功！\n输出文件：{output_path}")
+        report_failed_pages(failed_pages)
+        if failed_pages:
+            print(f"\n转换未完成：失败的页面在输出中留有占位\n输出文件：{output_path}")
+            return False
+        print(f"\nMarkdown 转换成功！\n输出文件：{output_path}")
+        return True
 
     except Exception as e:
         print(f"发生错误: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
 if __name__ == "__main__":
-    src = r"d:\EBook\fo\楞严经OCR\大佛顶首楞严经讲义[圆瑛法师].pdf"
-
-    # 测试 Markdown 转换
-    dst_md = os.path.join(os.getcwd(), "楞严经讲记_测试.md")
-    convert_pdf_to_md(src, dst_md)
+    # 参数见 python lengyan.py convert --help
+    import sys
+    from lengyan import main
+    main(['convert'] + sys.argv[1:])
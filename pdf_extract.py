@@ -0,0 +1,128 @@
+"""
+PDF 字符提取：在 pdfminer 排版页面的同时按字号和区域过滤字符
+
+pdfplumber 的 page.chars 会先为页面上的每个字形生成一个十余个键的字典，
+页眉、页脚、注脚等不需要的字形也不例外。这里用自定义的 pdfminer 设备替代
+pdfplumber 的页面聚合器：每个字形在 render_char 中一经排版就判断字号和位置，
+不需要的直接丢弃，保留的只记录 text、x0、x1、top、bottom、size、fontname，
+最终以数组形式交给 pdf_layout。
+"""
+
+import time
+
+import numpy as np
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.layout import LTChar
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfplumber.page import fix_fontname_bytes
+
+class GlyphCollector(PDFLayoutAnalyzer):
+    """
+    只收集指定字号、区域内字符的 pdfminer 设备
+
+    坐标换算与 pdfplumber 相同：top = 页面高度 - y1，bottom = 页面高度 - y0，
+    字符顺序与 page.chars 相同（即内容流中的绘制顺序）
+    """
+
+    def __init__(self, rsrcmgr, height, size_bands, region=None):
+        super().__init__(rsrcmgr)
+        self.height = height
+        self.size_bands = [tuple(band) for band in size_bands]
+        self.region = region
+        self.total = 0
+        self.coords = []
+        self.texts = []
+        self.fontnames = []
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = self.handle_undefined_char(font, cid)
+        # 字符的外框、字号和步进由 pdfminer 计算，与 page.chars 完全一致
+        item = LTChar(matrix, font, fontsize, scaling, rise, text,
+                      font.char_width(cid), font.char_disp(cid), ncs, graphicstate)
+        self.total += 1
+        self.collect(item, text)
+        return item.adv
+
+    def collect(self, item, text):
+        """按字号、区域过滤，保留的字符记入字符表"""
+        size = item.size
+        if not any(low <= size <= high for low, high in self.size_bands):
+            return
+
+        top = self.height - item.y1
+        bottom = self.height - item.y0
+        if self.region:
+            # 字符中心落在区域 (x0, top, x1, bottom) 内才保留
+            x0, region_top, x1, region_bottom = self.region
+            if not (x0 <= (item.x0 + item.x1) / 2 <= x1
+                    and region_top <= (top + bottom) / 2 <= region_bottom):
+                return
+
+        fontname = item.fontname
+        if isinstance(fontname, bytes):
+            fontname = fix_fontname_bytes(fontname)
+        self.coords.append((item.x0, item.x1, top, bottom, size))
+        self.texts.append(text)
+        self.fontnames.append(fontname)
+
+    # 只需要文字，图形和图片不生成版面对象
+    def paint_path(self, gstate, stroke, fill, evenodd, path):
+        pass
+
+    def render_image(self, name, stream):
+        pass
+
+class TimedGlyphCollector(GlyphCollector):
+    """计时版本：另外累计过滤所用的时间（filter_time），只在分阶段计时时使用"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filter_time = 0.0
+
+    def collect(self, item, text):
+        start = time.perf_counter()
+        super().collect(item, text)
+        self.filter_time += time.perf_counter() - start
+
+def extract_glyphs(page, size_bands, region=None, timings=None):
+    """
+    提取一页中字号在 size_bands 范围内（且位于 region 内）的字符
+
+    参数:
+        page: pdfplumber 页面
+        size_bands: [(下限, 上限), ...]
+        region: (x0, top, x1, bottom)，为 None 时不按区域过滤
+        timings: 不为 None 时累加耗时：extract（解析与排版）、filter（过滤与生成字符表）
+
+    返回 (字符表, 页面原始字符数)；字符表的格式见 pdf_layout.layout_glyphs：
+        {'x0', 'x1', 'top', 'bottom', 'size': 数组, 'text', 'fontname': 列表}
+    """
+    collector = GlyphCollector if timings is None else TimedGlyphCollector
+    device = collector(page.pdf.rsrcmgr, page.height, size_bands, region)
+    interpreter = PDFPageInterpreter(page.pdf.rsrcmgr, device)
+    if timings is not None:
+        start = time.perf_counter()
+    interpreter.process_page(page.page_obj)
+    if timings is not None:
+        now = time.perf_counter()
+        timings['extract'] = timings.get('extract', 0.0) + now - start - device.filter_time
+        timings['filter'] = timings.get('filter', 0.0) + device.filter_time
+        start = now
+
+    coords = np.array(device.coords, dtype=np.float64).reshape(-1, 5)
+    glyphs = {
+        'x0': coords[:, 0],
+        'x1': coords[:, 1],
+        'top': coords[:, 2],
+        'bottom': coords[:, 3],
+        'size': coords[:, 4],
+        'text': device.texts,
+        'fontname': device.fontnames,
+    }
+    if timings is not None:
+        timings['filter'] += time.perf_counter() - start
+    return glyphs, device.total
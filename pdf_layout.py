@@ -0,0 +1,280 @@
+"""
+PDF 版面分析：将页面字符聚合为列/行，供 HTML 和 Markdown 渲染共用
+
+字符坐标与字号转换为 NumPy 数组后，用排序 + diff/cumsum 一次性完成
+列（竖排）/行（横排）聚类和文本段切分，避免逐字符的 Python 循环。
+
+书写方向由逐字比较上下、左右相邻字的间距决定；另一方向的字足够多时（如横排页眉与竖排正文混排）
+拆分为两个区域，各自按自己的方向聚类。按不同坐标数判断横竖排时最多只统计 LAYOUT_SAMPLE 个字符，
+其结果仅在两个方向的字一样多时采用。
+布局只由本页字符决定，不参考前后页，因此多进程分段转换、断点续转与串行转换的结果一致。
+
+输出的中间表示：
+    页面 {'layout', 'mixed', 'unique_x', 'unique_y', 'blocks'}
+    └─ 块（列或行，已按阅读顺序排列） {'text', 'runs'}
+       └─ 文本段（字体、字号相同且中间无大间距的连续字符）
+          {'text', 'size', 'fontname', 'gap_before'}
+"""
+
+import time
+from operator import itemgetter
+
+import numpy as np
+
+# 聚合列/行时的坐标容差（相对于字号的比例）
+LAYOUT_TOLERANCE = 0.5
+
+# 块内相邻字符的间距超过字号的该倍数时视为断开（HTML 中补空格）
+GAP_RATIO = 1.5
+
+# 不同X坐标数小于不同Y坐标数的该比例时判定为竖排
+VERTICAL_RATIO = 0.5
+
+# 字符少于该数时按坐标统计无法判断布局，按横排处理
+MIN_LAYOUT_CHARS = 10
+
+# 判断布局时最多统计的字符数（超过时等间隔抽样）
+LAYOUT_SAMPLE = 1024
+
+# 与主方向不同的字符至少有这么多（且占全页该比例）时，拆分为单独的区域
+MIXED_MIN_CHARS = 8
+MIXED_MIN_SHARE = 0.01
+
+_get_coords = itemgetter('x0', 'x1', 'top', 'bottom', 'size')
+
+def char_arrays(chars):
+    """将 pdfplumber 字符字典列表转换为坐标、字号数组"""
+    coords = np.array(list(map(_get_coords, chars)), dtype=np.float64).reshape(-1, 5)
+    return {
+        'x0': coords[:, 0],
+        'x1': coords[:, 1],
+        'top': coords[:, 2],
+        'bottom': coords[:, 3],
+        'size': coords[:, 4],
+    }
+
+def glyph_table(chars):
+    """将 pdfplumber 字符字典列表转换为字符表（格式见 layout_glyphs）"""
+    return dict(char_arrays(chars),
+                text=[c['text'] for c in chars],
+                fontname=[c.get('fontname', '') for c in chars])
+
+def count_unique(values, decimals=1):
+    """四舍五入后不同取值的个数"""
+    return int(np.unique(np.round(values, decimals)).size)
+
+def detect_layout(x0, top, sample_size=LAYOUT_SAMPLE):
+    """
+    根据坐标数组检测横排/竖排，字符多于 sample_size 时按内容流顺序等间隔抽样统计
+    （随机抽样本身的开销就与对整页去重相当）
+    返回 ('horizontal' 或 'vertical', 不同X坐标数, 不同Y坐标数)
+    """
+    n = len(x0)
+    if sample_size and n > sample_size:
+        step = -(-n // sample_size)
+        x0, top = x0[::step], top[::step]
+    unique_x = count_unique(x0)
+    unique_y = count_unique(top)
+    if n < MIN_LAYOUT_CHARS:
+        return 'horizontal', unique_x, unique_y
+
+    # 如果X坐标数量远小于Y坐标数量，说明是竖排（列少，每列字符多）
+    # 如果Y坐标数量远小于X坐标数量，说明是横排（行少，每行字符多）
+    if unique_x < unique_y * VERTICAL_RATIO:
+        return 'vertical', unique_x, unique_y
+    return 'horizontal', unique_x, unique_y
+
+def _neighbour_gap(arrays, layout, tolerance):
+    """按 layout 聚合为列/行后，每个字与同列/行前后相邻字间距的较小值（没有相邻字为 inf）"""
+    order, group = reading_order(arrays, layout, tolerance)
+    if layout == 'vertical':
+        start, end = arrays['top'][order], arrays['bottom'][order]
+    else:
+        start, end = arrays['x0'][order], arrays['x1'][order]
+    gaps = np.where(group[1:] == group[:-1], np.abs(start[1:] - end[:-1]), np.inf)
+    nearest = np.empty(len(order))
+    nearest[order] = np.minimum(np.concatenate(([np.inf], gaps)), np.concatenate((gaps, [np.inf])))
+    return nearest
+
+def char_orientation(arrays, tolerance=LAYOUT_TOLERANCE):
+    """
+    逐字判断书写方向：竖排的字与上下相邻字紧挨、与左右相邻列之间留有行距，横排相反，
+    比较两个方向上最近相邻字的间距即可
+
+    返回数组：1 竖排，-1 横排，0 无法判断（孤立的字或两个方向间距相同）
+    """
+    vertical_gap = _neighbour_gap(arrays, 'vertical', tolerance)
+    horizontal_gap = _neighbour_gap(arrays, 'horizontal', tolerance)
+    return (vertical_gap < horizontal_gap).astype(np.int8) - (horizontal_gap < vertical_gap)
+
+def split_regions(arrays, fallback, tolerance=LAYOUT_TOLERANCE):
+    """
+    逐字判断方向，返回 (主方向, 另一方向字符的布尔掩码或 None)
+
+    多数字符的方向为主方向（两者一样多时用 fallback）；另一方向的字符达到
+    MIXED_MIN_CHARS 且占比不低于 MIXED_MIN_SHARE 时才拆分，否则并入主方向
+    """
+    orientation = char_orientation(arrays, tolerance)
+    vertical = int(np.count_nonzero(orientation > 0))
+    horizontal = int(np.count_nonzero(orientation < 0))
+    if vertical == horizontal:
+        layout = fallback
+    else:
+        layout = 'vertical' if vertical > horizontal else 'horizontal'
+
+    minority = orientation == (-1 if layout == 'vertical' else 1)
+    count = int(np.count_nonzero(minority))
+    if count < MIXED_MIN_CHARS or count < len(orientation) * MIXED_MIN_SHARE:
+        return layout, None
+    return layout, minority
+
+def _subset(arrays, index):
+    return {key: arrays[key][index] for key in ('x0', 'top', 'size')}
+
+def mixed_reading_order(arrays, layout, minority, tolerance=LAYOUT_TOLERANCE):
+    """
+    两个区域的阅读顺序：主区域按 layout，另一区域按另一方向分别聚类；
+    另一区域的每个块中心在主区域中心之上的排在主区域之前（如页眉），其余排在之后（如页脚、边注）
+
+    返回 (字符下标数组, 块编号数组, 各字符所在区域是否竖排的布尔数组)
+    """
+    other = 'horizontal' if layout == 'vertical' else 'vertical'
+    main_index = np.flatnonzero(~minority)
+    minor_index = np.flatnonzero(minority)
+
+    main_order, main_group = reading_order(_subset(arrays, main_index), layout, tolerance)
+    main_order = main_index[main_order]
+    center = (arrays['top'][main_index].min() + arrays['bottom'][main_index].max()) / 2 \
+        if len(main_index) else np.inf
+
+    minor_order, minor_group = reading_order(_subset(arrays, minor_index), other, tolerance)
+    minor_order = minor_index[minor_order]
+    bounds = np.flatnonzero(np.diff(minor_group)) + 1
+    before, after = [], []
+    for block in np.split(minor_order, bounds):
+        block_center = (arrays['top'][block].min() + arrays['bottom'][block].max()) / 2
+        (before if block_center < center else after).append(block)
+
+    parts = before + [main_order] + after
+    main_blocks = int(main_group[-1]) + 1 if len(main_group) else 0
+    groups = [np.full(len(block), k) for k, block in enumerate(before)]
+    groups.append(main_group + len(before))
+    groups += [np.full(len(block), len(before) + main_blocks + k) for k, block in enumerate(after)]
+    vertical = [np.full(len(block), other == 'vertical') for block in before]
+    vertical.append(np.full(len(main_order), layout == 'vertical'))
+    vertical += [np.full(len(block), other == 'vertical') for block in after]
+    return np.concatenate(parts), np.concatenate(groups), np.concatenate(vertical)
+
+def reading_order(arrays, layout, tolerance=LAYOUT_TOLERANCE):
+    """
+    计算字符的阅读顺序
+
+    竖排先按x坐标聚合为列，列从右向左、列内从上到下；
+    横排先按y坐标聚合为行，行从上到下、行内从左到右。
+    相邻字符（按主轴排序后）坐标差小于前一字符字号×容差时视为同一列/行。
+
+    返回 (阅读顺序下的字符下标数组, 对应的块编号数组)
+    """
+    if layout == 'vertical':
+        major, minor = arrays['x0'], arrays['top']
+    else:
+        major, minor = arrays['top'], arrays['x0']
+
+    by_major = np.argsort(major, kind='stable')
+    sorted_major = major[by_major]
+    breaks = np.diff(sorted_major) >= arrays['size'][by_major][:-1] * tolerance
+    group = np.concatenate(([0], np.cumsum(breaks)))
+
+    if layout == 'vertical':
+        # 台湾竖排文本：从右向左排列
+        group = group[-1] - group
+
+    # lexsort 是稳定排序：先按块编号，块内按次轴坐标
+    order = np.lexsort((minor[by_major], group))
+    return by_major[order], group[order]
+
+def page_layout(arrays, tolerance=LAYOUT_TOLERANCE):
+    """
+    判断一页（已过滤的）字符的布局：坐标数组 {'x0', 'x1', 'top', 'bottom', 'size'}
+
+    逐字判断方向，混排时拆分区域；按坐标统计的结果只在两个方向的字一样多时采用。
+    返回 (主方向, 另一方向字符的布尔掩码或 None, 不同X坐标数, 不同Y坐标数)
+    """
+    layout, unique_x, unique_y = detect_layout(arrays['x0'], arrays['top'])
+    layout, minority = split_regions(arrays, layout, tolerance)
+    return layout, minority, unique_x, unique_y
+
+def layout_page(chars, tolerance=LAYOUT_TOLERANCE):
+    """
+    对一页（已过滤的）字符做版面分析，返回页面中间表示
+
+    参数:
+        chars: pdfplumber 字符字典列表
+        tolerance: 聚合列/行的坐标容差
+    """
+    return layout_glyphs(glyph_table(chars), tolerance)
+
+def layout_glyphs(arrays, tolerance=LAYOUT_TOLERANCE, timings=None):
+    """
+    与 layout_page 相同，但输入为字符表：
+        {'x0', 'x1', 'top', 'bottom', 'size': 坐标、字号数组, 'text', 'fontname': 列表}
+    timings 不为 None 时累加耗时：detect_layout（判断横竖排）、cluster（聚类与切分）
+    """
+    n = len(arrays['text'])
+    if not n:
+        return {'layout': None, 'mixed': False, 'unique_x': 0, 'unique_y': 0, 'blocks': []}
+
+    if timings is not None:
+        tick = time.perf_counter()
+    layout, minority, unique_x, unique_y = page_layout(arrays, tolerance)
+    if timings is not None:
+        now = time.perf_counter()
+        timings['detect_layout'] = timings.get('detect_layout', 0.0) + now - tick
+        tick = now
+
+    if minority is None:
+        order, group = reading_order(arrays, layout, tolerance)
+        vertical = layout == 'vertical'
+    else:
+        order, group, vertical = mixed_reading_order(arrays, layout, minority, tolerance)
+
+    # 竖排比较上一字底部与下一字顶部，横排比较上一字右侧与下一字左侧
+    start = np.where(vertical, arrays['top'][order], arrays['x0'][order])
+    end = np.where(vertical, arrays['bottom'][order], arrays['x1'][order])
+    size = arrays['size'][order]
+
+    order_list = order.tolist()
+    texts = [arrays['text'][k] for k in order_list]
+    fontnames = np.array([arrays['fontname'][k] for k in order_list], dtype=object)
+
+    # 块边界、大间距、字体或字号变化处切分文本段
+    new_block = group[1:] != group[:-1]
+    gap = ~new_block & ((start[1:] - end[:-1]) > size[1:] * GAP_RATIO)
+    style_change = (fontnames[1:] != fontnames[:-1]) | (size[1:] != size[:-1])
+    run_starts = np.concatenate(([0], np.flatnonzero(new_block | gap | style_change) + 1))
+    run_ends = np.concatenate((run_starts[1:], [len(order)]))
+    block_starts = set(np.concatenate(([0], np.flatnonzero(new_block) + 1)).tolist())
+    gap_before = np.concatenate(([False], gap)).tolist()
+    sizes = size.tolist()
+
+    blocks = []
+    for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+        if run_start in block_starts:
+            blocks.append({'text': "", 'runs': []})
+        block = blocks[-1]
+        run_text = "".join(texts[run_start:run_end])
+        block['text'] += run_text
+        block['runs'].append({
+            'text': run_text,
+            'size': sizes[run_start],
+            'fontname': fontnames[run_start],
+            'gap_before': gap_before[run_start],
+        })
+
+    # 只含空白的列/行不输出
+    blocks = [block for block in blocks if block['text'].strip()]
+
+    if timings is not None:
+        timings['cluster'] = timings.get('cluster', 0.0) + time.perf_counter() - tick
+    return {'layout': layout, 'mixed': minority is not None,
+            'unique_x': unique_x, 'unique_y': unique_y, 'blocks': blocks}
@@ -0,0 +1,149 @@
+"""
+PDF 转换的分阶段计时与进度报告
+
+计时：convert_pdf_to_md / convert_pdf_to_html 的 profile 参数，或环境变量 PDF_PROFILE：
+    1 / summary   每页各阶段耗时累加，转换结束后写出 <输出文件>.profile.json 汇总
+    trace         另外逐页写出 <输出文件>.trace.jsonl（每页的各阶段耗时、布局、坐标数、字符数）
+不计时时各阶段函数收到的 timings 为 None，不做任何额外工作。
+
+阶段（STAGES）：
+    open           取页面对象、计算内容哈希
+    extract        pdfminer 解析内容流、排版字形
+    filter         按字号/区域过滤字形并生成字符表
+    detect_layout  判断横排/竖排
+    cluster        列/行聚类、排序、切分文本段
+    convert        繁体→简体
+    render         生成 HTML/Markdown 片段
+    write          写出片段和断点
+"""
+
+import json
+import os
+import sys
+import time
+
+PROFILE_ENV = 'PDF_PROFILE'
+
+STAGES = ('open', 'extract', 'filter', 'detect_layout', 'cluster', 'convert', 'render', 'write')
+
+def profile_mode(profile=None):
+    """由 profile 参数（优先）或环境变量得到计时模式：None（不计时）、'summary' 或 'trace'"""
+    value = profile if profile is not None else os.environ.get(PROFILE_ENV, '')
+    if value in (False, '', '0'):
+        return None
+    return 'trace' if value == 'trace' else 'summary'
+
+def lap(timings, stage, start):
+    """把 start 至今的耗时累加到 timings[stage]，返回当前时刻"""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+def format_duration(seconds):
+    seconds = int(seconds + 0.5)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+class ConversionProfile:
+    """
+    汇总一次转换中每页的阶段耗时
+
+    add_page 接收 iter_page_range 产出的每页计时 {'stages': {阶段: 秒}, 'layout', ...}，
+    save 写出汇总 JSON（trace 模式下逐页记录在转换过程中即写入）
+    """
+
+    def __init__(self, mode, output_path, fmt):
+        self.mode = mode
+        self.fmt = fmt
+        self.summary_path = output_path + '.profile.json'
+        self.trace_path = output_path + '.trace.jsonl' if mode == 'trace' else None
+        self.trace = open(self.trace_path, 'w', encoding='utf-8') if self.trace_path else None
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.maxima = dict.fromkeys(STAGES, 0.0)
+        self.page_totals = []
+        self.pages = 0
+        self.reused = 0
+        self.start = time.perf_counter()
+
+    def add_page(self, i, page_timings):
+        if page_timings is None:
+            # 断点中复用的页面没有计时
+            self.reused += 1
+            return
+        stages = page_timings['stages']
+        for stage, seconds in stages.items():
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.maxima[stage] = max(self.maxima.get(stage, 0.0), seconds)
+        self.pages += 1
+        self.page_totals.append((sum(stages.values()), i))
+        if self.trace:
+            entry = {'page': i + 1, **{k: v for k, v in page_timings.items() if k != 'stages'},
+                     'stages': {stage: round(seconds, 6) for stage, seconds in stages.items()}}
+            self.trace.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        wall = time.perf_counter() - self.start
+        measured = sum(self.totals.values())
+        return {
+            'format': self.fmt,
+            'pages': self.pages,
+            'reused_pages': self.reused,
+            'wall_seconds': round(wall, 4),
+            'pages_per_second': round(self.pages / wall, 2) if wall else 0.0,
+            'stages': {stage: {'total': round(total, 4),
+                               'per_page_ms': round(total / self.pages * 1000, 3) if self.pages else 0.0,
+                               'max_ms': round(self.maxima[stage] * 1000, 3),
+                               'share': round(total / measured, 4) if measured else 0.0}
+                       for stage, total in self.totals.items()},
+            'slowest_pages': [{'page': i + 1, 'seconds': round(seconds, 4)}
+                              for seconds, i in sorted(self.page_totals, reverse=True)[:10]],
+        }
+
+    def save(self):
+        """写出汇总并打印各阶段占比，返回汇总字典"""
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+        summary = self.summary()
+        with open(self.summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+
+        print(f"\n分阶段耗时（{summary['pages']} 页，{summary['pages_per_second']} 页/秒）：")
+        for stage, item in summary['stages'].items():
+            print(f"  {stage:14s} {item['total']:8.3f}s  {item['per_page_ms']:8.2f} ms/页  {item['share']:6.1%}")
+        print(f"计时汇总: {self.summary_path}")
+        if self.trace_path:
+            print(f"逐页记录: {self.trace_path}")
+        return summary
+
+class ProgressReporter:
+    """
+    限频的进度输出：最多每 interval 秒输出一行，含速度和预计剩余时间；最后一页总会输出
+
+    first 为第一页的序号（跳过的页不计入速度）
+    """
+
+    def __init__(self, total, first=0, interval=2.0, label='处理进度', stream=None):
+        self.total = total
+        self.first = first
+        self.interval = interval
+        self.label = label
+        self.stream = stream or sys.stdout
+        self.start = time.monotonic()
+        self.last = None
+
+    def update(self, done):
+        now = time.monotonic()
+        if done < self.total and self.last is not None and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = now - self.start
+        processed = done - self.first
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        message = f"{self.label}: {done}/{self.total} 页"
+        if rate > 0:
+            message += f"，{rate:.1f} 页/秒"
+            if done < self.total:
+                message += f"，预计剩余 {format_duration((self.total - done) / rate)}"
+        print(message, file=self.stream, flush=True)
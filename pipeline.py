@@ -0,0 +1,326 @@
+"""
+从 PDF 到网站的增量构建
+
+各步骤在 STEPS 中声明命令、输入和输出（路径或通配符，** 表示目录下的全部文件）。
+每次执行后把输入、输出文件的内容哈希记入 pipeline_manifest.json：
+
+    run     输入哈希、命令都与上次相同且输出未被改动的步骤跳过；
+            互不依赖的步骤并行执行（依赖由 一个步骤的输入 匹配 另一个步骤的输出 推出）；
+            输入文件不存在的步骤跳过，其输出视为源文件（例如没有原书 PDF 时从 *_all.md 开始）
+    status  列出需要执行的步骤及原因，不执行
+    record  不执行任何命令，把当前文件记为各步骤的结果（第一次使用或手动处理后执行）
+
+要执行的步骤如果发现输出和上次记录的不同（手动修改过，或从未记录），为免覆盖手动修改，
+不执行并给出警告；确认可以覆盖时加 --force。
+手动步骤（command 为 None，如调用大模型的翻译）只报告输入是否变化，不执行。
+
+run/status 最后列出输出目录中不属于任何步骤的文件，及与某个步骤的文件内容完全相同的副本。
+
+文件哈希按 (大小, 修改时间) 缓存在清单中，未变化的文件不重新读取。
+
+用法:
+    python pipeline.py status
+    python pipeline.py run [步骤名...] [--jobs N] [--force]
+    python pipeline.py record [步骤名...]
+"""
+
+import fnmatch
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import corpus_index
+
+MANIFEST_FILE = 'pipeline_manifest.json'
+MANIFEST_VERSION = 1
+
+# 原书 PDF（受版权保护，不在仓库中）
+YUANYING_PDF = '圆瑛法师楞严经讲义.pdf'
+CHENGGUAN_PDF = '成观法师楞严经义贯.pdf'
+
+YUANYING_VOLUMES = corpus_index.CORPUS_FILES['yuanying']
+CHENGGUAN_VOLUMES = corpus_index.CORPUS_FILES['chengguan']
+GEMINI_VOLUMES = corpus_index.CORPUS_FILES['gemini']
+
+LENGYAN = [sys.executable, 'lengyan.py']
+
+# 步骤按大致的先后顺序排列；实际顺序由输入输出推出
+STEPS = [
+    {'name': 'convert-yuanying', 'command': LENGYAN + ['convert', YUANYING_PDF, 'yuanying_all.md'],
+     'inputs': [YUANYING_PDF], 'outputs': ['yuanying_all.md']},
+    {'name': 'convert-chengguan', 'command': LENGYAN + ['convert', CHENGGUAN_PDF, 'chengguan_all.md'],
+     'inputs': [CHENGGUAN_PDF], 'outputs': ['chengguan_all.md']},
+    {'name': 'split-yuanying', 'command': LENGYAN + ['split', 'yuanying'],
+     'inputs': ['yuanying_all.md'], 'outputs': [YUANYING_VOLUMES]},
+    {'name': 'split-chengguan', 'command': LENGYAN + ['split', 'chengguan'],
+     'inputs': ['chengguan_all.md'], 'outputs': [CHENGGUAN_VOLUMES]},
+    {'name': 'extract-chengguan', 'command': LENGYAN + ['extract', 'chengguan_all.md'],
+     'inputs': ['chengguan_all.md'], 'outputs': [os.path.join('chengguan_doc', 'sutra_text.md')]},
+    # 白话译文由 translate_runner / retranslate 调用大模型生成，需人工审阅
+    {'name': 'translate', 'command': None,
+     'inputs': [YUANYING_VOLUMES, CHENGGUAN_VOLUMES, 'prompt.txt'], 'outputs': [GEMINI_VOLUMES]},
+    {'name': 'corpus-index', 'command': LENGYAN + ['index', 'build'],
+     'inputs': [YUANYING_VOLUMES, CHENGGUAN_VOLUMES, GEMINI_VOLUMES], 'outputs': ['corpus_index/**']},
+    {'name': 'retrieval-index', 'command': LENGYAN + ['retrieve', 'build'],
+     'inputs': [YUANYING_VOLUMES, CHENGGUAN_VOLUMES], 'outputs': ['retrieval_index/**']},
+    {'name': 'corpus-pack', 'command': LENGYAN + ['pack', 'build'],
+     'inputs': [YUANYING_VOLUMES, CHENGGUAN_VOLUMES, GEMINI_VOLUMES], 'outputs': ['corpus_pack/**']},
+    {'name': 'site-search', 'command': LENGYAN + ['site'],
+     'inputs': [GEMINI_VOLUMES], 'outputs': ['gemini_doc/public/search/**', 'gemini_doc/index.md']},
+    {'name': 'site-build', 'command': ['npx', 'vitepress', 'build', 'gemini_doc'],
+     'inputs': ['gemini_doc/*.md', 'gemini_doc/.vitepress/config.mts', 'gemini_doc/.vitepress/theme/*',
+                'gemini_doc/public/**', 'package.json'],
+     'outputs': ['gemini_doc/.vitepress/dist/**']},
+]
+
+# 手工维护、不由任何步骤生成的文件（检查无主文件时不报告）
+SOURCES = ['README.md', 'prompt.txt', 'gpt_doc/*.md', '成观法师*.md']
+
+def expand(patterns):
+    """通配符展开为存在的文件（排序，路径分隔符统一为 /）"""
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path):
+                paths.add(path.replace(os.sep, '/'))
+    return sorted(paths)
+
+def matches(path, patterns):
+    return any(fnmatch.fnmatch(path, pattern.replace(os.sep, '/')) for pattern in patterns)
+
+def dependencies(steps):
+    """{步骤名: {它依赖的步骤名}}：步骤的某个输入通配符与另一步骤的某个输出通配符能匹配同一文件"""
+    def overlap(a, b):
+        a, b = a.replace(os.sep, '/'), b.replace(os.sep, '/')
+        return a == b or fnmatch.fnmatch(a, b) or fnmatch.fnmatch(b, a)
+
+    return {step['name']: {other['name'] for other in steps if other is not step
+                           and any(overlap(i, o) for i in step['inputs'] for o in other['outputs'])}
+            for step in steps}
+
+def load_manifest(path=MANIFEST_FILE):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    return {'version': MANIFEST_VERSION, 'hashes': {}, 'steps': {}}
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+class Hasher:
+    """文件内容哈希，按 (大小, 修改时间) 复用清单中已算过的结果"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, path):
+        stamp = corpus_index.file_stamp(path)
+        cached = self.cache.get(path)
+        if cached and cached[:2] == stamp:
+            return cached[2]
+        digest = corpus_index.file_hash(path)
+        self.cache[path] = stamp + [digest]
+        return digest
+
+    def files(self, patterns):
+        return {path: self(path) for path in expand(patterns)}
+
+def listing(paths, limit=3):
+    """列出前几个文件，其余只给出总数"""
+    return '、'.join(paths[:limit]) + (f" 等 {len(paths)} 个文件" if len(paths) > limit else '')
+
+def check_step(step, record, hasher):
+    """
+    判断步骤是否需要执行
+
+    返回 (状态, 说明)，状态为 'fresh'（跳过）、'stale'（需要执行）、
+    'missing-input'（输入不存在）、'modified'（需要执行但输出被手动改过）或 'manual'（手动步骤需要重做）
+    """
+    inputs = hasher.files(step['inputs'])
+    if not inputs:
+        return 'missing-input', f"输入不存在: {'、'.join(step['inputs'])}"
+    outputs = hasher.files(step['outputs'])
+    if record is None:
+        reason = '没有执行记录（已有的输出可先用 record 记下）'
+    elif record['command'] != step['command']:
+        reason = '命令改变'
+    elif record['inputs'] != inputs:
+        changed = sorted(dict(set(inputs.items()) ^ set(record['inputs'].items())))
+        reason = f"输入改变: {listing(changed)}"
+    elif record['outputs'] != outputs:
+        missing = [path for path in record['outputs'] if path not in outputs]
+        reason = f"输出缺失: {listing(missing)}" if missing else '输出与记录不同'
+    else:
+        return 'fresh', ''
+
+    if step['command'] is None:
+        return 'manual', reason
+    # 已有的输出不是上次执行的结果：执行会覆盖手动修改
+    recorded = record['outputs'] if record else {}
+    edited = [path for path, digest in outputs.items() if recorded.get(path, digest if record else None) != digest]
+    if edited:
+        return 'modified', f"{reason}；输出不是上次执行的结果，加 --force 覆盖: {listing(edited)}"
+    return 'stale', reason
+
+def record_step(step, manifest, hasher):
+    manifest['steps'][step['name']] = {
+        'command': step['command'],
+        'inputs': hasher.files(step['inputs']),
+        'outputs': hasher.files(step['outputs']),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def execute(step):
+    """执行步骤的命令，返回 (是否成功, 合并的输出, 耗时)"""
+    start = time.perf_counter()
+    if not shutil.which(step['command'][0]):
+        return False, f"找不到命令: {step['command'][0]}", 0.0
+    result = subprocess.run(step['command'], capture_output=True, text=True, encoding='utf-8', errors='replace')
+    return result.returncode == 0, (result.stdout + result.stderr).strip(), time.perf_counter() - start
+
+def select(names, steps=STEPS):
+    if not names:
+        return steps
+    unknown = [name for name in names if name not in {step['name'] for step in steps}]
+    if unknown:
+        sys.exit(f"未知步骤: {'、'.join(unknown)}（可选 {'、'.join(step['name'] for step in steps)}）")
+    return [step for step in steps if step['name'] in names]
+
+def run(names=None, jobs=None, force=False, dry_run=False, manifest_path=MANIFEST_FILE):
+    """
+    按依赖顺序执行需要执行的步骤，互不依赖的并行
+
+    dry_run 时只判断和报告（status），不写清单文件。返回 {步骤名: 状态}，执行过的步骤状态为 'done' 或 'failed'
+    """
+    manifest = load_manifest(manifest_path)
+    hasher = Hasher(manifest['hashes'])
+    steps = select(names)
+    depends = dependencies(steps)
+    pending = {step['name']: step for step in steps}
+    states = {}
+    running = {}
+
+    def ready(name):
+        return all(dep in states for dep in depends[name])
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        while pending or running:
+            for name in [name for name in pending if ready(name)]:
+                step = pending.pop(name)
+                failed = [dep for dep in depends[name] if states[dep] in ('failed', 'blocked')]
+                if failed:
+                    states[name] = 'blocked'
+                    print(f"[{name}] 跳过：依赖的步骤未完成（{'、'.join(failed)}）")
+                    continue
+                state, reason = check_step(step, manifest['steps'].get(name), hasher)
+                if state == 'modified' and force:
+                    state = 'stale'
+                if state == 'stale' and not dry_run:
+                    print(f"[{name}] 开始：{reason}")
+                    running[executor.submit(execute, step)] = step
+                    continue
+                states[name] = state
+                if state == 'fresh':
+                    print(f"[{name}] 无变化")
+                elif state == 'missing-input':
+                    print(f"[{name}] 跳过：{reason}")
+                elif state == 'manual':
+                    print(f"[{name}] 手动步骤需要重做：{reason}")
+                elif state == 'modified':
+                    print(f"[{name}] 警告：{reason}")
+                else:
+                    print(f"[{name}] 需要执行：{reason}")
+            if not running:
+                if pending and not any(ready(name) for name in pending):
+                    raise RuntimeError(f"步骤之间有循环依赖: {'、'.join(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                ok, output, elapsed = future.result()
+                if output:
+                    print("\n".join(f"[{step['name']}]   {line}" for line in output.splitlines()))
+                if ok:
+                    record_step(step, manifest, hasher)
+                    states[step['name']] = 'done'
+                    print(f"[{step['name']}] 完成（{elapsed:.1f}s）")
+                else:
+                    states[step['name']] = 'failed'
+                    print(f"[{step['name']}] 失败")
+            save_manifest(manifest, manifest_path)
+
+    # status 只读：不写 pipeline_manifest.json（哈希缓存留到下次 run 再保存）
+    if not dry_run:
+        save_manifest(manifest, manifest_path)
+    report_unowned()
+    return states
+
+def record(names=None, manifest_path=MANIFEST_FILE):
+    """把当前文件记为所选步骤的结果（输入不存在的步骤除外），不执行命令"""
+    manifest = load_manifest(manifest_path)
+    hasher = Hasher(manifest['hashes'])
+    for step in select(names):
+        if not expand(step['inputs']):
+            print(f"[{step['name']}] 输入不存在，不记录")
+            continue
+        record_step(step, manifest, hasher)
+        print(f"[{step['name']}] 已记录 {len(manifest['steps'][step['name']]['outputs'])} 个输出")
+    save_manifest(manifest, manifest_path)
+
+def unowned_files(steps=STEPS, sources=SOURCES):
+    """
+    输出目录中不属于任何步骤的文件
+
+    检查每个输出通配符所在的目录（不含子目录，** 的目录整体属于该步骤）；
+    当前目录只检查与输出扩展名相同的文件，以免报告脚本等。返回 [(文件, 内容相同的已知文件或 None), ...]
+    """
+    owned = sources + [p for step in steps for p in step['inputs'] + step['outputs']]
+    directories = {}
+    for step in steps:
+        for pattern in step['outputs']:
+            if '**' not in pattern:
+                directories.setdefault(os.path.dirname(pattern) or '.', set()).add(os.path.splitext(pattern)[1])
+
+    unowned = []
+    for directory, extensions in sorted(directories.items()):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name) if directory != '.' else name
+            if not os.path.isfile(path) or (directory == '.' and os.path.splitext(name)[1] not in extensions):
+                continue
+            if not matches(path.replace(os.sep, '/'), owned):
+                unowned.append(path.replace(os.sep, '/'))
+
+    # 与已知文件内容相同的副本：先比较大小，大小相同再比较哈希
+    known = {}
+    for path in expand(owned):
+        known.setdefault(os.path.getsize(path), []).append(path)
+    result = []
+    for path in unowned:
+        copy_of = next((other for other in known.get(os.path.getsize(path), [])
+                        if corpus_index.file_hash(other) == corpus_index.file_hash(path)), None)
+        result.append((path, copy_of))
+    return result
+
+def report_unowned():
+    files = unowned_files()
+    if files:
+        print("\n警告：以下文件不属于任何步骤（不会更新，可能已过时）：")
+        for path, copy_of in files:
+            print(f"  {path}" + (f"（与 {copy_of} 内容相同）" if copy_of else ""))
+
+if __name__ == '__main__':
+    import lengyan
+    lengyan.main(['pipeline'] + sys.argv[1:])
@@ -0,0 +1,376 @@
+"""
+按自然段差异局部重译白话译文
+
+白话译文（gemini_doc）每卷由若干 经文/译文 对组成：每对从一段粗体经文开始，到下一段经文之前为止。
+record 记录每一对依赖的源文本自然段：对齐到的讲记经文所在的一段讲记（见 pack_prompts.main_segments）
+和义贯经文及其注释/义贯/诠论（见 pack_prompts.reference_units），保存各自然段的内容哈希。
+
+讲记或义贯改动后：
+    status  重新计算依赖，列出改动的自然段和受影响的 经文/译文 对；
+    update  只重译受影响的对（相邻的合为一次请求），拼回原译文文件，
+            其余内容逐字节不变，然后重新记录依赖。
+
+依赖记录保存在 translation_deps/<译文文件名>.json。请求、限速和响应缓存沿用 translate_runner。
+某次请求失败时只跳过对应的对，其余照常拼回；有失败的卷不重新记录依赖，重跑 update 即可补上
+（成功的请求已缓存）。--output-dir 把更新后的译文写到另一目录，原文件和依赖记录不变；
+--fake 只能与 --dry-run 或 --output-dir 一起使用，以免假服务的输出写进正式译文。
+
+用法:
+    python retranslate.py record [卷号 ...]
+    python retranslate.py status [卷号 ...]
+    python retranslate.py update [卷号 ...] [--backend gemini --model gemini-2.5-pro] [--dry-run]
+    python retranslate.py update 二十四 --fake --output-dir fake_output
+"""
+
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import align_passages
+import corpus_index
+import pack_prompts
+import translate_runner
+
+DEPS_DIR = 'translation_deps'
+
+def target_segments(path):
+    """
+    译文卷中的 经文/译文 对：[(起始行号, 结束行号, 经文), ...]
+
+    每对从粗体经文开始，到下一段经文之前为止；第一段经文之前的卷首内容不属于任何一对
+    """
+    lines = pack_prompts.read_lines(path)
+    passages = list(align_passages.bold_passages(path))
+    bounds = [start for start, _, _ in passages] + [len(lines) + 1]
+    return [(start, bounds[i + 1] - 1, text) for i, (start, _, text) in enumerate(passages)]
+
+def deps_path(target, deps_dir=DEPS_DIR):
+    return os.path.join(deps_dir, os.path.basename(target) + '.json')
+
+def build_dependencies(targets, cache):
+    """
+    计算各译文文件中每个 经文/译文 对依赖的源文本自然段
+
+    targets 为 [(卷号, 译文文件), ...]。返回 {译文文件: 依赖记录}，依赖记录为
+    {'target', 'volume', 'segments': [{'line_start', 'line_end', 'sutra', 'sources'}, ...],
+     'files': {源文件: [自然段哈希, ...]}}，sources 为 [{'file', 'corpus', 'line_start', 'line_end', 'hashes'}, ...]
+    """
+    rows = align_passages.build_alignment()
+    groups = {}
+    passage_ids = {}
+    for row in rows:
+        groups.setdefault(row['passage_id'], []).append(row)
+        passage_ids[(row['file'], row['line_start'])] = row['passage_id']
+
+    source_files = {}
+
+    def source(path, corpus):
+        """源文件的行、经文起始行号 -> 所在段起止行号 的对应、全部自然段"""
+        if path not in source_files:
+            lines = pack_prompts.read_lines(path)
+            if corpus == 'yuanying':
+                ranges = {passage: (start, end) for start, end, passage in pack_prompts.main_segments(path, lines)}
+            else:
+                ranges = {start: (start, end) for start, end in pack_prompts.reference_units(path, lines).items()}
+            paragraphs = pack_prompts.split_paragraphs(lines, 1, len(lines), cache)
+            source_files[path] = (lines, ranges, paragraphs)
+        return source_files[path]
+
+    dependencies = {}
+    for volume, target in targets:
+        target_key = target.replace(os.sep, '/')
+        segments = []
+        used_files = set()
+        for line_start, line_end, sutra in target_segments(target):
+            members = groups.get(passage_ids.get((target_key, line_start)), [])
+            members = sorted((r for r in members if r['corpus'] in ('yuanying', 'chengguan')),
+                             key=lambda r: (align_passages.CORPUS_ORDER.index(r['corpus']),
+                                            align_passages.volume_number(r['volume']), r['line_start']))
+            sources = []
+            for r in members:
+                lines, ranges, _ = source(r['file'], r['corpus'])
+                src_start, src_end = ranges.get(r['line_start'], (r['line_start'], r['line_start']))
+                if any(s['file'] == r['file'] and s['line_start'] == src_start for s in sources):
+                    continue
+                paragraphs = pack_prompts.split_paragraphs(lines, src_start, src_end, cache)
+                sources.append({'file': r['file'], 'corpus': r['corpus'], 'line_start': src_start,
+                                'line_end': src_end, 'hashes': [p['hash'] for p in paragraphs]})
+                used_files.add(r['file'])
+            segments.append({'line_start': line_start, 'line_end': line_end, 'sutra': sutra,
+                             'sources': sources})
+
+        files = {path: [p['hash'] for p in source_files[path][2]] for path in sorted(used_files)}
+        dependencies[target] = {'target': target_key, 'volume': volume, 'segments': segments, 'files': files}
+    return dependencies
+
+def load_dependencies(target, deps_dir=DEPS_DIR):
+    path = deps_path(target, deps_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_dependencies(deps, deps_dir=DEPS_DIR):
+    os.makedirs(deps_dir, exist_ok=True)
+    path = deps_path(deps['target'], deps_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(deps, ensure_ascii=False))
+    os.replace(tmp_path, path)
+
+def source_signature(segment):
+    """经文/译文 对依赖的源文本：[(文件, 自然段哈希...), ...]，与行号无关"""
+    return [(s['file'], tuple(s['hashes'])) for s in segment['sources']]
+
+def affected_segments(old, new):
+    """
+    对比两次依赖记录，返回新记录中受影响的 经文/译文 对下标
+
+    按 (经文, 第几次出现) 对应新旧记录；源文本自然段有任何增删改即受影响，旧记录中没有的对不算
+    """
+    old_signatures = {}
+    seen = {}
+    for segment in old['segments']:
+        key = (segment['sutra'], seen.get(segment['sutra'], 0))
+        seen[segment['sutra']] = key[1] + 1
+        old_signatures[key] = source_signature(segment)
+
+    affected = []
+    seen = {}
+    for i, segment in enumerate(new['segments']):
+        key = (segment['sutra'], seen.get(segment['sutra'], 0))
+        seen[segment['sutra']] = key[1] + 1
+        if key in old_signatures and old_signatures[key] != source_signature(segment):
+            affected.append(i)
+    return affected
+
+def paragraph_changes(old_hashes, new_hashes, paragraphs):
+    """
+    源文件的自然段级差异，返回 [(操作, 新文件起始行号, 结束行号), ...]
+
+    paragraphs 为新文件的自然段（含行号）；删除的段落以其后一段的起始行号标记
+    """
+    changes = []
+    matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if j1 < j2:
+            changes.append((tag, paragraphs[j1]['line_start'], paragraphs[j2 - 1]['line_end']))
+        else:
+            line = paragraphs[j1]['line_start'] if j1 < len(paragraphs) else \
+                (paragraphs[-1]['line_end'] + 1 if paragraphs else 1)
+            changes.append((tag, line, line))
+    return changes
+
+def affected_runs(affected):
+    """受影响的下标按相邻关系分组：[[3, 4], [9], ...]"""
+    runs = []
+    for i in affected:
+        if runs and runs[-1][-1] == i - 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    return runs
+
+def run_request(deps, run, template):
+    """
+    一组相邻的 经文/译文 对的重译请求，返回 (提示词, chunk_hash, 预估 token 数)
+
+    主文本为这些对依赖的讲记段，参考文本为义贯段，要求只输出这些经文及其译文
+    """
+    segments = [deps['segments'][i] for i in run]
+    texts = {'yuanying': [], 'chengguan': []}
+    seen = set()
+    for segment in segments:
+        for s in segment['sources']:
+            if (s['file'], s['line_start']) in seen:
+                continue
+            seen.add((s['file'], s['line_start']))
+            lines = pack_prompts.read_lines(s['file'])
+            texts[s['corpus']].append("".join(lines[s['line_start'] - 1:s['line_end']]))
+    main_text = "\n".join(texts['yuanying'])
+    reference_text = "\n".join(texts['chengguan'])
+    sutras = "\n".join(f"**{segment['sutra']}**" for segment in segments)
+
+    instruction = (f"直接输出 Markdown 译文，不要写入文件。这是对第{deps['volume']}卷已有译文的局部重译："
+                   f"只输出下列 {len(segments)} 段经文及其白话译文，经文照录并加粗，顺序不变，"
+                   f"不要输出其他经文：\n{sutras}")
+    prompt = pack_prompts.render_prompt(template, deps['volume'], None, main_text, reference_text, 1,
+                                        instruction)
+    chunk_hash = hashlib.sha1(f"{main_text}\0{reference_text}\0{sutras}".encode('utf-8')).hexdigest()
+    return prompt, chunk_hash, pack_prompts.estimate_tokens(prompt)
+
+def splice(target, deps, replacements, output=None):
+    """
+    把重译结果拼回译文文件（output 不为 None 时写到 output，原文件不变）
+
+    replacements 为 {(起始下标, 结束下标): 新文本}。每组替换从第一对的经文行开始，
+    到最后一对的最后一个非空行为止，其后的空行和其余内容逐字节保留
+    """
+    with open(target, 'rb') as f:
+        raw_lines = f.readlines()
+    offsets = [0]
+    for raw in raw_lines:
+        offsets.append(offsets[-1] + len(raw))
+    data = b"".join(raw_lines)
+
+    pieces = []
+    for (first, last), text in replacements.items():
+        line_end = deps['segments'][last]['line_end']
+        while line_end > deps['segments'][last]['line_start'] and not raw_lines[line_end - 1].strip():
+            line_end -= 1
+        start = offsets[deps['segments'][first]['line_start'] - 1]
+        # 保留最后一个非空行自身的换行符
+        end = offsets[line_end] - (len(raw_lines[line_end - 1]) - len(raw_lines[line_end - 1].rstrip(b'\r\n')))
+        pieces.append((start, end, text.strip().encode('utf-8')))
+
+    for start, end, new in sorted(pieces, reverse=True):
+        data = data[:start] + new + data[end:]
+    output = output or target
+    tmp_path = output + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output)
+
+async def retranslate(requests, call, model, options, concurrency, tokens_per_minute, cache_dir, max_retries):
+    """并发发出重译请求（先查响应缓存），返回与 requests 对应的译文列表，失败的请求为 None"""
+    stats = {'cached': 0, 'retries': 0, 'tokens': 0, 'latencies': []}
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = translate_runner.TokenBucket(tokens_per_minute)
+
+    async def one(prompt, key, estimate, label):
+        cached = translate_runner.load_cached(key, cache_dir)
+        if cached is not None:
+            stats['cached'] += 1
+            return cached['text']
+        try:
+            text, tokens = await translate_runner.request_text(prompt, estimate, call, model, options, semaphore,
+                                                               bucket, executor, stats, max_retries)
+        except translate_runner.BackendError as e:
+            print(f"失败: {label}: {e}")
+            return None
+        translate_runner.save_cached(key, {'model': model, 'tokens': tokens, 'text': text}, cache_dir)
+        return text
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.gather(*(one(*request) for request in requests))
+
+def gemini_targets(volumes=None):
+    return [(volume, path) for _, volume, path in corpus_index.volume_files(['gemini'])
+            if not volumes or volume in volumes]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按源文本自然段差异局部重译白话译文')
+    parser.add_argument('command', choices=('record', 'status', 'update'))
+    parser.add_argument('volumes', nargs='*', help='卷号，如 二十四；默认全部')
+    parser.add_argument('--backend', choices=sorted(translate_runner.BACKENDS), default='gemini')
+    parser.add_argument('--model', default='gemini-2.5-pro')
+    parser.add_argument('--base-url')
+    parser.add_argument('--concurrency', type=int, default=translate_runner.CONCURRENCY)
+    parser.add_argument('--tpm', type=int, default=translate_runner.TOKENS_PER_MINUTE)
+    parser.add_argument('--retries', type=int, default=translate_runner.MAX_RETRIES)
+    parser.add_argument('--cache-dir', help=f'默认 {translate_runner.CACHE_DIR}，'
+                        f'--fake 时为 {translate_runner.FAKE_OUTPUT_DIR}/{translate_runner.CACHE_DIR}')
+    parser.add_argument('--output-dir', help='更新后的译文写到该目录，不改动 gemini_doc 和依赖记录')
+    parser.add_argument('--fake', action='store_true', help='使用本地假服务（OpenAI 接口），需配合 --dry-run 或 --output-dir')
+    parser.add_argument('--dry-run', action='store_true', help='只列出要重译的内容，不发请求')
+    args = parser.parse_args(argv)
+    if args.fake and args.command == 'update' and not (args.dry_run or args.output_dir):
+        parser.error('--fake 会把假服务的输出拼进译文，请同时指定 --dry-run 或 --output-dir')
+    if args.fake:
+        args.cache_dir = args.cache_dir or os.path.join(translate_runner.FAKE_OUTPUT_DIR, translate_runner.CACHE_DIR)
+    args.cache_dir = args.cache_dir or translate_runner.CACHE_DIR
+
+    targets = gemini_targets(args.volumes or None)
+    cache = pack_prompts.load_token_cache()
+    current = build_dependencies(targets, cache)
+    pack_prompts.save_token_cache(cache)
+
+    if args.command == 'record':
+        for deps in current.values():
+            save_dependencies(deps)
+            print(f"已记录: {deps['target']}（{len(deps['segments'])} 对）")
+        return 0
+
+    plans = []
+    for volume, target in targets:
+        old = load_dependencies(target)
+        if old is None:
+            print(f"{target}: 没有依赖记录，请先运行 record")
+            continue
+        new = current[target]
+        for path, new_hashes in new['files'].items():
+            lines = pack_prompts.read_lines(path)
+            paragraphs = pack_prompts.split_paragraphs(lines, 1, len(lines), cache)
+            for tag, line_start, line_end in paragraph_changes(old['files'].get(path, []), new_hashes, paragraphs):
+                print(f"  {path}:{line_start}-{line_end} {tag}")
+        affected = affected_segments(old, new)
+        for i in affected:
+            segment = new['segments'][i]
+            print(f"{target}:{segment['line_start']}-{segment['line_end']} 需重译: {segment['sutra'][:30]}")
+        if affected:
+            plans.append((target, new, affected_runs(affected)))
+    print(f"共 {sum(len(run) for _, _, runs in plans for run in runs)} 对需重译，"
+          f"{sum(len(runs) for _, _, runs in plans)} 次请求")
+
+    if args.command == 'status' or args.dry_run or not plans:
+        return 0
+
+    with open(pack_prompts.TEMPLATE_FILE, 'r', encoding='utf-8') as f:
+        template = f.read()
+    template_hash = hashlib.sha1(template.encode('utf-8')).hexdigest()
+    requests = []
+    for target, deps, runs in plans:
+        for run in runs:
+            prompt, chunk_hash, estimate = run_request(deps, run, template)
+            label = f"{target}:{deps['segments'][run[0]]['line_start']}-{deps['segments'][run[-1]]['line_end']}"
+            requests.append((prompt, translate_runner.cache_key(template_hash, args.model, chunk_hash), estimate,
+                             label))
+
+    options = {'base_url': args.base_url}
+    server = None
+    if args.fake:
+        import fake_llm_server
+        server, options['base_url'] = fake_llm_server.start_fake_server(latency=(0.05, 0.3), failure_rate=0.1)
+        args.backend = 'openai'
+    try:
+        texts = asyncio.run(retranslate(requests, translate_runner.BACKENDS[args.backend], args.model, options,
+                                        args.concurrency, args.tpm, args.cache_dir, args.retries))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    texts = iter(texts)
+    updated = []
+    failed = 0
+    for target, deps, runs in plans:
+        replacements = {(run[0], run[-1]): next(texts) for run in runs}
+        done = {key: text for key, text in replacements.items() if text is not None}
+        failed += len(replacements) - len(done)
+        if not done:
+            print(f"未更新: {target}（{len(runs)} 处请求全部失败）")
+            continue
+        output = None
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output = os.path.join(args.output_dir, os.path.basename(target))
+        splice(target, deps, done, output)
+        print(f"已更新: {output or target}（{len(done)}/{len(runs)} 处）")
+        if len(done) == len(replacements):
+            updated.append((deps['volume'], target))
+        else:
+            print(f"  {target} 有请求失败，未重新记录依赖；重跑 update 可补上（成功的部分已缓存）")
+    # 写到其他目录时原译文未变，依赖记录也不变
+    if not args.output_dir:
+        for deps in build_dependencies(updated, cache).values():
+            save_dependencies(deps)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+讲记、义贯的段落检索（BM25），用于提问时挑出相关段落，代替附上整卷
+
+段落切分：
+    讲记（yuanying_doc）  整行粗体为经文（相邻的粗体行合为一段，见 align_passages.bold_passages），
+                          其余为讲义
+    义贯（chengguan_doc） 经文、注释、义贯、诠论由 extract_chengguan.iter_records 区分
+两者都由 PDF 转换而来，原书的每一行是一个 Markdown 段落。讲义、注释等按行长拼回自然段：
+一行明显短于该卷的满行长度时视为段落结束；页码标记和分隔线不打断段落。
+
+检索：段落和查询都归一化（繁体折叠为简体、只保留字母和数字）后取相邻两字（bigram）为词，
+BM25 的每个 词×段落 权重在建索引时算好，按词存为稀疏矩阵（CSC：每个词的段落编号和权重连续存放）。
+查询时取出查询词对应的几列，用 np.bincount 按段落累加得分，再用 argpartition 取前 k 个。
+
+索引目录结构：
+    manifest.json   版本、BM25 参数、各卷文件的语料/卷号/大小与修改时间
+    index.npz       terms: 词（两字码点拼成的 int64，有序），term_ptr: 各词在 docs/weights 中的起点，
+                    docs/weights: 各词的段落编号和权重，
+                    corpus/kind/source/line_start/line_end: 各段落的语料、类型、所在文件（manifest 中的序号）、起止行号，
+                    text/text_ptr: 各段落文本（UTF-8）及其起点
+
+用法:
+    python retrieval.py build [--force]
+    python retrieval.py query 问题或关键词 [-k 10] [--corpus yuanying chengguan] [--type 经文 讲义 ...]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+import align_passages
+import corpus_index
+import extract_chengguan
+
+INDEX_DIR = 'retrieval_index'
+INDEX_VERSION = 1
+
+CORPORA = ('yuanying', 'chengguan')
+
+# 段落类型
+LECTURE = '讲义'
+KINDS = (extract_chengguan.SUTRA, LECTURE) + extract_chengguan.SECTION_TYPES
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+# 短于满行长度该比例的行视为段落的最后一行
+SHORT_LINE_RATIO = 0.8
+
+# 满行至少这么多字；行长统计只计入不短于该值的行
+MIN_LINE_WIDTH = 20
+
+# 段落中去掉的内容：页码标记、HTML 注释和标签、粗体标记
+MARKUP_RE = re.compile(r'<!--.*?-->|<[^>]+>|\*第 \d+ 页\*|\*\*')
+
+# 不属于正文的行：标题、分隔线、页码标记
+SKIP_LINE_RE = re.compile(r'^\s*(?:#|-{3,}\s*$|\*第 \d+ 页\*\s*$|<!--.*-->\s*$)')
+
+# 两字拼成一个词编号：前一字码点左移该位数（码点最多21位）
+CODE_BITS = 21
+
+def normalize(text):
+    """繁体折叠为简体、字母转小写，只保留字母和数字"""
+    return "".join(ch for ch in corpus_index.fold(text) if unicodedata.category(ch)[0] in 'LN')
+
+def bigram_keys(text):
+    """归一化文本的相邻两字编号（int64 数组，按出现顺序，可重复）"""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4').astype(np.int64)
+    return (codes[:-1] << CODE_BITS) | codes[1:]
+
+def clean_line(line):
+    return MARKUP_RE.sub('', line).strip()
+
+def line_width(lines):
+    """满行长度：不短于 MIN_LINE_WIDTH 的正文行中最常见的行长"""
+    lengths = Counter(len(clean_line(line)) for line in lines if not SKIP_LINE_RE.match(line))
+    full = {n: count for n, count in lengths.items() if n >= MIN_LINE_WIDTH}
+    return max(full, key=full.get) if full else MIN_LINE_WIDTH
+
+def join_lines(lines, line_numbers, width):
+    """
+    把 PDF 转换出的逐行文本拼回自然段
+
+    line_numbers 为要拼接的行号（从1开始，按顺序）；返回 [(起始行号, 结束行号, 文本), ...]
+    """
+    paragraphs = []
+    start = end = None
+    parts = []
+    for line_no in line_numbers:
+        line = lines[line_no - 1]
+        if SKIP_LINE_RE.match(line):
+            continue
+        text = clean_line(line)
+        if not text:
+            continue
+        if start is None:
+            start = line_no
+        end = line_no
+        parts.append(text)
+        if len(text) < width * SHORT_LINE_RATIO:
+            paragraphs.append((start, end, "".join(parts)))
+            start, parts = None, []
+    if parts:
+        paragraphs.append((start, end, "".join(parts)))
+    return paragraphs
+
+def yuanying_paragraphs(path):
+    """讲记一卷的段落 [(类型, 起始行号, 结束行号, 文本), ...]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    width = line_width(lines)
+    paragraphs = []
+    next_line = 1
+
+    def lecture(until):
+        for start, end, text in join_lines(lines, range(next_line, until), width):
+            paragraphs.append((LECTURE, start, end, text))
+
+    for start, end, text in align_passages.bold_passages(path):
+        lecture(start)
+        paragraphs.append((extract_chengguan.SUTRA, start, end, clean_line(text)))
+        next_line = end + 1
+    lecture(len(lines) + 1)
+    return paragraphs
+
+def chengguan_paragraphs(path):
+    """义贯一卷的段落 [(类型, 起始行号, 结束行号, 文本), ...]；注释/义贯/诠论 的标题行不计入"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    width = line_width(lines)
+    paragraphs = []
+    for record in extract_chengguan.iter_records(path):
+        if record['type'] == extract_chengguan.SUTRA:
+            text = clean_line(record['text']).strip('【】')
+            paragraphs.append((record['type'], record['line'], record['end_line'], text))
+        else:
+            for start, end, text in join_lines(lines, range(record['line'] + 1, record['end_line'] + 1), width):
+                paragraphs.append((record['type'], start, end, text))
+    return paragraphs
+
+PARAGRAPH_READERS = {
+    'yuanying': yuanying_paragraphs,
+    'chengguan': chengguan_paragraphs,
+}
+
+def bm25_matrix(doc_keys, k1=K1, b=B):
+    """
+    由各段落的 bigram 编号计算 BM25 权重矩阵（按词存放）
+
+    doc_keys: [int64 数组, ...]，每段落一个。返回 (terms, term_ptr, docs, weights)
+    """
+    n = len(doc_keys)
+    lengths = np.array([len(keys) for keys in doc_keys], dtype=np.int64)
+    keys = np.concatenate(doc_keys) if n else np.zeros(0, dtype=np.int64)
+    docs = np.repeat(np.arange(n, dtype=np.int32), lengths)
+
+    # 按 (词, 段落) 排序后，相同的相邻元素数即词频
+    order = np.lexsort((docs, keys))
+    keys, docs = keys[order], docs[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (docs[1:] != docs[:-1])
+    starts = np.flatnonzero(first)
+    tf = np.diff(np.append(starts, len(keys))).astype(np.float64)
+    keys, docs = keys[starts], docs[starts]
+
+    new_term = np.ones(len(keys), dtype=bool)
+    new_term[1:] = keys[1:] != keys[:-1]
+    term_starts = np.flatnonzero(new_term)
+    terms = keys[term_starts]
+    term_ptr = np.append(term_starts, len(keys)).astype(np.int64)
+
+    df = np.diff(term_ptr)
+    idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+    avg_length = lengths.mean() if n else 0.0
+    norm = k1 * (1 - b + b * lengths[docs] / avg_length) if avg_length else k1
+    weights = np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)
+    return terms, term_ptr, docs, weights.astype(np.float32)
+
+def load_manifest(index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, 'manifest.json')
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == INDEX_VERSION:
+            return manifest
+    return None
+
+def build_index(index_dir=INDEX_DIR, corpora=CORPORA, force=False, k1=K1, b=B):
+    """
+    切分段落并建立 BM25 索引；各卷文件的大小和修改时间都没变时不重建（除非 force）
+
+    返回段落数，未重建时返回 None
+    """
+    files = [{'corpus': corpus, 'volume': volume, 'file': path.replace(os.sep, '/'),
+              'stamp': list(corpus_index.file_stamp(path))}
+             for corpus, volume, path in corpus_index.volume_files(corpora)]
+    manifest = load_manifest(index_dir)
+    if (not force and manifest and manifest['files'] == files
+            and manifest['k1'] == k1 and manifest['b'] == b):
+        print(f"索引无变化：{manifest['paragraphs']} 段")
+        return None
+
+    start = time.perf_counter()
+    paragraphs = []
+    for i, entry in enumerate(files):
+        for kind, line_start, line_end, text in PARAGRAPH_READERS[entry['corpus']](entry['file']):
+            if text:
+                paragraphs.append((CORPORA.index(entry['corpus']), KINDS.index(kind), i, line_start, line_end, text))
+    texts = [p[5] for p in paragraphs]
+    terms, term_ptr, docs, weights = bm25_matrix([bigram_keys(normalize(text)) for text in texts], k1, b)
+
+    encoded = [text.encode('utf-8') for text in texts]
+    text_ptr = np.concatenate(([0], np.cumsum([len(data) for data in encoded]))).astype(np.int64)
+    columns = list(zip(*[p[:5] for p in paragraphs])) or [()] * 5
+    os.makedirs(index_dir, exist_ok=True)
+    np.savez(os.path.join(index_dir, 'index.npz'),
+             terms=terms, term_ptr=term_ptr, docs=docs, weights=weights,
+             corpus=np.array(columns[0], dtype=np.uint8), kind=np.array(columns[1], dtype=np.uint8),
+             source=np.array(columns[2], dtype=np.int16), line_start=np.array(columns[3], dtype=np.int32),
+             line_end=np.array(columns[4], dtype=np.int32),
+             text=np.frombuffer(b"".join(encoded), dtype=np.uint8), text_ptr=text_ptr)
+
+    manifest = {'version': INDEX_VERSION, 'k1': k1, 'b': b, 'paragraphs': len(paragraphs),
+                'terms': len(terms), 'corpora': list(CORPORA), 'kinds': list(KINDS), 'files': files}
+    with open(os.path.join(index_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    counts = Counter(KINDS[p[1]] for p in paragraphs)
+    print(f"索引完成：{len(files)} 卷，{len(paragraphs)} 段（" +
+          "，".join(f"{kind} {counts[kind]}" for kind in KINDS) +
+          f"），{len(terms)} 个词，{time.perf_counter() - start:.2f}s")
+    return len(paragraphs)
+
+class ParagraphIndex:
+    """
+    已建立的段落索引；数组在打开时全部读入内存
+
+    用法:
+        index = ParagraphIndex()
+        for hit in index.search('阿难为什么出家', k=5):
+            print(hit['file'], hit['line_start'], hit['kind'], hit['text'])
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.manifest = load_manifest(index_dir)
+        if self.manifest is None:
+            raise FileNotFoundError(f"没有找到段落索引 {index_dir}，请先执行 python retrieval.py build")
+        with np.load(os.path.join(index_dir, 'index.npz')) as data:
+            for name in data.files:
+                setattr(self, name, data[name])
+        self.size = len(self.corpus)
+
+    def _text(self, i):
+        return self.text[self.text_ptr[i]:self.text_ptr[i + 1]].tobytes().decode('utf-8')
+
+    def scores(self, query):
+        """
+        查询对所有段落的 BM25 得分（float 数组）；查询中重复的词按次数加权
+
+        索引只有两字词，归一化后不足两个字的查询（如单字“佛”）无法检索，抛出 ValueError
+        """
+        normalized = normalize(query)
+        if len(normalized) < 2:
+            raise ValueError(f"查询“{query}”太短：去掉标点后至少需要两个字（按相邻两字检索）；"
+                             f"查找单字请用 python lengyan.py index query")
+        keys, counts = np.unique(bigram_keys(normalized), return_counts=True)
+        positions = np.searchsorted(self.terms, keys)
+        found = positions < len(self.terms)
+        found[found] = self.terms[positions[found]] == keys[found]
+        positions, counts = positions[found], counts[found]
+        if not len(positions):
+            return np.zeros(self.size)
+        starts, ends = self.term_ptr[positions], self.term_ptr[positions + 1]
+        # 把各词在 docs/weights 中的区间拼成一个下标数组，一次取出
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        index = np.arange(lengths.sum()) + offsets
+        return np.bincount(self.docs[index], weights=self.weights[index] * np.repeat(counts, lengths),
+                           minlength=self.size)
+
+    def search(self, query, k=10, corpora=None, kinds=None):
+        """
+        得分最高的 k 个段落，按得分从高到低
+
+        返回 [{'score', 'corpus', 'volume', 'file', 'line_start', 'line_end', 'kind', 'text'}, ...]，
+        corpora/kinds 限定语料名和段落类型
+        """
+        scores = self.scores(query)
+        if corpora:
+            scores[~np.isin(self.corpus, [self.manifest['corpora'].index(c) for c in corpora])] = 0
+        if kinds:
+            scores[~np.isin(self.kind, [self.manifest['kinds'].index(kind) for kind in kinds])] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        hits = []
+        for i in candidates.tolist():
+            entry = self.manifest['files'][self.source[i]]
+            hits.append({'score': float(scores[i]), 'corpus': entry['corpus'], 'volume': entry['volume'],
+                         'file': entry['file'], 'line_start': int(self.line_start[i]),
+                         'line_end': int(self.line_end[i]), 'kind': self.manifest['kinds'][self.kind[i]],
+                         'text': self._text(i)})
+        return hits
+
+def print_hits(hits, elapsed, width=80):
+    for hit in hits:
+        text = hit['text'] if len(hit['text']) <= width else hit['text'][:width] + '……'
+        print(f"{hit['score']:6.2f}  {hit['file']}:{hit['line_start']}-{hit['line_end']}  "
+              f"第{hit['volume']}卷 {hit['kind']}\n        {text}")
+    print(f"共 {len(hits)} 段，用时 {elapsed * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    import lengyan
+    lengyan.main(['retrieve'] + sys.argv[1:])
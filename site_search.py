@@ -0,0 +1,175 @@
+"""
+白话译文网站（gemini_doc，VitePress）的预建全文检索索引，并按磁盘上的文件重新生成首页卷目表
+
+VitePress 自带的本地搜索把整个索引打包进每次页面加载。这里在构建前生成分片的静态索引，
+浏览器只在搜索时按需取用查询涉及的几个小文件：
+
+    public/search/meta.json        各卷的文件、链接、标题，各卷第一个文档的编号，分片数
+    public/search/shards/<n>.json  {词: [文档编号差分...]}；词为归一化文本的单字和相邻两字（bigram），
+                                   按词首字的码点 % SHARDS 分片
+    public/search/docs/<卷号>.json  该卷的文档 [[锚点, 经文, 译文], ...]，用于核对命中和显示摘要
+
+文档为译文中的一对 经文/译文：从一段粗体经文开始，到下一段经文之前为止（见 retranslate.target_segments）。
+锚点 p<n> 表示卷中第 n 个整行粗体的段落，由主题（.vitepress/theme）在页面上给这些段落加 id，
+两边的计数方式必须一致。
+
+归一化只保留字母和数字（Unicode 类别 L*、N*）并转为小写，客户端用同样的规则处理查询。
+查询先取各词的倒排表求交集，再在文档原文中核对整个短语。
+
+用法（在 vitepress build 之前执行）:
+    python site_search.py [--site gemini_doc] [--shards 256]
+"""
+
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import unicodedata
+
+import align_passages
+
+SITE_DIR = 'gemini_doc'
+SEARCH_DIR = os.path.join('public', 'search')
+SHARDS = 256
+
+VOLUME_FILE_RE = re.compile(r'^(\d+)-.*?(第.+?卷)')
+HEADING_RE = re.compile(r'^#\s+(.+?)\s*$')
+# 译文段落里要去掉的 Markdown 标记：标题/引用/列表前缀、粗体/斜体、HTML 注释和标签、分隔线
+MARKUP_LINE_RE = re.compile(r'^\s*(?:#+\s*|>\s*|[-*+]\s+|\d+\.\s+)')
+MARKUP_RE = re.compile(r'<!--.*?-->|<[^>]+>|\*\*|__|\*第 \d+ 页\*')
+RULE_RE = re.compile(r'^\s*-{3,}\s*$')
+
+TABLE_HEADER = "| 卷数 | 链接 |"
+
+def normalize(text):
+    """只保留字母和数字并转为小写；客户端 normalize() 与此一致"""
+    return "".join(ch for ch in text.lower() if unicodedata.category(ch)[0] in 'LN')
+
+def terms(text):
+    """归一化文本中的单字和相邻两字（去重）"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+def shard_of(term, shards=SHARDS):
+    return ord(term[0]) % shards
+
+def strip_markup(line):
+    return MARKUP_RE.sub('', MARKUP_LINE_RE.sub('', line)).strip()
+
+def volume_files(site_dir=SITE_DIR):
+    """[(卷号, 卷名, 文件路径), ...]，按卷号排序；卷名如“第一卷”"""
+    volumes = []
+    for path in glob.glob(os.path.join(site_dir, '*.md')):
+        match = VOLUME_FILE_RE.match(os.path.basename(path))
+        if match:
+            volumes.append((int(match.group(1)), match.group(2), path))
+    return sorted(volumes)
+
+def split_pairs(path):
+    """
+    卷中的 经文/译文 对，返回 (卷标题, [(锚点, 经文, 译文), ...])
+
+    锚点按整行粗体的行计数：相邻的粗体行在 bold_passages 中合为一段经文，
+    但在页面上是各自的段落，取这一对第一行的序号
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    title = ''
+    bold_numbers = {}
+    for line_no, line in enumerate(lines, 1):
+        if not title:
+            match = HEADING_RE.match(line)
+            if match:
+                title = match.group(1)
+        if align_passages.BOLD_LINE_RE.match(line):
+            bold_numbers[line_no] = len(bold_numbers) + 1
+
+    passages = list(align_passages.bold_passages(path))
+    bounds = [start for start, _, _ in passages] + [len(lines) + 1]
+    pairs = []
+    for i, (start, end, sutra) in enumerate(passages):
+        paragraphs = [strip_markup(line) for line in lines[end:bounds[i + 1] - 1] if not RULE_RE.match(line)]
+        translation = "\n".join(p for p in paragraphs if p)
+        pairs.append((f"p{bold_numbers[start]}", strip_markup(sutra), translation))
+    return title, pairs
+
+def build_search(site_dir=SITE_DIR, shards=SHARDS):
+    """
+    生成 site_dir/public/search 下的全部索引文件（先清空旧文件），返回 meta
+
+    文档编号在全站范围内按卷号、卷内顺序连续分配
+    """
+    out_dir = os.path.join(site_dir, SEARCH_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(os.path.join(out_dir, 'shards'))
+    os.makedirs(os.path.join(out_dir, 'docs'))
+
+    meta = {'shards': shards, 'volumes': []}
+    postings = {}
+    doc_id = 0
+    for number, name, path in volume_files(site_dir):
+        title, pairs = split_pairs(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        meta['volumes'].append({'number': number, 'name': name, 'title': title,
+                                'link': '/' + stem, 'first': doc_id, 'count': len(pairs)})
+        for _, sutra, translation in pairs:
+            # 经文和译文分别取词，不产生跨越两者的 bigram
+            for term in terms(normalize(sutra)) | terms(normalize(translation)):
+                postings.setdefault(term, []).append(doc_id)
+            doc_id += 1
+        write_json(os.path.join(out_dir, 'docs', f'{number}.json'), pairs)
+
+    # 倒排表按文档编号递增，存差分以缩小文件
+    grouped = [{} for _ in range(shards)]
+    for term, ids in postings.items():
+        grouped[shard_of(term, shards)][term] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+    for shard, entries in enumerate(grouped):
+        write_json(os.path.join(out_dir, 'shards', f'{shard}.json'), dict(sorted(entries.items())))
+
+    meta['documents'] = doc_id
+    meta['terms'] = len(postings)
+    write_json(os.path.join(out_dir, 'meta.json'), meta)
+    return meta
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+def volume_table(volumes):
+    rows = [TABLE_HEADER, "|------|------|"]
+    for number, name, path in volumes:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        rows.append(f"| {name} | [{stem}](/{stem}) |")
+    return rows
+
+def update_index_page(site_dir=SITE_DIR):
+    """
+    按磁盘上的卷文件重新生成 index.md 中的卷目表，表格前后的内容不变
+
+    返回是否有改动；内容相同时不写文件
+    """
+    path = os.path.join(site_dir, 'index.md')
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    lines = content.split('\n')
+    start = next((i for i, line in enumerate(lines) if line.strip() == TABLE_HEADER), None)
+    if start is None:
+        # 没有卷目表时追加到末尾
+        lines.append('')
+        start = end = len(lines)
+    else:
+        end = start
+        while end < len(lines) and lines[end].startswith('|'):
+            end += 1
+    updated = '\n'.join(lines[:start] + volume_table(volume_files(site_dir)) + lines[end:])
+    if updated == content:
+        return False
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(updated)
+    return True
+
+if __name__ == '__main__':
+    import lengyan
+    lengyan.main(['site'] + sys.argv[1:])
@@ -1,70 +1,157 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-将楞严经讲记按卷分割成多个文件
+将楞严经讲记/义贯按卷分割成多个文件
+
+逐行扫描输入文件，遇到卷标题即开始写新的一卷，整个文件不必读入内存。
+卷标题的正则和输出文件名模板按语料配置，见 CORPORA。
+
+每卷先写到 .part 文件，再替换目标文件。各卷的内容哈希记入 split_manifest.json；
+目标文件与上次分割写出的内容不同时（手动调整过卷的分界，或从未记录过）不覆盖，
+只给出警告，确认可以覆盖时加 --force。例如讲记第九至十二卷的分界是手动调整的。
 """
 
+import hashlib
+import json
 import os
 import re
-
-def split_by_volume(input_file, output_dir):
+import sys
+
+# 卷标题的正则表达式（注意是繁体"講義"），分组1为卷号
+VOLUME_PATTERN = r'## 大佛頂如來密因修證了義諸菩薩萬行首楞嚴經講義第(.+?)卷'
+
+# 上次分割写出的各卷文件的内容哈希
+SPLIT_MANIFEST = 'split_manifest.json'
+
+# 各语料的输入文件、输出目录、卷标题正则和文件名模板（{volume} 为卷号）
+CORPORA = {
+    'chengguan': {
+        'input': 'chengguan_all.md',
+        'output_dir': 'chengguan_doc',
+        'pattern': VOLUME_PATTERN,
+        'filename': '楞严经义贯_第{volume}卷.md',
+    },
+    'yuanying': {
+        'input': 'yuanying_all.md',
+        'output_dir': 'yuanying_doc',
+        'pattern': VOLUME_PATTERN,
+        'filename': '楞严经讲记_第{volume}卷.md',
+    },
+}
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def load_split_manifest(path=SPLIT_MANIFEST):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_split_manifest(manifest, path=SPLIT_MANIFEST):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def split_by_volume(input_file, output_dir, pattern=VOLUME_PATTERN,
+                    filename_template='楞严经义贯_第{volume}卷.md', force=False,
+                    manifest_path=SPLIT_MANIFEST):
     """
     将输入文件按照卷标题分割成多个文件
 
     Args:
         input_file: 输入的markdown文件路径
         output_dir: 输出目录路径
+        pattern: 卷标题的正则表达式，分组1为卷号；第一个卷标题之前的内容不输出
+        filename_template: 输出文件名模板，{volume} 替换为卷号
+        force: 覆盖与上次分割结果不同的文件（否则保留原文件）
+        manifest_path: 记录上次分割结果哈希的文件
+
+    Returns:
+        (每卷的 (卷号, 输出文件, 行数, 字节数) 列表, 未覆盖的文件列表)
     """
     # 创建输出目录
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"创建输出目录: {output_dir}")
 
-    # 读取输入文件
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # 卷标题的正则表达式（注意是繁体"講義"）
-    volume_pattern = r'## 大佛頂如來密因修證了義諸菩薩萬行首楞嚴經講義第(.+?)卷'
-
-    # 查找所有卷标题的位置
+    volume_re = re.compile(pattern)
+    manifest = load_split_manifest(manifest_path)
     volumes = []
-    for match in re.finditer(volume_pattern, content):
-        volume_num = match.group(1)
-        start_pos = match.start()
-        volumes.append((volume_num, start_pos))
-
-    print(f"找到 {len(volumes)} 卷")
-
-    # 分割内容并写入文件
-    for i, (volume_num, start_pos) in enumerate(volumes):
-        # 确定结束位置
-        if i < len(volumes) - 1:
-            end_pos = volumes[i + 1][1]
-        else:
-            end_pos = len(content)
-
-        # 提取当前卷的内容
-        volume_content = content[start_pos:end_pos]
-
-        # 构造输出文件名
-        output_file = os.path.join(output_dir, f'楞严经义贯_第{volume_num}卷.md')
-
-        # 写入文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(volume_content)
-
-        print(f"已写入: {output_file}")
-
-    print(f"\n分割完成！共生成 {len(volumes)} 个文件，保存在目录: {output_dir}")
-
+    kept = []
+    current = None  # 当前卷：{'volume', 'file', 'out', 'lines', 'bytes', 'partial', 'hash'}
+
+    def close_volume(current):
+        """关闭当前卷的 .part 文件，目标文件未被手动修改时替换之，记录并打印统计"""
+        current['out'].close()
+        output_file, part_file = current['file'], current['file'] + '.part'
+        digest = current['hash'].hexdigest()
+        # 末尾没有换行符的最后一行也计为一行
+        lines = current['lines'] + (1 if current['partial'] else 0)
+        volumes.append((current['volume'], output_file, lines, current['bytes']))
+
+        existing = file_digest(output_file) if os.path.exists(output_file) else None
+        if existing not in (None, digest, manifest.get(output_file)) and not force:
+            os.remove(part_file)
+            kept.append(output_file)
+            reason = '上次分割后手动修改过' if output_file in manifest else '与分割结果不同，且没有分割记录'
+            print(f"未覆盖: {output_file}（{reason}；加 --force 覆盖）")
+            return
+        os.replace(part_file, output_file)
+        manifest[output_file] = digest
+        print(f"已写入: {output_file}（{lines} 行，{current['bytes']} 字节）")
+
+    # newline='' 保留原有换行符，输出与原文逐字节一致
+    with open(input_file, 'r', encoding='utf-8', newline='') as f:
+        for line in f:
+            pos = 0
+            segments = []
+            for match in volume_re.finditer(line):
+                # 卷标题之前的部分属于上一卷
+                segments.append((line[pos:match.start()], match))
+                pos = match.start()
+            segments.append((line[pos:], None))
+
+            for text, match in segments:
+                if current is not None and text:
+                    encoded = text.encode('utf-8')
+                    current['out'].write(text)
+                    current['hash'].update(encoded)
+                    current['lines'] += text.count('\n')
+                    current['bytes'] += len(encoded)
+                    current['partial'] = not text.endswith('\n')
+                if match is not None:
+                    if current is not None:
+                        close_volume(current)
+                    volume_num = match.group(1)
+                    output_file = os.path.join(output_dir, filename_template.format(volume=volume_num))
+                    current = {'volume': volume_num, 'file': output_file,
+                               'out': open(output_file + '.part', 'w', encoding='utf-8', newline=''),
+                               'lines': 0, 'bytes': 0, 'partial': False, 'hash': hashlib.sha1()}
+
+    if current is not None:
+        close_volume(current)
+    save_split_manifest(manifest, manifest_path)
+
+    print(f"\n分割完成！共生成 {len(volumes) - len(kept)} 个文件，保存在目录: {output_dir}")
+    if kept:
+        print(f"警告：{len(kept)} 个文件与上次分割的结果不同，未覆盖")
+    return volumes, kept
+
+def split_corpus(name, force=False):
+    """按 CORPORA 中的配置分割一种语料"""
+    corpus = CORPORA[name]
+    return split_by_volume(corpus['input'], corpus['output_dir'],
+                           corpus['pattern'], corpus['filename'], force=force)
 
 if __name__ == '__main__':
-    # 输入文件路径
-    input_file = 'chengguan_all.md'
-
-    # 输出目录
-    output_dir = 'chengguan_doc'
-
-    # 执行分割
-    split_by_volume(input_file, output_dir)
+    # 语料名：chengguan（义贯）或 yuanying（讲记），默认分割义贯
+    names = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['chengguan']
+
+    kept = []
+    for name in names:
+        kept += split_corpus(name, force='--force' in sys.argv)[1]
+    if kept:
+        sys.exit(1)
@@ -0,0 +1,184 @@
+"""
+生成用于测试和基准的繁体中文 PDF（不依赖受版权保护的原书 PDF）
+
+正文取自讲记 Markdown：粗体行作为经文（16pt），其余作为讲义（13pt），经 OpenCC 转为繁体后
+逐字排版，可选竖排（从右到左逐列）、横排（从上到下逐行），或竖排正文加一行与讲义同字号的
+横排书名（mixed，检验混排页面的区域拆分）。每页另加不在保留字号范围内的干扰文字：
+页眉（10pt 黑体）、页码（9pt Helvetica）、随机的边注（11pt）和小标题（20pt），
+转换器应将其全部滤掉。
+
+同样的参数（页数、版式、随机种子、源文本）生成的 PDF 内容相同。
+
+用法:
+    python synth_pdf.py 输出.pdf [页数] [vertical|horizontal|mixed]
+"""
+
+import itertools
+import os
+import random
+import re
+import sys
+
+from opencc import OpenCC
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfgen import canvas
+
+# 默认源文本为本模块旁的讲记全文
+SOURCE_TEXT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yuanying_all.md')
+PAGE_SIZE = (595, 842)
+MARGIN = 50
+
+# (字体, 字号)；MSung-Light 取出的文字是乱码，繁体正文用 STSong-Light / HeiseiMin-W3
+BODY_FONT = ('HeiseiMin-W3', 13)
+SUTRA_FONT = ('STSong-Light', 16)
+HEADER_FONT = ('HeiseiKakuGo-W5', 10)
+NOTE_FONT = ('HYGothic-Medium', 11)
+TITLE_FONT = ('STSong-Light', 20)
+PAGE_NUMBER_FONT = ('Helvetica', 9)
+
+# 行距/列距为字号加该值
+LINE_GAP = 6
+
+HEADER_TEXT = '大佛頂如來密因修證了義諸菩薩萬行首楞嚴經講義'
+
+BOLD_LINE_RE = re.compile(r'^\s*\*\*(.+?)\*\*\s*$')
+MARKUP_RE = re.compile(r'<!--.*?-->|<[^>]+>|[*#>|`_\-\s]|第 \d+ 页')
+
+_fonts_registered = False
+
+def register_fonts():
+    global _fonts_registered
+    if not _fonts_registered:
+        for name in {BODY_FONT[0], SUTRA_FONT[0], HEADER_FONT[0], NOTE_FONT[0], TITLE_FONT[0]}:
+            pdfmetrics.registerFont(UnicodeCIDFont(name))
+        _fonts_registered = True
+
+def load_paragraphs(source=SOURCE_TEXT, limit=2000):
+    """从讲记 Markdown 取前 limit 段，返回 [(是否经文, 繁体文本), ...]"""
+    cc = OpenCC('s2t')
+    paragraphs = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = BOLD_LINE_RE.match(line)
+            text = MARKUP_RE.sub('', match.group(1) if match else line)
+            if text:
+                paragraphs.append((bool(match), cc.convert(text)))
+                if len(paragraphs) >= limit:
+                    break
+    return paragraphs
+
+def iter_chars(paragraphs, rng):
+    """无限循环产出 (是否经文, 字, 是否段首)；段落顺序从随机位置开始"""
+    start = rng.randrange(len(paragraphs))
+    while True:
+        for is_sutra, text in paragraphs[start:] + paragraphs[:start]:
+            for j, ch in enumerate(text):
+                yield is_sutra, ch, j == 0
+        start = 0
+
+def draw_noise(c, page_no, rng, vertical):
+    """页眉、页码、边注和小标题"""
+    width, height = PAGE_SIZE
+    c.setFont(*HEADER_FONT)
+    c.drawString(MARGIN, height - MARGIN + 20, HEADER_TEXT)
+    c.setFont(*PAGE_NUMBER_FONT)
+    c.drawString(width / 2 - 10, MARGIN - 30, f"- {page_no} -")
+    if rng.random() < 0.3:
+        c.setFont(*NOTE_FONT)
+        note = '參看前文'
+        if vertical:
+            for k, ch in enumerate(note):
+                c.drawString(MARGIN - 30, height - MARGIN - 100 - k * (NOTE_FONT[1] + 2), ch)
+        else:
+            c.drawString(width - MARGIN + 5, height / 2, note)
+    if rng.random() < 0.1:
+        c.setFont(*TITLE_FONT)
+        c.drawString(MARGIN, MARGIN - 10, '卷')
+
+def draw_running_title(c):
+    """
+    竖排正文上方一行横排书名，字号与讲义相同，不会被字号过滤掉；
+    每字对齐正文的一列，字距（列距）小于书名与正文的距离
+    """
+    width, height = PAGE_SIZE
+    step = BODY_FONT[1] + LINE_GAP
+    c.setFont(*BODY_FONT)
+    for k, ch in enumerate(HEADER_TEXT):
+        c.drawString(width - MARGIN - BODY_FONT[1] - (len(HEADER_TEXT) - 1 - k) * step,
+                     height - MARGIN + 2 * LINE_GAP, ch)
+
+def draw_page_vertical(c, chars):
+    """竖排：从右到左逐列，列内从上到下；经文与讲义分列，换段另起一列"""
+    width, height = PAGE_SIZE
+    x = width - MARGIN
+    column_kind = None
+    y = None
+    for is_sutra, ch, first in chars:
+        font = SUTRA_FONT if is_sutra else BODY_FONT
+        size = font[1]
+        if y is None or first or is_sutra != column_kind or y < MARGIN + size:
+            if y is not None:
+                x -= max(size, BODY_FONT[1]) + LINE_GAP
+            if x < MARGIN:
+                return (is_sutra, ch, first)
+            y = height - MARGIN
+            column_kind = is_sutra
+        c.setFont(*font)
+        c.drawString(x - size, y - size, ch)
+        y -= size + 1
+    return None
+
+def draw_page_horizontal(c, chars):
+    """横排：从上到下逐行，行内从左到右；经文与讲义分行，换段另起一行"""
+    width, height = PAGE_SIZE
+    y = height - MARGIN
+    line_kind = None
+    x = None
+    for is_sutra, ch, first in chars:
+        font = SUTRA_FONT if is_sutra else BODY_FONT
+        size = font[1]
+        if x is None or first or is_sutra != line_kind or x > width - MARGIN - size:
+            if x is not None:
+                y -= max(size, BODY_FONT[1]) + LINE_GAP
+            if y < MARGIN + size:
+                return (is_sutra, ch, first)
+            x = MARGIN + (2 * size if first else 0)
+            line_kind = is_sutra
+        c.setFont(*font)
+        c.drawString(x, y - size, ch)
+        x += size + 1
+    return None
+
+def generate_pdf(path, pages=20, layout='vertical', seed=0, source=SOURCE_TEXT, noise=True):
+    """
+    生成 pages 页的繁体 PDF 到 path
+
+    layout: 'vertical'（竖排）、'horizontal'（横排）或 'mixed'（竖排正文加横排书名）
+    """
+    register_fonts()
+    rng = random.Random(seed)
+    chars = iter_chars(load_paragraphs(source), rng)
+    vertical = layout in ('vertical', 'mixed')
+    draw_page = draw_page_vertical if vertical else draw_page_horizontal
+
+    c = canvas.Canvas(path, pagesize=PAGE_SIZE, invariant=1)
+    pending = None
+    for page_no in range(1, pages + 1):
+        if noise:
+            draw_noise(c, page_no, rng, vertical)
+        if layout == 'mixed':
+            draw_running_title(c)
+        # 用 chain 而不是生成器拼接：生成器被回收时会连带关闭 chars
+        page_chars = chars if pending is None else itertools.chain([pending], chars)
+        pending = draw_page(c, page_chars)
+        c.showPage()
+    c.save()
+    return path
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else 'synthetic.pdf'
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    layout = sys.argv[3] if len(sys.argv) > 3 else 'vertical'
+    generate_pdf(output, pages, layout)
+    print(f"已生成: {output}（{pages} 页，{layout}）")
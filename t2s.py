@@ -0,0 +1,259 @@
+"""
+繁体→简体转换层，输出与 OpenCC('t2s') 完全一致，但速度更快：
+
+1. 批量转换：一页内的多段文本用换行拼接后一次转换，再按换行拆回。
+   换行属于 OpenCC 的断句符，断句符两侧各自独立转换，因此结果与逐段转换相同。
+2. 记忆化：OpenCC 以断句符切分后逐句转换，这里对每个句子做 LRU 缓存。
+   不含任何词组的句子只能逐字映射，直接用 str.translate 完成。
+3. 词典快照：首次加载时把 OpenCC 的文本词典编译为 marshal 快照，
+   之后直接读取快照；词典文件变化（大小或修改时间）时自动重建。
+"""
+
+import functools
+import hashlib
+import json
+import marshal
+import os
+import re
+import sys
+import time
+
+import opencc
+from opencc import OpenCC
+from opencc.opencc import CONFIG_DIR, StringTree
+
+OPENCC_DIR = os.path.dirname(os.path.abspath(opencc.__file__))
+
+# 词典快照文件，默认放在本模块旁边
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 't2s_snapshot.marshal')
+SNAPSHOT_VERSION = 1
+
+# 句子级 LRU 缓存的容量
+CACHE_SIZE = 65536
+
+# OpenCC 的断句符正则（捕获分组，split 后奇数下标为断句符），照录 OpenCC.__init__ 中的 split_chars_re，
+# 不为取它构造 OpenCC 实例；两者一致由 tests/test_t2s.py 检查
+SPLIT_RE = re.compile(
+    r'(\s+|-|,|\.|\?|!|\*|　|，|。|、|；|：|？|！|…|“|”|‘|’|『|』|「|」|﹁|﹂|—|－|（|）|《|》|〈|〉|～|．|／|＼|︒|︑|︔|︓'
+    r'|︿|﹀|︹|︺|︙|︐|［|﹇|］|﹈|︕|︖|︰|︳|︴|︽|︾|︵|︶|｛|︷|｝|︸|﹃|﹄|【|︻|】|︼)')
+
+def dict_chain_files(conversion):
+    """读取 OpenCC 配置，返回词典文件链（组为嵌套列表）"""
+    config_file = os.path.join(OPENCC_DIR, CONFIG_DIR, conversion + '.json')
+    with open(config_file, encoding='utf-8') as f:
+        setting_json = json.load(f)
+
+    loader = OpenCC()
+    chain = []
+    for item in setting_json.get('conversion_chain'):
+        loader._add_dict_chain(chain, item.get('dict'))
+    return chain
+
+def _flatten(chain):
+    for item in chain:
+        if isinstance(item, list):
+            yield from _flatten(item)
+        else:
+            yield item
+
+def _source_stamp(chain):
+    """词典文件的 (文件名, 大小, 修改时间)，用于判断快照是否过期"""
+    stamp = []
+    for path in _flatten(chain):
+        st = os.stat(path)
+        stamp.append((os.path.basename(path), st.st_size, st.st_mtime_ns))
+    return stamp
+
+def load_dict_chain(conversion='t2s', snapshot_path=SNAPSHOT_PATH):
+    """
+    加载词典链，格式与 OpenCC._dict_chain_data 相同：
+    [[(最长键长, 最短键长, {键: 值}), ...], ...]
+
+    参数:
+        snapshot_path: 快照文件路径，为 None 时不使用快照
+    """
+    chain = dict_chain_files(conversion)
+    stamp = _source_stamp(chain)
+
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, 'rb') as f:
+                snapshot = marshal.load(f)
+            if (snapshot.get('version') == SNAPSHOT_VERSION
+                    and snapshot.get('conversion') == conversion
+                    and snapshot.get('sources') == stamp):
+                return snapshot['chain']
+        except (EOFError, ValueError, TypeError, AttributeError):
+            pass
+
+    loader = OpenCC()
+    chain_data = []
+    loader._add_dictionaries(chain, chain_data)
+    # 与 OpenCC._init_dict 一致：单个词典也包装为列表
+    chain_data = [item if isinstance(item, list) else [item] for item in chain_data]
+
+    if snapshot_path:
+        snapshot = {'version': SNAPSHOT_VERSION, 'conversion': conversion,
+                    'sources': stamp, 'chain': chain_data}
+        tmp_path = snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(snapshot, f)
+            os.replace(tmp_path, snapshot_path)
+        except OSError:
+            # 目录不可写时只是无法加速下次启动，不影响转换
+            pass
+
+    return chain_data
+
+def fingerprint(conversion='t2s'):
+    """
+    转换结果的指纹：词典文件内容、快照格式版本和本模块源码的哈希值，
+    词典或转换实现变化时改变（供 pdf_converter 的断点缓存判断失效）
+    """
+    h = hashlib.sha1(f"{conversion}\0{SNAPSHOT_VERSION}\0".encode('utf-8'))
+    for path in _flatten(dict_chain_files(conversion)):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    with open(os.path.abspath(__file__), 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+class T2SConverter:
+    """
+    与 OpenCC 接口兼容的转换器：convert(text) 的结果与 OpenCC(conversion).convert(text) 相同
+    """
+
+    def __init__(self, conversion='t2s', cache_size=CACHE_SIZE, snapshot_path=SNAPSHOT_PATH):
+        self.conversion = conversion
+        self.chain = load_dict_chain(conversion, snapshot_path)
+
+        # 词典链只有一组且最后一个词典是单字表时，不含任何词组的句子可逐字映射
+        self._char_table = None
+        self._fold_table = None
+        self._phrases = set()
+        self._phrase_lengths = {}
+        if len(self.chain) == 1 and self.chain[0][-1][0] == 1:
+            *phrase_dicts, char_dict = self.chain[0]
+            self._char_table = {
+                ord(key): value.split(' ')[0] for key, value in char_dict[2].items()
+            }
+            lengths = {}
+            for _, _, mapping in phrase_dicts:
+                for key in mapping:
+                    self._phrases.add(key)
+                    lengths.setdefault(key[0], set()).add(len(key))
+            # 词组首字 -> 以该字开头的词组长度（从长到短）
+            self._phrase_lengths = {ch: sorted(ns, reverse=True) for ch, ns in lengths.items()}
+
+        self._convert_sentence = functools.lru_cache(maxsize=cache_size)(self._convert_sentence_uncached)
+
+    def _contains_phrase(self, sentence):
+        """句子中是否出现词组表中的任一词组"""
+        phrase_lengths = self._phrase_lengths
+        phrases = self._phrases
+        for i, ch in enumerate(sentence):
+            if ch in phrase_lengths:
+                for n in phrase_lengths[ch]:
+                    if sentence[i:i+n] in phrases:
+                        return True
+        return False
+
+    def _convert_sentence_uncached(self, sentence):
+        """转换一个不含断句符的句子"""
+        if self._char_table is not None and not self._contains_phrase(sentence):
+            return sentence.translate(self._char_table)
+
+        # 与 OpenCC._convert 相同的最长匹配算法
+        tree = StringTree(sentence)
+        for c_dict in self.chain:
+            tree.create_parse_tree(c_dict)
+            tree = StringTree("".join(tree.inorder()))
+        return "".join(tree.inorder())
+
+    def convert(self, text):
+        """转换一段文本"""
+        parts = SPLIT_RE.split(text)
+        parts[0::2] = [self._convert_sentence(part) for part in parts[0::2]]
+        return "".join(parts)
+
+    def convert_many(self, texts):
+        """
+        批量转换多段文本，返回等长列表
+        各段用换行拼接后一次转换；若某段本身含换行则逐段转换
+        """
+        joined = "\n".join(texts)
+        if joined.count("\n") == len(texts) - 1:
+            return self.convert(joined).split("\n")
+        return [self.convert(text) for text in texts]
+
+    def convert_chars(self, text):
+        """
+        只做逐字转换、不做词组匹配，结果与原文逐字对应（长度不变），
+        用于检索时把繁体、简体归一到同一形式；结果不保证与 convert 一致
+        """
+        if self._fold_table is None:
+            self._fold_table = {
+                ord(key): value.split(' ')[0]
+                for group in self.chain for max_len, _, mapping in group if max_len == 1
+                for key, value in mapping.items() if len(value.split(' ')[0]) == 1
+            }
+        return text.translate(self._fold_table)
+
+    def cache_info(self):
+        """句子缓存的命中统计"""
+        return self._convert_sentence.cache_info()
+
+_converters = {}
+
+def get_converter(conversion='t2s'):
+    """获取进程内共享的转换器实例"""
+    if conversion not in _converters:
+        _converters[conversion] = T2SConverter(conversion)
+    return _converters[conversion]
+
+def check_parity(input_path, traditional=True):
+    """
+    校验 T2SConverter 与 OpenCC('t2s') 的输出是否逐行一致
+
+    参数:
+        traditional: 是否同时用 OpenCC('s2t') 把文本转回繁体后再校验，
+                     以覆盖繁体输入（语料本身已是简体）
+
+    返回不一致的行数
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+
+    variants = [('原文', lines)]
+    if traditional:
+        s2t = OpenCC('s2t')
+        variants.append(('繁体', [s2t.convert(line) for line in lines]))
+
+    reference = OpenCC('t2s')
+    converter = T2SConverter()
+    mismatches = 0
+
+    for name, variant in variants:
+        start = time.perf_counter()
+        expected = [reference.convert(line) for line in variant]
+        opencc_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = converter.convert_many(variant)
+        fast_time = time.perf_counter() - start
+
+        for line_no, (want, got) in enumerate(zip(expected, actual), 1):
+            if want != got:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"第 {line_no} 行不一致（{name}）:\n  OpenCC: {want}\n  T2S:    {got}")
+
+        print(f"{name}: {len(variant)} 行，OpenCC {opencc_time:.2f}s，T2SConverter {fast_time:.2f}s")
+
+    print(f"不一致行数: {mismatches}")
+    return mismatches
+
+if __name__ == "__main__":
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'yuanying_all.md'
+    sys.exit(1 if check_parity(input_file) else 0)
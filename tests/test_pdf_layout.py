@@ -0,0 +1,21 @@
+"""混排页面的布局判断：多进程与串行转换的输出逐字节相同"""
+
+from opencc import OpenCC
+
+import pdf_converter
+import synth_pdf
+
+def test_mixed_layout_serial_matches_parallel(tmp_path):
+    pdf_path = str(tmp_path / 'mixed.pdf')
+    synth_pdf.generate_pdf(pdf_path, pages=12, layout='mixed')
+
+    outputs = []
+    for workers in (1, 4):
+        output = tmp_path / f'mixed_{workers}.md'
+        pdf_converter.convert_pdf_to_md(pdf_path, str(output), skip_pages=0, workers=workers)
+        outputs.append(output.read_bytes())
+    assert outputs[0] == outputs[1]
+
+    # 每页的横排书名都单独成行，没有被拆成逐字的列
+    title = OpenCC('t2s').convert(synth_pdf.HEADER_TEXT)
+    assert outputs[0].decode('utf-8').count(title + '\n') == 12
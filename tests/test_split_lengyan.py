@@ -0,0 +1,37 @@
+"""按卷分割：手动修改过或没有分割记录的文件不被覆盖，--force 时覆盖"""
+
+import os
+
+import split_lengyan
+
+TITLE = '## 大佛頂如來密因修證了義諸菩薩萬行首楞嚴經講義第{}卷\n'
+
+def split(tmp_path, force=False):
+    source = tmp_path / 'all.md'
+    source.write_text('前言\n' + TITLE.format('一') + '甲\n' + TITLE.format('二') + '乙\n', encoding='utf-8')
+    return split_lengyan.split_by_volume(str(source), str(tmp_path / 'doc'), filename_template='第{volume}卷.md',
+                                         force=force, manifest_path=str(tmp_path / 'split.json'))
+
+def test_keeps_edited_volumes(tmp_path):
+    first = tmp_path / 'doc' / '第一卷.md'
+    second = tmp_path / 'doc' / '第二卷.md'
+    volumes, kept = split(tmp_path)
+    assert [v[0] for v in volumes] == ['一', '二'] and kept == []
+    assert first.read_text(encoding='utf-8') == TITLE.format('一') + '甲\n'
+
+    # 手动调整过的卷保留，其余照常写出
+    first.write_text('手动调整\n', encoding='utf-8')
+    second.unlink()
+    _, kept = split(tmp_path)
+    assert kept == [str(first)] and first.read_text(encoding='utf-8') == '手动调整\n'
+    assert second.read_text(encoding='utf-8') == TITLE.format('二') + '乙\n'
+    assert not any(name.endswith('.part') for name in os.listdir(tmp_path / 'doc'))
+
+    _, kept = split(tmp_path, force=True)
+    assert kept == [] and first.read_text(encoding='utf-8') == TITLE.format('一') + '甲\n'
+
+def test_keeps_unrecorded_files(tmp_path):
+    (tmp_path / 'doc').mkdir()
+    (tmp_path / 'doc' / '第二卷.md').write_text('手工整理的第二卷\n', encoding='utf-8')
+    _, kept = split(tmp_path)
+    assert kept == [str(tmp_path / 'doc' / '第二卷.md')]
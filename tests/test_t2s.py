@@ -0,0 +1,38 @@
+"""T2SConverter 与 OpenCC('t2s') 在讲记全文上逐行一致（简体原文和转成繁体后的文本）"""
+
+import os
+
+import pytest
+from opencc import OpenCC
+
+import t2s
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'yuanying_all.md')
+
+@pytest.fixture(scope='module')
+def lines():
+    if not os.path.exists(SOURCE):
+        pytest.skip(f"找不到 {SOURCE}")
+    with open(SOURCE, 'r', encoding='utf-8') as f:
+        return f.read().split('\n')
+
+def test_split_re_matches_opencc():
+    assert t2s.SPLIT_RE.pattern == OpenCC().split_chars_re.pattern
+
+@pytest.mark.parametrize('form', ['simplified', 'traditional'])
+def test_parity_with_opencc(lines, form):
+    if form == 'traditional':
+        s2t = OpenCC('s2t')
+        lines = [s2t.convert(line) for line in lines]
+    reference = OpenCC('t2s')
+    expected = [reference.convert(line) for line in lines]
+
+    actual = t2s.T2SConverter().convert_many(lines)
+    assert len(actual) == len(expected)
+    mismatches = [(line_no, want, got) for line_no, (want, got) in enumerate(zip(expected, actual), 1)
+                  if want != got]
+    assert not mismatches, f"{len(mismatches)} 行不一致，第一处: {mismatches[0]}"
+
+    # 逐段转换（不经批量拼接）的结果也相同
+    converter = t2s.T2SConverter()
+    assert [converter.convert(line) for line in lines[:2000]] == expected[:2000]
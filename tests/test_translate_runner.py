@@ -0,0 +1,71 @@
+"""批量翻译：假服务随机失败时重试成功，各段按顺序拼接；重跑全部命中缓存，不发请求"""
+
+import asyncio
+import json
+
+import pytest
+
+import translate_runner
+from fake_llm_server import start_fake_server
+
+VOLUMES = ('一', '二')
+PARTS = 3
+
+@pytest.fixture
+def fake_server():
+    server, base_url = start_fake_server(failure_rate=0.3, seed=3)
+    yield base_url
+    server.shutdown()
+
+def make_jobs(bundle_dir):
+    """每卷 PARTS 次请求，每次的主文本是一段可辨认的粗体经文"""
+    jobs = []
+    for volume in VOLUMES:
+        volume_dir = bundle_dir / volume
+        volume_dir.mkdir(parents=True)
+        manifest = {'volume': volume, 'template_hash': 'template', 'dir': str(volume_dir), 'bundles': []}
+        for part in range(1, PARTS + 1):
+            prompt_file = f'part{part}.txt'
+            (volume_dir / prompt_file).write_text(
+                f"说明\n\n【主文本】\n\n**第{volume}卷经文{part}**\n\n【参考文本】\n\n（无）\n", encoding='utf-8')
+            bundle = {'part': part, 'prompt_file': prompt_file, 'chunk_hash': f'{volume}-{part}', 'tokens': 10}
+            manifest['bundles'].append(bundle)
+            jobs.append((manifest, bundle))
+    return jobs
+
+def test_retries_order_and_cache(tmp_path, fake_server, monkeypatch):
+    monkeypatch.setattr(translate_runner, 'BACKOFF_BASE', 0.01)
+    calls = []
+
+    def call(prompt, model, options):
+        calls.append(prompt)
+        return translate_runner.openai_request(prompt, model, options)
+
+    jobs = make_jobs(tmp_path / 'bundles')
+
+    def run():
+        calls.clear()
+        return asyncio.run(translate_runner.run(
+            jobs, call, 'fake', 'test', {'base_url': fake_server}, concurrency=3, tokens_per_minute=0,
+            output_dir=str(tmp_path / 'out'), cache_dir=str(tmp_path / 'cache')))
+
+    stats = run()
+    assert stats['failed'] == 0 and stats['cached'] == 0
+    assert stats['retries'] > 0 and len(calls) == len(jobs) + stats['retries']
+    outputs = {}
+    for volume in VOLUMES:
+        path = translate_runner.output_path(volume, 'test', str(tmp_path / 'out'))
+        assert path in stats['volumes']
+        with open(path, 'r', encoding='utf-8') as f:
+            outputs[path] = f.read()
+        passages = [line for line in outputs[path].splitlines() if line.startswith('**')]
+        assert passages == [f'**第{volume}卷经文{part}**' for part in range(1, PARTS + 1)]
+
+    # 重跑：全部由缓存提供，输出不变
+    stats = run()
+    assert calls == [] and stats['cached'] == len(jobs) and stats['retries'] == 0
+    for path, text in outputs.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            assert f.read() == text
+    entry = json.loads(next((tmp_path / 'cache').rglob('*.json')).read_text(encoding='utf-8'))
+    assert entry['model'] == 'fake' and entry['text']
@@ -0,0 +1,344 @@
+"""
+并发批量翻译：把 pack_prompts 生成的请求发给模型，按卷拼成白话译文
+
+- asyncio 并发，同时进行的请求数有上限；
+- 令牌桶按每分钟 token 数限速（按提示词估算预扣，响应报告的实际用量多出的部分补扣）；
+- 429/5xx/网络错误按指数退避重试，服务端给出 Retry-After 时按其等待；
+- 每个响应以 (模板哈希, 模型, 主文本+参考文本哈希) 的哈希为键缓存在 translation_cache/，
+  重跑或中途崩溃后再跑都不会重复请求；
+- 一卷的所有请求都成功后，按顺序拼接写出 gemini_doc/N-楞严经第N卷_白话译文_<标签>.md；
+- 结束时报告吞吐（请求/秒）和延迟 p50/p95。
+
+后端可替换，见 BACKENDS；--fake 启动本地假服务（fake_llm_server）代替真实模型，
+此时译文和缓存默认写到 fake_output/，不混入 gemini_doc/ 和 translation_cache/。
+
+用法:
+    python pack_prompts.py
+    python translate_runner.py [卷号 ...] --backend gemini --model gemini-2.5-pro --tag Gemiv2
+    python translate_runner.py 二十四 --fake
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import align_passages
+import pack_prompts
+
+CACHE_DIR = 'translation_cache'
+OUTPUT_DIR = 'gemini_doc'
+OUTPUT_TEMPLATE = '{number}-楞严经第{volume}卷_白话译文_{tag}.md'
+
+# --fake 的输出目录：假服务的译文文件名与正式译文的格式相同，写进 gemini_doc 会被索引和网站收录
+FAKE_OUTPUT_DIR = 'fake_output'
+
+CONCURRENCY = 4
+TOKENS_PER_MINUTE = 1000000
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+REQUEST_TIMEOUT = 600
+
+class BackendError(Exception):
+    """后端请求失败；retryable 表示可以重试，retry_after 为服务端建议的等待秒数"""
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+def post_json(url, payload, headers=None, timeout=REQUEST_TIMEOUT):
+    """POST JSON 并解析 JSON 响应；失败时抛出 BackendError"""
+    request = urllib.request.Request(url, data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        retry_after = e.headers.get('Retry-After')
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        detail = e.read().decode('utf-8', 'replace')[:200]
+        raise BackendError(f"HTTP {e.code}: {detail}", e.code == 429 or e.code >= 500, retry_after)
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        raise BackendError(str(e), retryable=True)
+
+def openai_request(prompt, model, options):
+    """OpenAI 兼容的 chat/completions 接口，返回 (译文, 实际 token 用量或 None)"""
+    base_url = options.get('base_url') or os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+    headers = {'Authorization': f"Bearer {os.environ.get('OPENAI_API_KEY', '')}"}
+    data = post_json(f"{base_url.rstrip('/')}/chat/completions",
+                     {'model': model, 'messages': [{'role': 'user', 'content': prompt}]}, headers)
+    try:
+        text = data['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        raise BackendError(f"响应格式不对: {str(data)[:200]}", retryable=True)
+    return text, (data.get('usage') or {}).get('total_tokens')
+
+def gemini_request(prompt, model, options):
+    """Gemini generateContent 接口，返回 (译文, 实际 token 用量或 None)"""
+    base_url = options.get('base_url') or 'https://generativelanguage.googleapis.com/v1beta'
+    headers = {'x-goog-api-key': os.environ.get('GEMINI_API_KEY', '')}
+    data = post_json(f"{base_url.rstrip('/')}/models/{model}:generateContent",
+                     {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}, headers)
+    try:
+        text = "".join(part.get('text', '') for part in data['candidates'][0]['content']['parts'])
+    except (KeyError, IndexError, TypeError):
+        raise BackendError(f"响应格式不对: {str(data)[:200]}", retryable=True)
+    return text, (data.get('usageMetadata') or {}).get('totalTokenCount')
+
+# 后端名 -> 同步请求函数 (prompt, model, options) -> (text, tokens)
+BACKENDS = {
+    'openai': openai_request,
+    'gemini': gemini_request,
+}
+
+class TokenBucket:
+    """每分钟 rate 个 token 的令牌桶，容量为一分钟的量；rate 为 0 时不限速"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    async def acquire(self, n):
+        if not self.rate:
+            return
+        n = min(n, self.rate)
+        async with self.lock:
+            self._refill()
+            while self.tokens < n:
+                await asyncio.sleep((n - self.tokens) * 60 / self.rate)
+                self._refill()
+            self.tokens -= n
+
+    def charge(self, n):
+        """补扣预扣之外的用量，余额可为负，之后的请求相应等待"""
+        if self.rate:
+            self._refill()
+            self.tokens -= n
+
+def cache_key(template_hash, model, chunk_hash):
+    return hashlib.sha256(f"{template_hash}\0{model}\0{chunk_hash}".encode('utf-8')).hexdigest()
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], key + '.json')
+
+def load_cached(key, cache_dir=CACHE_DIR):
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_cached(key, entry, cache_dir=CACHE_DIR):
+    path = cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_jobs(volumes=None, bundle_dir=pack_prompts.OUTPUT_DIR):
+    """读取各卷的 bundles.json，返回 [(卷清单, 请求), ...]，按卷号、段号排列"""
+    jobs = []
+    manifests = []
+    for path in glob.glob(os.path.join(bundle_dir, '*', 'bundles.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if volumes and manifest['volume'] not in volumes:
+            continue
+        manifest['dir'] = os.path.dirname(path)
+        manifests.append(manifest)
+    manifests.sort(key=lambda m: align_passages.volume_number(m['volume']))
+    for manifest in manifests:
+        for bundle in manifest['bundles']:
+            jobs.append((manifest, bundle))
+    return jobs
+
+def percentile(values, q):
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def request_text(prompt, estimate, call, model, options, semaphore, bucket, executor, stats,
+                       max_retries=MAX_RETRIES):
+    """限流、限速后请求后端，按需重试；estimate 为预扣的 token 数。返回 (译文, 实际 token 用量)"""
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            await bucket.acquire(estimate)
+            start = time.perf_counter()
+            try:
+                text, tokens = await loop.run_in_executor(executor, call, prompt, model, options)
+            except BackendError as e:
+                if not e.retryable or attempt == max_retries:
+                    raise
+                stats['retries'] += 1
+                delay = e.retry_after if e.retry_after is not None else \
+                    min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random())
+                await asyncio.sleep(delay)
+                continue
+
+            stats['latencies'].append(time.perf_counter() - start)
+            if tokens:
+                stats['tokens'] += tokens
+                if tokens > estimate:
+                    bucket.charge(tokens - estimate)
+            return text, tokens
+
+async def translate_bundle(manifest, bundle, call, model, options, semaphore, bucket, executor,
+                           stats, cache_dir=CACHE_DIR, max_retries=MAX_RETRIES):
+    """翻译一次请求：先查缓存，未命中再请求后端并写入缓存；返回译文"""
+    key = cache_key(manifest['template_hash'], model, bundle['chunk_hash'])
+    cached = load_cached(key, cache_dir)
+    if cached is not None:
+        stats['cached'] += 1
+        return cached['text']
+
+    with open(os.path.join(manifest['dir'], bundle['prompt_file']), 'r', encoding='utf-8') as f:
+        prompt = f.read()
+
+    text, tokens = await request_text(prompt, bundle['tokens'], call, model, options, semaphore, bucket,
+                                      executor, stats, max_retries)
+    save_cached(key, {'model': model, 'volume': manifest['volume'], 'part': bundle['part'],
+                      'chunk_hash': bundle['chunk_hash'], 'tokens': tokens, 'text': text},
+                cache_dir)
+    return text
+
+def output_path(volume, tag, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, OUTPUT_TEMPLATE.format(
+        number=align_passages.volume_number(volume), volume=volume, tag=tag))
+
+def assemble_volume(parts, path):
+    """各段译文按顺序拼接，段间空一行"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(part.strip() for part in parts if part.strip()) + "\n")
+
+async def run(jobs, call, model, tag, options=None, concurrency=CONCURRENCY,
+              tokens_per_minute=TOKENS_PER_MINUTE, output_dir=OUTPUT_DIR, cache_dir=CACHE_DIR,
+              max_retries=MAX_RETRIES):
+    """执行所有请求并拼接各卷，返回统计"""
+    stats = {'requests': len(jobs), 'cached': 0, 'failed': 0, 'retries': 0, 'tokens': 0,
+             'latencies': [], 'volumes': []}
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(tokens_per_minute)
+
+    async def guarded(manifest, bundle):
+        try:
+            return await translate_bundle(manifest, bundle, call, model, options or {}, semaphore,
+                                          bucket, executor, stats, cache_dir, max_retries)
+        except BackendError as e:
+            stats['failed'] += 1
+            print(f"失败: 第{manifest['volume']}卷 第{bundle['part']}段: {e}")
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await asyncio.gather(*(guarded(manifest, bundle) for manifest, bundle in jobs))
+    stats['elapsed'] = time.perf_counter() - start
+
+    by_volume = {}
+    for (manifest, bundle), text in zip(jobs, results):
+        by_volume.setdefault(manifest['volume'], []).append(text)
+    for volume, parts in by_volume.items():
+        if any(part is None for part in parts):
+            print(f"第{volume}卷有请求失败，未写出（已成功的部分已缓存，重跑即可续上）")
+            continue
+        path = output_path(volume, tag, output_dir)
+        assemble_volume(parts, path)
+        stats['volumes'].append(path)
+        print(f"已写出: {path}")
+    return stats
+
+def report(stats):
+    """吞吐与延迟报告"""
+    latencies = stats['latencies']
+    summary = {
+        'requests': stats['requests'],
+        'sent': len(latencies),
+        'cached': stats['cached'],
+        'failed': stats['failed'],
+        'retries': stats['retries'],
+        'tokens': stats['tokens'],
+        'elapsed': round(stats['elapsed'], 3),
+        'chunks_per_second': round(stats['requests'] / stats['elapsed'], 3) if stats['elapsed'] else 0.0,
+        'latency_p50': round(percentile(latencies, 0.50), 3),
+        'latency_p95': round(percentile(latencies, 0.95), 3),
+        'volumes': stats['volumes'],
+    }
+    print(f"请求 {summary['requests']} 次（发送 {summary['sent']}，缓存命中 {summary['cached']}，"
+          f"失败 {summary['failed']}，重试 {summary['retries']}），用时 {summary['elapsed']:.2f}s，"
+          f"{summary['chunks_per_second']:.2f} 次/秒，延迟 p50 {summary['latency_p50']:.2f}s "
+          f"p95 {summary['latency_p95']:.2f}s")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='并发批量翻译 prompt_bundles 中的请求')
+    parser.add_argument('volumes', nargs='*', help='卷号，如 二十四；默认全部')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini')
+    parser.add_argument('--model', default='gemini-2.5-pro')
+    parser.add_argument('--base-url', help='后端地址，默认为官方地址')
+    parser.add_argument('--tag', help='输出文件名后缀，默认为模型名')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--tpm', type=int, default=TOKENS_PER_MINUTE, help='每分钟 token 上限，0 为不限')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES)
+    parser.add_argument('--output-dir', help=f'默认 {OUTPUT_DIR}，--fake 时为 {FAKE_OUTPUT_DIR}')
+    parser.add_argument('--cache-dir', help=f'默认 {CACHE_DIR}，--fake 时为 {FAKE_OUTPUT_DIR}/{CACHE_DIR}')
+    parser.add_argument('--report', help='把统计写入该 JSON 文件')
+    parser.add_argument('--fake', action='store_true', help='使用本地假服务（OpenAI 接口）')
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.volumes or None)
+    if not jobs:
+        print("没有找到请求，请先运行 python pack_prompts.py")
+        return 1
+
+    options = {'base_url': args.base_url}
+    server = None
+    if args.fake:
+        import fake_llm_server
+        server, options['base_url'] = fake_llm_server.start_fake_server(latency=(0.05, 0.3), failure_rate=0.1)
+        args.backend = 'openai'
+        args.tag = args.tag or 'fake'
+        args.output_dir = args.output_dir or FAKE_OUTPUT_DIR
+        args.cache_dir = args.cache_dir or os.path.join(FAKE_OUTPUT_DIR, CACHE_DIR)
+        print(f"使用假模型服务: {options['base_url']}，输出到 {args.output_dir}")
+
+    args.output_dir = args.output_dir or OUTPUT_DIR
+    args.cache_dir = args.cache_dir or CACHE_DIR
+    try:
+        stats = asyncio.run(run(jobs, BACKENDS[args.backend], args.model, args.tag or args.model, options,
+                                args.concurrency, args.tpm, args.output_dir, args.cache_dir, args.retries))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    summary = report(stats)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+    return 1 if stats['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())